@@ -0,0 +1,151 @@
+"""开销较大接口的请求合并与准入控制
+
+- 请求合并（single-flight）：参数相同的并发请求只计算一次，后到的请求等待先到请求的结果，
+  等待期间不占用线程池
+- 并发限制：每个接口最多同时在线程池中计算 ENDPOINT_CONCURRENCY 个请求，其余排队；
+  排队超过 ENDPOINT_QUEUE_TIMEOUT 秒返回 503，避免大查询占满线程池，
+  /api/stats 这类轻量接口仍有线程可用
+
+合并只发生在计算进行期间，不缓存已完成的结果。
+
+计算在线程池中使用自己新建的数据库会话，请求被取消时线程照常执行完，
+会话和并发名额都在线程结束后才释放。
+"""
+import asyncio
+import logging
+import os
+import time
+
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+
+from database import SessionLocal
+from metrics import ENDPOINT_COALESCED, ENDPOINT_QUEUE_WAIT, ENDPOINT_REJECTED
+
+logger = logging.getLogger(__name__)
+
+# 每个接口默认的最大并发计算数
+ENDPOINT_CONCURRENCY = int(os.environ.get("ENDPOINT_CONCURRENCY", "4"))
+# 等待并发名额的超时（秒）
+ENDPOINT_QUEUE_TIMEOUT = float(os.environ.get("ENDPOINT_QUEUE_TIMEOUT", "10"))
+# 单独指定部分接口的并发数，如 "message-flow=2,dashboard=8"
+ENDPOINT_LIMITS = os.environ.get("ENDPOINT_LIMITS", "")
+
+
+def _parse_limits(value: str) -> dict[str, int]:
+    limits = {}
+    for item in value.split(","):
+        name, sep, limit = item.strip().partition("=")
+        if not sep:
+            continue
+        try:
+            limits[name.strip()] = int(limit)
+        except ValueError:
+            logger.warning(f"忽略无效的接口并发配置: {item}")
+    return limits
+
+
+_limits = _parse_limits(ENDPOINT_LIMITS)
+
+# 名称 -> EndpointGate，供指标输出
+gates: dict[str, "EndpointGate"] = {}
+
+
+class EndpointGate:
+    """单个接口的请求合并和并发限制，只在事件循环中使用"""
+
+    def __init__(self, name: str, limit: int, queue_timeout: float):
+        """
+        Args:
+            name: 接口名称，用于指标标签和 ENDPOINT_LIMITS 配置
+            limit: 最大并发计算数
+            queue_timeout: 等待并发名额的超时（秒）
+        """
+        self.name = name
+        self.limit = limit
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.queued = 0
+        self._semaphore = asyncio.Semaphore(limit)
+        # 合并键 -> 进行中计算的 Future
+        self._inflight: dict[object, asyncio.Future] = {}
+
+    async def run(self, key, fn, *args):
+        """在线程池中新建数据库会话 db，执行 fn(*args, db)，返回结果
+
+        key 相同的请求正在计算时直接等待其结果（包括异常，如 404 或 503）。
+        """
+        while True:
+            flight = self._inflight.get(key)
+            if flight is None:
+                break
+            ENDPOINT_COALESCED.inc(endpoint=self.name)
+            try:
+                # shield：本请求被取消时不影响其他等待者
+                return await asyncio.shield(flight)
+            except asyncio.CancelledError:
+                # 先到的请求被取消时重新发起计算，本请求被取消时照常退出
+                if not flight.cancelled():
+                    raise
+
+        flight = asyncio.get_running_loop().create_future()
+        self._inflight[key] = flight
+        try:
+            result = await self._compute(fn, args)
+        except asyncio.CancelledError:
+            flight.cancel()
+            raise
+        except Exception as e:
+            flight.set_exception(e)
+            # 标记为已读取，没有等待者时不输出 "exception was never retrieved"
+            flight.exception()
+            raise
+        else:
+            flight.set_result(result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _compute(self, fn, args):
+        queued = time.perf_counter()
+        self.queued += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            ENDPOINT_REJECTED.inc(endpoint=self.name)
+            raise HTTPException(
+                status_code=503,
+                detail=f"接口 {self.name} 繁忙，请稍后重试",
+                headers={"Retry-After": str(max(1, round(self.queue_timeout)))},
+            )
+        finally:
+            self.queued -= 1
+            ENDPOINT_QUEUE_WAIT.observe(time.perf_counter() - queued, endpoint=self.name)
+        self.active += 1
+        computation = asyncio.ensure_future(run_in_threadpool(_with_session, fn, args))
+        # 线程无法中断：请求被取消时计算继续占用名额，线程结束后才释放
+        computation.add_done_callback(self._release)
+        return await asyncio.shield(computation)
+
+    def _release(self, computation: asyncio.Future):
+        self.active -= 1
+        self._semaphore.release()
+        if not computation.cancelled():
+            # 标记为已读取，请求已被取消时不输出 "exception was never retrieved"
+            computation.exception()
+
+
+def _with_session(fn, args):
+    db = SessionLocal()
+    try:
+        return fn(*args, db)
+    finally:
+        db.close()
+
+
+def endpoint_gate(name: str) -> EndpointGate:
+    """获取接口的 EndpointGate，并发数取 ENDPOINT_LIMITS 中的配置或 ENDPOINT_CONCURRENCY"""
+    gate = gates.get(name)
+    if gate is None:
+        gate = gates[name] = EndpointGate(name, _limits.get(name, ENDPOINT_CONCURRENCY), ENDPOINT_QUEUE_TIMEOUT)
+    return gate
@@ -0,0 +1,14 @@
+"""基准测试工具
+
+- generate: 生成模拟的 ~/.claude/teams 和 ~/.claude/tasks 数据集
+- asgi_client: 不依赖 httpx 的进程内 ASGI 客户端
+- run: 测量 full_scan、各类文件的 incremental_scan 和各 API 接口，结果输出为 JSON
+- replay: 重放 WATCHER_TRACE_PATH 录制的文件事件，报告扫描次数、延迟和数据库差异
+- load: 启动服务，并发运行 WebSocket 客户端、HTTP 轮询者和文件修改，测量延迟、吞吐量和内存
+
+在 backend 目录下运行：
+    python -m bench.generate --out /tmp/bench-data --teams 20
+    python -m bench.run --data /tmp/bench-data --output results.json
+    python -m bench.run --data /tmp/bench-data --compare results.json
+    python -m bench.load --data /tmp/bench-data --ws-clients 50 --pollers 20 --duration 30
+"""
@@ -0,0 +1,76 @@
+"""最小的进程内 ASGI 客户端
+
+直接以 ASGI 协议调用应用，不经过网络和 httpx，用于基准测试中测量接口本身的耗时。
+不触发 lifespan，调用方需要自行准备数据库。
+"""
+import asyncio
+import json
+from urllib.parse import urlencode
+
+
+class ASGIResponse:
+    def __init__(self, status: int, headers: list, body: bytes):
+        self.status = status
+        self.headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in headers}
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body)
+
+
+class ASGIClient:
+    """按 ASGI HTTP 规范构造 scope 并收集响应，支持流式响应"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def get(self, path: str, params: dict | None = None) -> ASGIResponse:
+        return await self.request("GET", path, params)
+
+    async def request(self, method: str, path: str, params: dict | None = None, body: bytes = b"") -> ASGIResponse:
+        query = urlencode({k: v for k, v in (params or {}).items() if v is not None}, doseq=True)
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "root_path": "",
+            "query_string": query.encode(),
+            "headers": [(b"host", b"bench"), (b"content-length", str(len(body)).encode())],
+            "client": ("127.0.0.1", 0),
+            "server": ("bench", 80),
+        }
+        request_sent = False
+        response_done = asyncio.Event()
+
+        async def receive():
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            # 流式响应会监听断开事件，响应发送完毕前不能报告断开
+            await response_done.wait()
+            return {"type": "http.disconnect"}
+
+        status = 0
+        headers = []
+        chunks = []
+
+        async def send(message):
+            nonlocal status, headers
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = message.get("headers", [])
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+                if not message.get("more_body", False):
+                    response_done.set()
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            response_done.set()
+        return ASGIResponse(status, headers, b"".join(chunks))
@@ -0,0 +1,216 @@
+"""模拟数据集生成器
+
+生成与 Claude Code 团队目录结构一致的数据：
+    <out>/teams/<team>/config.json
+    <out>/teams/<team>/inboxes/<agent>.json
+    <out>/tasks/<team>/<id>.json
+
+消息中按比例混入 JSON 负载消息（任务分配、空闲通知、关闭请求、计划审批），
+任务按依赖链组织（每条链上后一个任务被前一个阻塞），状态按链上位置分布。
+同一组参数和随机种子总是生成相同的数据。
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+from datetime import datetime, timedelta
+
+AGENT_TYPES = ["general-purpose", "Explore", "Plan", "code-reviewer"]
+MODELS = ["opus", "sonnet", "haiku"]
+COLORS = ["blue", "green", "red", "yellow", "purple", "orange", "pink", "cyan"]
+WORDS = (
+    "api schema test fix refactor review deploy index cache query parser scanner route "
+    "websocket task message team agent config build lint docs migrate benchmark"
+).split()
+
+
+def _sentence(rng: random.Random, min_words: int = 4, max_words: int = 30) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words)))
+
+
+def _payload_text(rng: random.Random, sender: str, task_count: int) -> str:
+    """生成一条 JSON 负载消息文本"""
+    kind = rng.choices(
+        ["task_assignment", "idle_notification", "shutdown_request", "plan_approval_request"],
+        weights=[5, 3, 1, 1],
+    )[0]
+    payload = {"type": kind}
+    if kind == "task_assignment":
+        payload.update({
+            "taskId": str(rng.randint(1, max(task_count, 1))),
+            "subject": _sentence(rng, 2, 6),
+            "description": _sentence(rng),
+            "assignedBy": sender,
+        })
+    elif kind == "idle_notification":
+        payload.update({"from": sender, "idleReason": "available"})
+    elif kind == "shutdown_request":
+        payload.update({"requestId": f"req-{rng.randint(1, 10**6)}", "reason": _sentence(rng, 2, 6)})
+    else:
+        payload.update({"requestId": f"plan-{rng.randint(1, 10**6)}", "plan": _sentence(rng, 10, 60)})
+    return json.dumps(payload, ensure_ascii=False)
+
+
+def _task_status(position: int, length: int, rng: random.Random) -> str:
+    """链首附近的任务更可能已完成，链尾更可能仍在等待"""
+    progress = position / max(length - 1, 1)
+    if progress < 0.4:
+        return rng.choices(["completed", "in_progress"], weights=[4, 1])[0]
+    if progress < 0.7:
+        return rng.choices(["completed", "in_progress", "pending"], weights=[1, 2, 2])[0]
+    return "pending"
+
+
+def generate_dataset(
+    out: str,
+    teams: int = 10,
+    agents: int = 5,
+    messages: int = 200,
+    json_ratio: float = 0.3,
+    tasks: int = 50,
+    chain_length: int = 5,
+    seed: int = 42,
+    clean: bool = True,
+) -> dict:
+    """生成数据集，返回参数和生成的文件/行数统计
+
+    Args:
+        out: 输出根目录（相当于 ~/.claude）
+        teams: 团队数
+        agents: 每个团队的 agent 数（含 team-lead）
+        messages: 每个 inbox 的消息数
+        json_ratio: JSON 负载消息占比
+        tasks: 每个团队的任务数
+        chain_length: 依赖链长度，1 表示无依赖
+        seed: 随机种子
+        clean: 生成前清空输出目录
+    """
+    rng = random.Random(seed)
+    teams_dir = os.path.join(out, "teams")
+    tasks_dir = os.path.join(out, "tasks")
+    if clean:
+        shutil.rmtree(teams_dir, ignore_errors=True)
+        shutil.rmtree(tasks_dir, ignore_errors=True)
+
+    base_time = datetime(2026, 1, 1)
+    files = 0
+    message_rows = 0
+    task_rows = 0
+    edge_count = 0
+
+    for t in range(teams):
+        team_name = f"team-{t:03d}"
+        names = ["team-lead"] + [f"agent-{a}" for a in range(1, agents)]
+        members = [
+            {
+                "agentId": f"{name}@{team_name}",
+                "name": name,
+                "agentType": "team-lead" if name == "team-lead" else rng.choice(AGENT_TYPES),
+                "model": rng.choice(MODELS),
+                "color": COLORS[i % len(COLORS)],
+                "cwd": f"/work/{team_name}",
+            }
+            for i, name in enumerate(names)
+        ]
+        config = {
+            "name": team_name,
+            "description": _sentence(rng, 3, 10),
+            "createdAt": int(base_time.timestamp() * 1000),
+            "leadAgentId": f"team-lead@{team_name}",
+            "members": members,
+        }
+        inbox_dir = os.path.join(teams_dir, team_name, "inboxes")
+        os.makedirs(inbox_dir, exist_ok=True)
+        with open(os.path.join(teams_dir, team_name, "config.json"), "w", encoding="utf-8") as f:
+            json.dump(config, f, ensure_ascii=False)
+        files += 1
+
+        for owner in names:
+            peers = [n for n in names if n != owner] or [owner]
+            inbox = []
+            ts = base_time + timedelta(minutes=rng.randint(0, 600))
+            for _ in range(messages):
+                sender = rng.choice(peers)
+                ts += timedelta(seconds=rng.randint(1, 300), milliseconds=rng.randint(0, 999))
+                is_payload = rng.random() < json_ratio
+                inbox.append({
+                    "from": sender,
+                    "text": _payload_text(rng, sender, tasks) if is_payload else _sentence(rng),
+                    "summary": "" if is_payload else _sentence(rng, 2, 6),
+                    "timestamp": ts.strftime("%Y-%m-%dT%H:%M:%S.") + f"{ts.microsecond // 1000:03d}Z",
+                    "color": COLORS[names.index(sender) % len(COLORS)],
+                    "read": rng.random() < 0.7,
+                })
+            with open(os.path.join(inbox_dir, f"{owner}.json"), "w", encoding="utf-8") as f:
+                json.dump(inbox, f, ensure_ascii=False)
+            files += 1
+            message_rows += len(inbox)
+
+        team_tasks_dir = os.path.join(tasks_dir, team_name)
+        os.makedirs(team_tasks_dir, exist_ok=True)
+        chain = max(chain_length, 1)
+        for i in range(tasks):
+            task_id = str(i + 1)
+            position = i % chain
+            blocked_by = [str(i)] if position > 0 else []
+            blocks = [str(i + 2)] if position < chain - 1 and i + 1 < tasks else []
+            edge_count += len(blocked_by)
+            task = {
+                "id": task_id,
+                "subject": _sentence(rng, 2, 8),
+                "description": _sentence(rng, 10, 60),
+                "activeForm": _sentence(rng, 2, 5),
+                "status": _task_status(position, chain, rng),
+                "owner": rng.choice(names[1:] or names),
+                "blocks": blocks,
+                "blockedBy": blocked_by,
+                "metadata": {"_internal": True} if rng.random() < 0.05 else {},
+            }
+            with open(os.path.join(team_tasks_dir, f"{task_id}.json"), "w", encoding="utf-8") as f:
+                json.dump(task, f, ensure_ascii=False)
+            files += 1
+            task_rows += 1
+
+    return {
+        "params": {
+            "teams": teams, "agents": agents, "messages": messages, "json_ratio": json_ratio,
+            "tasks": tasks, "chain_length": chain_length, "seed": seed,
+        },
+        "files": files,
+        "message_rows": message_rows,
+        "task_rows": task_rows,
+        "task_edges": edge_count,
+    }
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """注册数据集参数，供 generate 和 run 两个命令共用"""
+    parser.add_argument("--teams", type=int, default=10, help="团队数")
+    parser.add_argument("--agents", type=int, default=5, help="每个团队的 agent 数")
+    parser.add_argument("--messages", type=int, default=200, help="每个 inbox 的消息数")
+    parser.add_argument("--json-ratio", type=float, default=0.3, help="JSON 负载消息占比")
+    parser.add_argument("--tasks", type=int, default=50, help="每个团队的任务数")
+    parser.add_argument("--chain-length", type=int, default=5, help="任务依赖链长度")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+
+
+def dataset_kwargs(args: argparse.Namespace) -> dict:
+    return {
+        "teams": args.teams, "agents": args.agents, "messages": args.messages,
+        "json_ratio": args.json_ratio, "tasks": args.tasks,
+        "chain_length": args.chain_length, "seed": args.seed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成模拟的团队/任务数据集")
+    parser.add_argument("--out", required=True, help="输出根目录（相当于 ~/.claude）")
+    add_arguments(parser)
+    args = parser.parse_args()
+    summary = generate_dataset(args.out, **dataset_kwargs(args))
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,453 @@
+"""并发负载测试
+
+在模拟数据集上启动一个 uvicorn 子进程，然后同时：
+- 建立 K 个 /ws 连接，记录每个文件变化从写入到送达客户端的延迟
+- 运行 M 个 HTTP 轮询者，按前端页面（useFetch + 自动刷新）的请求组合周期性拉取
+- 以指定速率修改 inbox 和任务文件
+
+结束后输出 HTTP 延迟（p50/p95/p99，按接口和总体）、变更送达延迟、吞吐量
+和服务端进程树的 RSS，结果为 JSON。
+
+在 backend 目录下运行：
+    python -m bench.load --ws-clients 50 --pollers 20 --duration 30 --mutation-rate 5
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from collections import defaultdict
+
+import websockets
+
+from bench.generate import add_arguments, dataset_kwargs, generate_dataset
+
+# 变更标记前缀：写入消息文本或任务标题，客户端据此匹配送达的事件
+MARKER_PREFIX = "load-marker-"
+
+
+def _percentiles(samples: list[float]) -> dict:
+    """延迟样本（秒）的统计，输出毫秒"""
+    if not samples:
+        return {"n": 0}
+    ordered = sorted(samples)
+    n = len(ordered)
+
+    def pct(p: float) -> float:
+        return round(ordered[min(n - 1, int(n * p))] * 1000, 3)
+
+    return {
+        "n": n,
+        "mean_ms": round(sum(ordered) / n * 1000, 3),
+        "p50_ms": pct(0.5),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+# ------------------------------------------------------------
+# 服务端进程
+# ------------------------------------------------------------
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _children(pid: int) -> list[int]:
+    result = []
+    try:
+        for tid in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{tid}/children") as f:
+                result.extend(int(child) for child in f.read().split())
+    except OSError:
+        pass
+    return result
+
+
+def process_tree_rss(pid: int) -> int:
+    """进程及其全部子进程（多 worker 时）的 RSS 之和（字节），读取 /proc，非 Linux 返回 0"""
+    total = 0
+    stack = [pid]
+    while stack:
+        current = stack.pop()
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+        except OSError:
+            continue
+        stack.extend(_children(current))
+    return total
+
+
+def start_server(data_dir: str, db_path: str, port: int, workers: int, extra_env: dict) -> subprocess.Popen:
+    env = dict(os.environ, CLAUDE_DIR=data_dir, DATABASE_PATH=db_path, **extra_env)
+    if workers > 1:
+        env["MULTI_WORKER"] = "1"
+    cmd = [
+        sys.executable, "-m", "uvicorn", "main:app",
+        "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning",
+    ]
+    if workers > 1:
+        cmd += ["--workers", str(workers)]
+    return subprocess.Popen(cmd, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), env=env)
+
+
+def wait_ready(port: int, timeout: float) -> float:
+    """等待 /api/ready 返回 200，返回耗时（秒）"""
+    start = time.monotonic()
+    while time.monotonic() - start < timeout:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/api/ready")
+            if conn.getresponse().status == 200:
+                return time.monotonic() - start
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f"服务在 {timeout} 秒内未就绪")
+
+
+# ------------------------------------------------------------
+# HTTP 轮询
+# ------------------------------------------------------------
+
+def page_profiles(teams: list[str]) -> dict[str, list[str]]:
+    """前端各页面一次刷新发出的请求"""
+    def team():
+        return urllib.parse.quote(random.choice(teams))
+
+    return {
+        "overview": lambda: ["/api/stats", "/api/teams"],
+        "team_detail": lambda: [f"/api/teams/{team()}/dashboard?include=team,messages,tasks&message_limit=20"],
+        "messages": lambda: ["/api/messages?limit=100"],
+        "tasks": lambda: ["/api/tasks"],
+        "flow": lambda: [f"/api/teams/{team()}/message-flow"],
+    }
+
+
+class Poller(threading.Thread):
+    """模拟一个开着某个页面并定时刷新的浏览器标签页，复用 keep-alive 连接"""
+
+    def __init__(self, port: int, profile, interval: float, stop: threading.Event, results: dict, lock: threading.Lock):
+        super().__init__(daemon=True)
+        self.port = port
+        self.profile = profile
+        self.interval = interval
+        self.stop_event = stop
+        self.results = results
+        self.lock = lock
+
+    def run(self):
+        conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=30)
+        # 错开各轮询者的起始时间
+        self.stop_event.wait(random.random() * self.interval)
+        while not self.stop_event.is_set():
+            cycle_start = time.monotonic()
+            for path in self.profile():
+                route = path.split("?")[0]
+                start = time.perf_counter()
+                try:
+                    conn.request("GET", path)
+                    response = conn.getresponse()
+                    response.read()
+                    ok = response.status == 200
+                except (OSError, http.client.HTTPException):
+                    conn.close()
+                    conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=30)
+                    ok = False
+                elapsed = time.perf_counter() - start
+                with self.lock:
+                    self.results["latency"][_route_label(route)].append(elapsed)
+                    if not ok:
+                        self.results["errors"] += 1
+            self.stop_event.wait(max(0.0, self.interval - (time.monotonic() - cycle_start)))
+        conn.close()
+
+
+def _route_label(path: str) -> str:
+    parts = path.split("/")
+    # /api/teams/<name>/xxx -> /api/teams/{name}/xxx
+    if len(parts) > 3 and parts[2] == "teams":
+        parts[3] = "{name}"
+    return "/".join(parts)
+
+
+# ------------------------------------------------------------
+# 文件变更与 WebSocket 客户端
+# ------------------------------------------------------------
+
+class Mutator:
+    """按速率修改 inbox 和任务文件，记录每个标记的写入时间"""
+
+    def __init__(self, data_dir: str, teams: list[str], rate: float, task_ratio: float):
+        self.data_dir = data_dir
+        self.teams = teams
+        self.rate = rate
+        self.task_ratio = task_ratio
+        self.written: dict[str, tuple[float, str]] = {}
+        self.counter = 0
+
+    def _mutate_inbox(self, team: str, marker: str):
+        inbox_dir = os.path.join(self.data_dir, "teams", team, "inboxes")
+        path = os.path.join(inbox_dir, random.choice(sorted(os.listdir(inbox_dir))))
+        with open(path, encoding="utf-8") as f:
+            messages = json.load(f)
+        messages.append({
+            "from": "team-lead",
+            "text": marker,
+            "summary": "load test",
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime()) + f".{self.counter % 1000:03d}Z",
+            "color": "blue",
+            "read": False,
+        })
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(messages, f, ensure_ascii=False)
+
+    def _mutate_task(self, team: str, marker: str):
+        task_dir = os.path.join(self.data_dir, "tasks", team)
+        path = os.path.join(task_dir, random.choice(sorted(os.listdir(task_dir))))
+        with open(path, encoding="utf-8") as f:
+            task = json.load(f)
+        task["subject"] = marker
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(task, f, ensure_ascii=False)
+
+    async def run(self, stop: asyncio.Event):
+        if self.rate <= 0:
+            return
+        interval = 1 / self.rate
+        while not stop.is_set():
+            self.counter += 1
+            marker = f"{MARKER_PREFIX}{self.counter}"
+            team = random.choice(self.teams)
+            kind = "task" if random.random() < self.task_ratio else "inbox"
+            self.written[marker] = (time.time(), kind)
+            if kind == "task":
+                self._mutate_task(team, marker)
+            else:
+                self._mutate_inbox(team, marker)
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+def _markers_in(event: dict) -> list[str]:
+    data = event.get("data") or {}
+    found = []
+    for message in data.get("messages") or []:
+        text = message.get("text") or ""
+        if text.startswith(MARKER_PREFIX):
+            found.append(text)
+    for change in data.get("tasks") or []:
+        subject = (change.get("task") or {}).get("subject") or ""
+        if subject.startswith(MARKER_PREFIX):
+            found.append(subject)
+    return found
+
+
+async def ws_client(url: str, received: list, stats: dict, stop: asyncio.Event):
+    """一个 WebSocket 客户端：回应心跳，记录收到的标记及送达时间"""
+    try:
+        async with websockets.connect(url, max_size=None, open_timeout=30) as ws:
+            stats["connected"] += 1
+            while not stop.is_set():
+                try:
+                    raw = await asyncio.wait_for(ws.recv(), timeout=0.5)
+                except asyncio.TimeoutError:
+                    continue
+                now = time.time()
+                stats["frames"] += 1
+                stats["bytes"] += len(raw)
+                frame = json.loads(raw)
+                if frame.get("type") == "ping":
+                    await ws.send(json.dumps({"action": "pong"}))
+                    continue
+                if frame.get("type") == "resync_required":
+                    stats["resyncs"] += 1
+                events = frame.get("events", []) if frame.get("type") == "batch" else [frame]
+                for event in events:
+                    for marker in _markers_in(event):
+                        received.append((marker, now))
+    except (OSError, websockets.WebSocketException) as e:
+        stats["errors"] += 1
+        stats["last_error"] = repr(e)
+
+
+# ------------------------------------------------------------
+# 主流程
+# ------------------------------------------------------------
+
+async def _drive(args, port: int, teams: list[str], server: subprocess.Popen) -> dict:
+    stop = asyncio.Event()
+    received: list[tuple[str, float]] = []
+    ws_stats = defaultdict(int)
+    query = {"token": args.token}
+    if args.ws_topic == "team":
+        query["topics"] = ",".join(f"team:{t}" for t in teams[:args.hot_teams])
+    if args.batch_ms:
+        query["batch_ms"] = args.batch_ms
+    url = f"ws://127.0.0.1:{port}/ws?{urllib.parse.urlencode(query)}"
+
+    clients = [asyncio.create_task(ws_client(url, received, ws_stats, stop)) for _ in range(args.ws_clients)]
+    # 等待连接建立后再开始计时
+    deadline = time.monotonic() + 30
+    while ws_stats["connected"] + ws_stats["errors"] < args.ws_clients and time.monotonic() < deadline:
+        await asyncio.sleep(0.1)
+
+    http_results = {"latency": defaultdict(list), "errors": 0}
+    http_lock = threading.Lock()
+    poll_stop = threading.Event()
+    profiles = page_profiles(teams)
+    names = list(profiles)
+    pollers = [
+        Poller(port, profiles[names[i % len(names)]], args.poll_interval, poll_stop, http_results, http_lock)
+        for i in range(args.pollers)
+    ]
+    for poller in pollers:
+        poller.start()
+
+    mutator = Mutator(args.data_dir, teams[:args.hot_teams], args.mutation_rate, args.task_ratio)
+    mutate_task = asyncio.create_task(mutator.run(stop))
+
+    rss_samples = []
+    started = time.monotonic()
+    while time.monotonic() - started < args.duration:
+        rss_samples.append(process_tree_rss(server.pid))
+        await asyncio.sleep(1)
+    elapsed = time.monotonic() - started
+
+    # 停止修改后留出送达时间
+    mutate_task.cancel()
+    poll_stop.set()
+    await asyncio.sleep(args.drain)
+    stop.set()
+    await asyncio.gather(*clients, return_exceptions=True)
+    for poller in pollers:
+        poller.join(timeout=35)
+
+    # 送达延迟：同一标记会被多个客户端收到，每次送达都计入
+    delivery = defaultdict(list)
+    seen = set()
+    for marker, at in received:
+        written = mutator.written.get(marker)
+        if not written:
+            continue
+        delivery[written[1]].append(at - written[0])
+        seen.add(marker)
+
+    all_latency = [x for samples in http_results["latency"].values() for x in samples]
+    requests = len(all_latency)
+    return {
+        "duration_seconds": round(elapsed, 1),
+        "http": {
+            "requests": requests,
+            "errors": http_results["errors"],
+            "throughput_rps": round(requests / elapsed, 1),
+            "latency": _percentiles(all_latency),
+            "by_route": {route: _percentiles(samples) for route, samples in sorted(http_results["latency"].items())},
+        },
+        "delivery": {
+            "mutations": len(mutator.written),
+            "markers_seen": len(seen),
+            "expected_deliveries": len(mutator.written) * ws_stats["connected"],
+            "deliveries": sum(len(v) for v in delivery.values()),
+            "missing": len(mutator.written) * ws_stats["connected"] - sum(len(v) for v in delivery.values()),
+            "latency": _percentiles([x for v in delivery.values() for x in v]),
+            "by_kind": {kind: _percentiles(samples) for kind, samples in delivery.items()},
+        },
+        "ws": {
+            "clients": args.ws_clients,
+            "connected": ws_stats["connected"],
+            "errors": ws_stats["errors"],
+            "last_error": ws_stats.get("last_error"),
+            "frames": ws_stats["frames"],
+            "frames_per_second": round(ws_stats["frames"] / elapsed, 1),
+            "bytes": ws_stats["bytes"],
+            "resyncs": ws_stats["resyncs"],
+        },
+        "rss_mb": {
+            "start": round(rss_samples[0] / 2**20, 1) if rss_samples else None,
+            "max": round(max(rss_samples) / 2**20, 1) if rss_samples else None,
+            "end": round(rss_samples[-1] / 2**20, 1) if rss_samples else None,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP 与 WebSocket 并发负载测试")
+    parser.add_argument("--data", help="数据集目录，不存在时按数据集参数生成；默认使用临时目录")
+    parser.add_argument("--ws-clients", type=int, default=20, help="WebSocket 客户端数 K")
+    parser.add_argument("--ws-topic", choices=["all", "team"], default="all", help="客户端订阅全部事件或只订阅被修改的团队")
+    parser.add_argument("--batch-ms", type=int, default=0, help="WebSocket 批量窗口（毫秒）")
+    parser.add_argument("--pollers", type=int, default=10, help="HTTP 轮询者数 M")
+    parser.add_argument("--poll-interval", type=float, default=2.0, help="每个轮询者的刷新间隔（秒）")
+    parser.add_argument("--mutation-rate", type=float, default=2.0, help="每秒修改的文件数")
+    parser.add_argument("--task-ratio", type=float, default=0.3, help="修改任务文件（而非 inbox）的比例")
+    parser.add_argument("--hot-teams", type=int, default=1, help="被修改的团队数")
+    parser.add_argument("--duration", type=float, default=30, help="测试时长（秒）")
+    parser.add_argument("--drain", type=float, default=3, help="停止修改后等待事件送达的时间（秒）")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker 数，大于 1 时启用多 worker 模式")
+    parser.add_argument("--token", default=os.environ.get("WS_TOKEN", "agent-teams-dashboard-secure-token"))
+    parser.add_argument("--output", help="结果 JSON 输出路径")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="agent-teams-load-")
+    args.data_dir = args.data or os.path.join(workdir, "claude")
+    dataset = None
+    if not os.path.isdir(os.path.join(args.data_dir, "teams")):
+        dataset = generate_dataset(args.data_dir, **dataset_kwargs(args))
+    teams = sorted(os.listdir(os.path.join(args.data_dir, "teams")))
+
+    port = _free_port()
+    server = start_server(
+        args.data_dir, os.path.join(workdir, "load.db"), port, args.workers,
+        {"WS_TOKEN": args.token},
+    )
+    try:
+        ready_seconds = wait_ready(port, timeout=600)
+        report = asyncio.run(_drive(args, port, teams, server))
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+    report = {
+        "config": {
+            "ws_clients": args.ws_clients, "ws_topic": args.ws_topic, "batch_ms": args.batch_ms,
+            "pollers": args.pollers, "poll_interval": args.poll_interval,
+            "mutation_rate": args.mutation_rate, "task_ratio": args.task_ratio,
+            "hot_teams": args.hot_teams, "workers": args.workers,
+            "dataset": dataset or {"params": dataset_kwargs(args), "reused": True},
+        },
+        "startup_ready_seconds": round(ready_seconds, 2),
+        **report,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"结果已写入 {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+"""文件事件追踪重放
+
+把 WATCHER_TRACE_PATH 录制的追踪文件在临时数据目录中重放：先按快照还原录制开始时的文件，
+全量扫描建库，然后按录制顺序逐个写入文件内容并把对应的 watchdog 事件交给 FileChangeHandler，
+经过 incremental_scan 和 broadcast_to_clients 完整处理。事件在单个线程中按顺序分发，
+与 watchdog 的分发线程一致，同一追踪文件每次重放的结果相同。
+
+报告内容：
+- 事件数（按类型）、扫描次数、每个事件触发的扫描数、没有产生变化的扫描数
+- 每次扫描耗时，以及从分发事件到广播完成的端到端延迟
+- 重放结束后的数据库与对最终文件全量扫描得到的数据库之间的差异，用于发现漏更新
+
+在 backend 目录下运行：
+    WATCHER_TRACE_PATH=/tmp/watch.jsonl uvicorn main:app      # 录制
+    python -m bench.replay /tmp/watch.jsonl --speed 10          # 10 倍速重放
+    python -m bench.replay /tmp/watch.jsonl --speed 0           # 不等待，尽快重放
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+
+from watchdog import events as fs_events
+
+# 比较数据库时忽略的列：自增 ID、外键 ID 和写入时间
+IGNORED_COLUMNS = {"id", "team_id", "created_at"}
+# 参与比较的表
+COMPARED_TABLES = ["teams", "members", "messages", "tasks", "task_edges", "participants", "agent_pairs"]
+# 差异报告中每张表列出的示例行数
+DIFF_EXAMPLES = 5
+
+_EVENT_CLASSES = {
+    ("created", False): fs_events.FileCreatedEvent,
+    ("modified", False): fs_events.FileModifiedEvent,
+    ("deleted", False): fs_events.FileDeletedEvent,
+    ("moved", False): fs_events.FileMovedEvent,
+    ("closed", False): fs_events.FileClosedEvent,
+    ("closed_no_write", False): fs_events.FileClosedNoWriteEvent,
+    ("opened", False): fs_events.FileOpenedEvent,
+    ("created", True): fs_events.DirCreatedEvent,
+    ("modified", True): fs_events.DirModifiedEvent,
+    ("deleted", True): fs_events.DirDeletedEvent,
+    ("moved", True): fs_events.DirMovedEvent,
+}
+
+
+def _percentiles(samples: list[float]) -> dict:
+    """耗时样本（秒）的统计，输出毫秒"""
+    if not samples:
+        return {"n": 0}
+    ordered = sorted(samples)
+    n = len(ordered)
+
+    def pct(p: float) -> float:
+        return round(ordered[min(n - 1, int(n * p))] * 1000, 3)
+
+    return {
+        "n": n,
+        "mean_ms": round(sum(ordered) / n * 1000, 3),
+        "p50_ms": pct(0.5),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def _write_file(path: str, content: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+def _remove(path: str):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def apply_event(root: str, record: dict):
+    """把录制的事件作用到数据目录上，返回对应的 watchdog 事件对象"""
+    src = os.path.join(root, record["path"])
+    dest = os.path.join(root, record["dest"]) if record.get("dest") else ""
+    kind = record["event"]
+    is_dir = record.get("is_directory", False)
+    content = record.get("content")
+
+    if is_dir:
+        if kind == "created":
+            os.makedirs(src, exist_ok=True)
+        elif kind == "deleted":
+            _remove(src)
+        elif kind == "moved" and os.path.exists(src):
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            os.replace(src, dest)
+    elif kind in ("created", "modified") and content is not None:
+        _write_file(src, content)
+    elif kind == "deleted":
+        _remove(src)
+    elif kind == "moved":
+        if content is not None:
+            _write_file(dest, content)
+        _remove(src)
+
+    cls = _EVENT_CLASSES.get((kind, is_dir))
+    if cls is None:
+        return None
+    return cls(src, dest) if kind == "moved" else cls(src)
+
+
+def dump_db(path: str) -> dict[str, Counter]:
+    """读取数据库中各表的内容，行以团队名代替 team_id，忽略自增列"""
+    conn = sqlite3.connect(path)
+    try:
+        result = {}
+        for table in COMPARED_TABLES:
+            columns = [
+                row[1] for row in conn.execute(f"PRAGMA table_info({table})")
+                if row[1] not in IGNORED_COLUMNS
+            ]
+            if not columns:
+                continue
+            select = ", ".join(f"x.{c}" for c in columns)
+            if table == "teams":
+                sql = f"SELECT {select} FROM teams x"
+            else:
+                sql = f"SELECT t.name, {select} FROM {table} x JOIN teams t ON x.team_id = t.id"
+            result[table] = Counter(tuple(row) for row in conn.execute(sql))
+        return result
+    finally:
+        conn.close()
+
+
+def diff_db(replayed: dict[str, Counter], reference: dict[str, Counter]) -> dict:
+    """比较两个数据库快照，返回各表仅存在于一侧的行数和示例"""
+    report = {}
+    for table in COMPARED_TABLES:
+        left = replayed.get(table, Counter())
+        right = reference.get(table, Counter())
+        only_replay = left - right
+        only_full = right - left
+        report[table] = {
+            "rows_replay": sum(left.values()),
+            "rows_full": sum(right.values()),
+            "only_replay": sum(only_replay.values()),
+            "only_full": sum(only_full.values()),
+            "examples_only_replay": [list(r) for r in list(only_replay)[:DIFF_EXAMPLES]],
+            "examples_only_full": [list(r) for r in list(only_full)[:DIFF_EXAMPLES]],
+        }
+    return report
+
+
+def replay(events: list[dict], root: str, speed: float) -> dict:
+    """按顺序重放事件，返回扫描和延迟统计"""
+    import watcher
+    from main import broadcast_to_clients
+
+    loop = asyncio.new_event_loop()
+    loop_thread = threading.Thread(target=loop.run_forever, daemon=True)
+    loop_thread.start()
+
+    scan_times = []
+    scans_by_index = defaultdict(int)
+    changed_by_index = defaultdict(int)
+    end_to_end = []
+    broadcast_types = Counter()
+    pending = 0
+    done = threading.Condition()
+    current = {"index": -1, "started": 0.0}
+
+    # 在 watcher 模块中替换扫描函数以统计每个事件触发的扫描
+    original_scan = watcher.incremental_scan
+
+    def counted_scan(path, root=None):
+        started = time.perf_counter()
+        result = original_scan(path, root)
+        scan_times.append(time.perf_counter() - started)
+        scans_by_index[current["index"]] += 1
+        if result:
+            changed_by_index[current["index"]] += 1
+        return result
+
+    def callback(event):
+        nonlocal pending
+        started = current["started"]
+        with done:
+            pending += 1
+
+        async def deliver():
+            nonlocal pending
+            try:
+                await broadcast_to_clients(event)
+            finally:
+                end_to_end.append(time.perf_counter() - started)
+                broadcast_types[event.get("type", "")] += 1
+                with done:
+                    pending -= 1
+                    done.notify_all()
+
+        return deliver()
+
+    handler = watcher.FileChangeHandler(callback)
+    handler.set_loop(loop)
+    watcher.incremental_scan = counted_scan
+    event_types = Counter()
+    skipped = 0
+    replay_start = time.perf_counter()
+    first_t = events[0]["t"] if events else 0.0
+    try:
+        for index, record in enumerate(events):
+            if speed > 0:
+                delay = (record["t"] - first_t) / speed - (time.perf_counter() - replay_start)
+                if delay > 0:
+                    time.sleep(delay)
+            event = apply_event(root, record)
+            event_types[record["event"] + ("_dir" if record.get("is_directory") else "")] += 1
+            if event is None:
+                skipped += 1
+                continue
+            current["index"] = index
+            current["started"] = time.perf_counter()
+            handler.dispatch(event)
+            # 处理完当前事件再分发下一个，保证重放结果确定（扫描队列不会合并事件）
+            handler.root.scheduler.wait_idle()
+        with done:
+            done.wait_for(lambda: pending == 0, timeout=30)
+    finally:
+        watcher.incremental_scan = original_scan
+        loop.call_soon_threadsafe(loop.stop)
+        loop_thread.join()
+    elapsed = time.perf_counter() - replay_start
+
+    scans = sum(scans_by_index.values())
+    changed = sum(changed_by_index.values())
+    return {
+        "events": len(events),
+        "events_by_type": dict(event_types),
+        "events_unsupported": skipped,
+        "replay_seconds": round(elapsed, 3),
+        "recorded_seconds": round(events[-1]["t"] - first_t, 3) if events else 0,
+        "scans": scans,
+        "scans_with_changes": changed,
+        "scans_without_changes": scans - changed,
+        "scans_per_event": round(scans / len(events), 3) if events else 0,
+        "broadcasts": dict(broadcast_types),
+        "scan_latency": _percentiles(scan_times),
+        "end_to_end_latency": _percentiles(end_to_end),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="重放文件监控事件追踪")
+    parser.add_argument("trace", help="WATCHER_TRACE_PATH 录制的追踪文件")
+    parser.add_argument("--speed", type=float, default=10, help="重放倍速，0 表示不等待")
+    parser.add_argument("--base", help="追踪文件没有快照时，用于还原初始状态的数据目录（会被复制，不会修改）")
+    parser.add_argument("--output", help="结果 JSON 输出路径")
+    args = parser.parse_args()
+
+    # 必须在导入后端模块之前设置
+    os.environ.pop("WATCHER_TRACE_PATH", None)
+    from watch_trace import load_trace
+
+    header, snapshots, events = load_trace(args.trace)
+    workdir = tempfile.mkdtemp(prefix="agent-teams-replay-")
+    root = os.path.join(workdir, "claude")
+    if args.base:
+        shutil.copytree(args.base, root)
+    elif not snapshots:
+        parser.error("追踪文件没有快照，需要用 --base 指定初始数据目录")
+    for record in snapshots:
+        if record.get("content") is not None:
+            _write_file(os.path.join(root, record["path"]), record["content"])
+    for sub in ("teams", "tasks"):
+        os.makedirs(os.path.join(root, sub), exist_ok=True)
+
+    db_path = os.path.join(workdir, "replay.db")
+    os.environ["CLAUDE_DIR"] = root
+    os.environ["DATABASE_PATH"] = db_path
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+    # 增量扫描对另一数据目录的路径检查会输出警告，重放时屏蔽
+    logging.getLogger("scanner").setLevel(logging.ERROR)
+
+    from database import engine, init_db
+    from scanner import full_scan
+
+    init_db()
+    full_scan()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    report = {
+        "trace": {
+            "path": args.trace,
+            "recorded_from": header.get("claude_dir"),
+            "started_at": header.get("started_at"),
+            "snapshot_files": len(snapshots),
+        },
+        "speed": args.speed,
+        **replay(events, root, args.speed),
+    }
+
+    # 与对最终文件全量扫描的结果比较
+    engine.dispose()
+    replayed = dump_db(db_path)
+    os.replace(db_path, os.path.join(workdir, "replayed.db"))
+    init_db()
+    full_scan()
+    engine.dispose()
+    diff = diff_db(replayed, dump_db(db_path))
+    report["db_diff"] = diff
+    report["db_consistent"] = all(t["only_replay"] == 0 and t["only_full"] == 0 for t in diff.values())
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"结果已写入 {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
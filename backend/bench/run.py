@@ -0,0 +1,275 @@
+"""扫描与 API 基准测试
+
+测量项：
+- full_scan：空数据库冷启动扫描、数据未变化时的重复扫描
+- incremental_scan：分别修改 inbox、config.json、任务文件后的增量扫描，以及文件未变化的增量扫描
+- 各 API 接口：通过进程内 ASGI 客户端调用
+
+结果写为 JSON（含数据集参数、Python/SQLite 版本和 git 提交），
+--compare 可与之前的结果对比各项 p50 的变化。
+
+数据目录和数据库通过 CLAUDE_DIR / DATABASE_PATH 环境变量指向临时位置，不会触碰 ~/.claude 和 data.db。
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from bench.generate import add_arguments, dataset_kwargs, generate_dataset
+
+
+def _stats(samples: list[float]) -> dict:
+    """耗时样本（秒）的统计，输出毫秒"""
+    ordered = sorted(samples)
+    n = len(ordered)
+
+    def pct(p: float) -> float:
+        return round(ordered[min(n - 1, int(n * p))] * 1000, 3)
+
+    return {
+        "n": n,
+        "mean_ms": round(sum(ordered) / n * 1000, 3),
+        "min_ms": round(ordered[0] * 1000, 3),
+        "p50_ms": pct(0.5),
+        "p95_ms": pct(0.95),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=os.path.dirname(__file__),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_full_scan(repeat: int) -> dict:
+    from database import engine, init_db
+    from scanner import full_scan
+
+    cold = []
+    for _ in range(repeat):
+        engine.dispose()
+        if os.path.exists(os.environ["DATABASE_PATH"]):
+            os.remove(os.environ["DATABASE_PATH"])
+        init_db()
+        start = time.perf_counter()
+        full_scan()
+        cold.append(time.perf_counter() - start)
+
+    warm = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        full_scan()
+        warm.append(time.perf_counter() - start)
+    return {"full_cold": _stats(cold), "full_warm": _stats(warm)}
+
+
+def bench_incremental(team: str, agent: str, task_id: str, repeat: int) -> dict:
+    from scanner import TEAMS_DIR, TASKS_DIR, incremental_scan
+
+    inbox_path = os.path.join(TEAMS_DIR, team, "inboxes", f"{agent}.json")
+    config_path = os.path.join(TEAMS_DIR, team, "config.json")
+    task_path = os.path.join(TASKS_DIR, team, f"{task_id}.json")
+    originals = {}
+    for path in (inbox_path, config_path, task_path):
+        with open(path, encoding="utf-8") as f:
+            originals[path] = f.read()
+
+    def write(path: str, data):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+
+    def timed(path: str) -> float:
+        start = time.perf_counter()
+        incremental_scan(path)
+        return time.perf_counter() - start
+
+    results = {"inbox": [], "config": [], "task": [], "inbox_unchanged": []}
+    try:
+        inbox = json.loads(originals[inbox_path])
+        config = json.loads(originals[config_path])
+        task = json.loads(originals[task_path])
+        statuses = ["pending", "in_progress", "completed"]
+        for i in range(repeat):
+            inbox.append({
+                "from": "team-lead",
+                "text": f"bench message {i}",
+                "summary": "bench",
+                "timestamp": f"2030-01-01T00:{i // 60 % 60:02d}:{i % 60:02d}.000Z",
+                "color": "blue",
+                "read": False,
+            })
+            write(inbox_path, inbox)
+            results["inbox"].append(timed(inbox_path))
+
+            results["inbox_unchanged"].append(timed(inbox_path))
+
+            config["description"] = f"bench description {i}"
+            write(config_path, config)
+            results["config"].append(timed(config_path))
+
+            task["status"] = statuses[i % len(statuses)]
+            write(task_path, task)
+            results["task"].append(timed(task_path))
+    finally:
+        for path, content in originals.items():
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(content)
+        incremental_scan(inbox_path)
+        incremental_scan(task_path)
+    return {name: _stats(samples) for name, samples in results.items()}
+
+
+def api_endpoints(team: str, agent: str) -> list[tuple[str, str, dict]]:
+    """(名称, 路径, 查询参数) 列表"""
+    return [
+        ("teams", "/api/teams", {}),
+        ("team_detail", f"/api/teams/{team}", {}),
+        ("team_messages", f"/api/teams/{team}/messages", {"page": 1, "size": 20}),
+        ("team_messages_search", f"/api/teams/{team}/messages", {"search": "scanner"}),
+        ("team_messages_payload", f"/api/teams/{team}/messages", {"payload_type": "task_assignment"}),
+        ("message_flow", f"/api/teams/{team}/message-flow", {}),
+        ("message_flow_agent", f"/api/teams/{team}/message-flow", {"agent": agent}),
+        ("activity", f"/api/teams/{team}/activity", {}),
+        ("dashboard", f"/api/teams/{team}/dashboard", {}),
+        ("agents", f"/api/teams/{team}/agents", {}),
+        ("communication", f"/api/teams/{team}/communication", {}),
+        ("agent_conversations", f"/api/teams/{team}/agents/{agent}/conversations", {}),
+        ("agent_messages", f"/api/teams/{team}/agents/{agent}/messages", {}),
+        ("export_ndjson", f"/api/teams/{team}/export", {"format": "ndjson", "resource": "all"}),
+        ("tasks", f"/api/tasks/{team}", {}),
+        ("tasks_ready", f"/api/tasks/{team}/ready", {}),
+        ("tasks_graph", f"/api/tasks/{team}/graph", {}),
+        ("all_messages", "/api/messages", {"limit": 100}),
+        ("all_tasks", "/api/tasks", {}),
+        ("stats", "/api/stats", {}),
+    ]
+
+
+async def _bench_api(app, endpoints, repeat: int) -> dict:
+    from bench.asgi_client import ASGIClient
+
+    client = ASGIClient(app)
+    results = {}
+    for name, path, params in endpoints:
+        response = await client.get(path, params)  # 预热
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            response = await client.get(path, params)
+            samples.append(time.perf_counter() - start)
+        results[name] = {**_stats(samples), "status": response.status, "bytes": len(response.body)}
+    return results
+
+
+def bench_api(team: str, agent: str, repeat: int) -> dict:
+    from main import app
+
+    return asyncio.run(_bench_api(app, api_endpoints(team, agent), repeat))
+
+
+def compare(current: dict, baseline: dict):
+    """打印各项 p50 相对基线的变化"""
+    rows = []
+    for section in ("scan", "api"):
+        for name, stats in current.get(section, {}).items():
+            base = baseline.get(section, {}).get(name)
+            if not base:
+                continue
+            old, new = base["p50_ms"], stats["p50_ms"]
+            change = (new - old) / old * 100 if old else 0.0
+            rows.append((f"{section}.{name}", old, new, change))
+    width = max((len(r[0]) for r in rows), default=10)
+    print(f"{'项目'.ljust(width)}  {'基线p50':>10}  {'本次p50':>10}  {'变化':>8}")
+    for name, old, new, change in rows:
+        print(f"{name.ljust(width)}  {old:>10.3f}  {new:>10.3f}  {change:>+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="扫描与 API 基准测试")
+    parser.add_argument("--data", help="数据集目录，不存在时按数据集参数生成；默认使用临时目录")
+    parser.add_argument("--regenerate", action="store_true", help="即使数据集目录已存在也重新生成")
+    parser.add_argument("--db", help="基准测试使用的 SQLite 文件，默认使用临时文件")
+    parser.add_argument("--scan-repeat", type=int, default=3, help="full_scan 重复次数")
+    parser.add_argument("--incremental-repeat", type=int, default=20, help="每类增量扫描的重复次数")
+    parser.add_argument("--api-repeat", type=int, default=20, help="每个接口的请求次数")
+    parser.add_argument("--skip", nargs="*", default=[], choices=["scan", "incremental", "api"], help="跳过的测量项")
+    parser.add_argument("--output", help="结果 JSON 输出路径")
+    parser.add_argument("--compare", help="与之前的结果 JSON 对比")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="agent-teams-bench-")
+    data_dir = args.data or os.path.join(workdir, "claude")
+    dataset = None
+    if args.regenerate or not os.path.isdir(os.path.join(data_dir, "teams")):
+        dataset = generate_dataset(data_dir, **dataset_kwargs(args))
+
+    # 必须在导入后端模块之前设置
+    os.environ["CLAUDE_DIR"] = data_dir
+    os.environ["DATABASE_PATH"] = args.db or os.path.join(workdir, "bench.db")
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+    # 增量扫描对另一数据目录的路径检查会输出警告，测量时屏蔽
+    logging.getLogger("scanner").setLevel(logging.ERROR)
+
+    from database import init_db
+    from scanner import full_scan
+
+    team, agent, task_id = "team-000", "agent-1", "1"
+    results = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "data_dir": data_dir,
+            "dataset": dataset or {"params": dataset_kwargs(args), "reused": True},
+        },
+        "scan": {},
+        "api": {},
+    }
+
+    if "scan" not in args.skip:
+        results["scan"].update(bench_full_scan(args.scan_repeat))
+    else:
+        init_db()
+        full_scan()
+    # 屏蔽全量扫描结束时的日志
+    logging.getLogger().setLevel(logging.WARNING)
+
+    if "incremental" not in args.skip:
+        for name, stats in bench_incremental(team, agent, task_id, args.incremental_repeat).items():
+            results["scan"][f"incremental_{name}"] = stats
+
+    if "api" not in args.skip:
+        results["api"] = bench_api(team, agent, args.api_repeat)
+
+    text = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"结果已写入 {args.output}")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,30 @@
 """数据库引擎和会话管理"""
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
 
-# 数据库文件路径
-DB_PATH = os.path.join(os.path.dirname(__file__), "data.db")
+# 数据库文件路径，可通过 DATABASE_PATH 环境变量指定（如基准测试使用临时数据库）
+DB_PATH = os.environ.get("DATABASE_PATH") or os.path.join(os.path.dirname(__file__), "data.db")
 DATABASE_URL = f"sqlite:///{DB_PATH}"
+# 写锁等待超时（秒）：多个数据源根目录的扫描线程并发写入时等待而不是立即报 database is locked
+SQLITE_BUSY_TIMEOUT = float(os.environ.get("SQLITE_BUSY_TIMEOUT", "30"))
 
 # 创建引擎，SQLite 需要 check_same_thread=False 以支持多线程
 engine = create_engine(
     DATABASE_URL,
-    connect_args={"check_same_thread": False},
+    connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT},
     echo=False,
 )
 
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """WAL 模式下读不阻塞写，一个根目录扫描写入期间接口查询和其他根目录的读取照常进行"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
 # 会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -30,6 +41,26 @@ def get_db():
         db.close()
 
 
+# 数据库结构版本，表结构变化时递增
+# 数据库内容由文件扫描生成，版本不一致时直接删表重建，由启动时的全量扫描重新填充
+# （任务状态变化日志和吞吐量汇总无法从文件恢复，重建后从头记录）
+SCHEMA_VERSION = 10
+
+
 def init_db():
-    """初始化数据库，创建所有表"""
-    Base.metadata.create_all(bind=engine)
+    """初始化数据库，创建所有表
+
+    通过 SQLite 的 user_version 记录结构版本，旧版本数据库会被重建。
+    """
+    with engine.begin() as conn:
+        version = conn.exec_driver_sql("PRAGMA user_version").scalar()
+        if version != SCHEMA_VERSION:
+            Base.metadata.drop_all(bind=conn)
+            conn.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        Base.metadata.create_all(bind=conn)
+
+
+def schema_ready() -> bool:
+    """数据库结构是否已由其他进程初始化为当前版本"""
+    with engine.connect() as conn:
+        return conn.exec_driver_sql("PRAGMA user_version").scalar() == SCHEMA_VERSION
@@ -0,0 +1,195 @@
+"""WebSocket 事件日志
+
+在内存环形缓冲区中保留最近广播的事件及其序列号，
+客户端断线重连时可通过 ?since=<seq> 只补收漏掉的事件。
+可选将事件持久化到 SQLite，服务重启后仍可续传。
+
+epoch 标识一段连续的序列号空间：非持久化模式每次启动生成新的 epoch，
+客户端携带的 epoch 不一致时说明序列号已不可比较，需要全量重新同步。
+
+多 worker 模式下只有采集主进程调用 append 分配序列号并持久化，
+其他 worker 通过 poll_store 从 SQLite 读取新事件，沿用主进程的序列号和 epoch。
+"""
+import json
+import logging
+import os
+import threading
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from sqlalchemy.exc import SQLAlchemyError
+from database import SessionLocal
+from models import EventRecord
+
+logger = logging.getLogger(__name__)
+
+# 内存中保留的最近事件数量
+EVENT_LOG_SIZE = int(os.environ.get("EVENT_LOG_SIZE", "1000"))
+# 是否将事件持久化到 SQLite
+EVENT_LOG_PERSIST = os.environ.get("EVENT_LOG_PERSIST", "0").lower() in ("1", "true", "yes")
+
+# 持久化模式下每写入多少条事件清理一次超出容量的旧记录
+_TRIM_EVERY = 100
+
+
+class EventLog:
+    """带序列号的事件环形缓冲区"""
+
+    def __init__(self, capacity: int = EVENT_LOG_SIZE, persist: bool = EVENT_LOG_PERSIST):
+        self.capacity = capacity
+        self.persist = persist
+        self.epoch = uuid.uuid4().hex
+        self._events: deque[tuple[int, dict]] = deque(maxlen=capacity)
+        self._last_seq = 0
+        self._lock = threading.Lock()
+        self._since_trim = 0
+        # 单线程写入保证持久化顺序，且不阻塞调用方（事件循环）
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="event-log") if persist else None
+        if persist:
+            self._adopt_store_position()
+
+    @property
+    def last_seq(self) -> int:
+        return self._last_seq
+
+    @property
+    def first_seq(self) -> int:
+        """缓冲区中最早事件的序列号，缓冲区为空时为 last_seq + 1"""
+        return self._events[0][0] if self._events else self._last_seq + 1
+
+    def _adopt_store_position(self):
+        """沿用事件日志表中最新记录的 epoch 和序列号
+
+        在 worker 接受 WebSocket 连接之前调用，只读 worker 从一开始就使用主进程的 epoch，
+        不会因首次 poll_store 前的随机 epoch 让客户端重连时全量重新同步。
+        数据库尚未初始化（表不存在）时保留随机 epoch，由 load / poll_store 更新。
+        """
+        db = SessionLocal()
+        try:
+            latest = (
+                db.query(EventRecord.seq, EventRecord.epoch)
+                .order_by(EventRecord.seq.desc())
+                .first()
+            )
+        except SQLAlchemyError:
+            return
+        finally:
+            db.close()
+        if latest is not None:
+            self.epoch = latest.epoch
+            self._last_seq = latest.seq
+
+    def load(self):
+        """持久化模式下从 SQLite 恢复最近的事件和序列号"""
+        if not self.persist:
+            return
+        db = SessionLocal()
+        try:
+            records = (
+                db.query(EventRecord)
+                .order_by(EventRecord.seq.desc())
+                .limit(self.capacity)
+                .all()
+            )
+            if not records:
+                if self._last_seq:
+                    # 构造后事件日志表被重建（数据库结构版本变化），序列号从头开始
+                    self.epoch = uuid.uuid4().hex
+                    self._last_seq = 0
+                return
+            self.epoch = records[0].epoch
+            with self._lock:
+                for record in reversed(records):
+                    self._events.append((record.seq, json.loads(record.payload)))
+                self._last_seq = records[0].seq
+            logger.info(f"已恢复事件日志: {len(records)} 条，最新序列号 {self._last_seq}")
+        finally:
+            db.close()
+
+    def append(self, event: dict) -> int:
+        """为事件分配下一个序列号并写入缓冲区，返回序列号"""
+        with self._lock:
+            self._last_seq += 1
+            seq = self._last_seq
+            event["seq"] = seq
+            self._events.append((seq, event))
+        if self._writer:
+            self._writer.submit(self._persist, seq, event)
+        return seq
+
+    def poll_store(self) -> tuple[list[dict], bool]:
+        """读取其他进程写入事件日志表的新事件并追加到缓冲区
+
+        Returns:
+            (新事件列表, 是否出现断档)。事件日志被重建（epoch 变化、序列号回退）
+            或本进程落后太多导致部分事件已被清理时返回断档，
+            此时缓冲区被清空，本进程的客户端需要全量重新同步。
+        """
+        db = SessionLocal()
+        try:
+            latest = (
+                db.query(EventRecord.seq, EventRecord.epoch)
+                .order_by(EventRecord.seq.desc())
+                .first()
+            )
+            if latest is None or (latest.epoch == self.epoch and latest.seq == self._last_seq):
+                return [], False
+            reset = latest.epoch != self.epoch or latest.seq < self._last_seq
+            since = 0 if reset else self._last_seq
+            records = (
+                db.query(EventRecord)
+                .filter(EventRecord.seq > since)
+                .order_by(EventRecord.seq)
+                .all()
+            )
+        finally:
+            db.close()
+
+        gap = reset or (bool(records) and records[0].seq != since + 1)
+        events = [json.loads(record.payload) for record in records]
+        with self._lock:
+            # 尚未收到过任何事件时不存在可丢失的增量，不视为断档
+            had_events = self._last_seq > 0
+            if gap:
+                self._events.clear()
+                self.epoch = latest.epoch
+            for record, event in zip(records, events):
+                self._events.append((record.seq, event))
+            if records:
+                self._last_seq = records[-1].seq
+        return events, gap and had_events
+
+    def since(self, seq: int) -> list[dict] | None:
+        """返回序列号大于 seq 的事件
+
+        seq 之后的事件已被挤出缓冲区（或 seq 超前于当前序列号）时返回 None，
+        表示无法增量续传，客户端需要全量重新同步。
+        """
+        with self._lock:
+            if seq > self._last_seq or seq + 1 < self.first_seq:
+                return None
+            return [event for s, event in self._events if s > seq]
+
+    def _persist(self, seq: int, event: dict):
+        db = SessionLocal()
+        try:
+            data = event.get("data") or {}
+            db.add(EventRecord(
+                seq=seq,
+                epoch=self.epoch,
+                type=event.get("type", ""),
+                team=data.get("team", "") or "",
+                payload=json.dumps(event, ensure_ascii=False),
+                created_at=datetime.utcnow(),
+            ))
+            self._since_trim += 1
+            if self._since_trim >= _TRIM_EVERY:
+                self._since_trim = 0
+                db.query(EventRecord).filter(EventRecord.seq <= seq - self.capacity).delete()
+            db.commit()
+        except Exception as e:
+            logger.error(f"事件持久化失败: {e}")
+            db.rollback()
+        finally:
+            db.close()
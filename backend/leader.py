@@ -0,0 +1,68 @@
+"""多 worker 部署时的采集主进程选举
+
+uvicorn --workers N 启动多个进程时，只应有一个进程负责全量扫描和文件监控。
+各 worker 通过对同一个锁文件加 fcntl.flock 排他锁竞选：
+拿到锁的进程成为主进程（leader），负责扫描、监听并把事件写入 SQLite 事件日志；
+其余进程（follower）只提供读接口，轮询事件日志表把事件推送给自己的 WebSocket 客户端。
+主进程退出时锁随文件描述符释放，follower 下一次轮询即可接替。
+"""
+import logging
+import os
+from database import DB_PATH
+
+try:
+    import fcntl
+except ImportError:  # Windows 不支持 flock，只能单进程运行
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# 是否启用多 worker 模式（单主进程采集 + 事件日志跨进程分发）
+MULTI_WORKER = os.environ.get("MULTI_WORKER", "0").lower() in ("1", "true", "yes")
+# 主进程选举使用的锁文件
+INGEST_LOCK_PATH = os.environ.get("INGEST_LOCK_PATH", DB_PATH + ".ingest.lock")
+# follower 轮询事件日志表的间隔（秒）
+EVENT_POLL_INTERVAL = float(os.environ.get("EVENT_POLL_INTERVAL", "0.5"))
+
+
+class LeaderLock:
+    """基于 flock 的非阻塞排他锁，持有期间当前进程为采集主进程"""
+
+    def __init__(self, path: str = INGEST_LOCK_PATH):
+        self.path = path
+        self._fd: int | None = None
+
+    @property
+    def held(self) -> bool:
+        return self._fd is not None
+
+    def try_acquire(self) -> bool:
+        """尝试获取锁，已持有或获取成功返回 True，锁被其他进程持有返回 False"""
+        if self._fd is not None:
+            return True
+        if fcntl is None:
+            logger.warning("当前平台不支持 fcntl.flock，按单进程模式运行")
+            self._fd = -1
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        # 写入持有者 PID 便于排查
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+        return True
+
+    def release(self):
+        """释放锁（进程退出时内核也会自动释放）"""
+        if self._fd is None:
+            return
+        if self._fd >= 0:
+            try:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            finally:
+                os.close(self._fd)
+        self._fd = None
@@ -1,8 +1,12 @@
 """FastAPI 后端服务入口
 
 提供 Agent Teams Dashboard 的 REST API 和 WebSocket 实时推送服务。
-启动时全量扫描 ~/.claude/teams/ 和 ~/.claude/tasks/ 目录，
+启动后在后台全量扫描 ~/.claude/teams/ 和 ~/.claude/tasks/ 目录，
+扫描期间即可使用已有数据提供服务，扫描进度通过 /api/ready 查询；
 运行时通过 watchdog 监听文件变化进行增量更新。
+
+多 worker 模式（MULTI_WORKER=1）下只有竞选到锁文件的主进程负责扫描和监听，
+其他 worker 只提供读接口，并轮询 SQLite 事件日志把事件推送给各自的客户端。
 """
 import asyncio
 import logging
@@ -10,23 +14,36 @@ import os
 import secrets
 from pathlib import Path
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Query
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 from dotenv import load_dotenv
-import json
 
 # 加载 .env 文件中的环境变量
 env_path = Path(__file__).parent / ".env"
 load_dotenv(env_path)
 
-from database import init_db, get_db, SessionLocal
+from database import init_db, schema_ready, get_db, SessionLocal, engine
 from models import Team, Member, Message, Task
-from scanner import full_scan
-from watcher import start_watcher
+from scanner import SOURCE_ROOTS, full_scan, scan_progress
+from watcher import start_watchers
 from routes.teams import router as teams_router
-from routes.messages import router as messages_router
+from routes.messages import router as messages_router, recent_messages
 from routes.tasks import router as tasks_router
+from routes.export import router as export_router
+from routes.dashboard import router as dashboard_router
+from routes.agents import router as agents_router
+from routes.admin import router as admin_router
+from ws_manager import ConnectionManager
+from event_log import EventLog, EVENT_LOG_PERSIST
+from leader import LeaderLock, MULTI_WORKER, EVENT_POLL_INTERVAL
+import metrics
+from profiling import ProfilingMiddleware, slow_query_log
+from scan_scheduler import ViewTrackingMiddleware, view_tracker
+from message_cache import ALL_TEAMS, message_cache
+from task_rollup import TASK_ROLLUP_INTERVAL, prune_transitions, rollup_tasks
+from admission import gates as endpoint_gates
 
 # 日志配置
 logging.basicConfig(
@@ -35,8 +52,28 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# WebSocket 连接管理
-connected_clients: set[WebSocket] = set()
+# WebSocket 连接管理（按主题索引订阅者）
+ws_manager = ConnectionManager()
+
+# 最近事件的环形缓冲区，负责分配单调递增的序列号并支持断线续传
+# 多 worker 模式下事件经由 SQLite 事件日志在进程间分发，必须持久化
+event_log = EventLog(persist=EVENT_LOG_PERSIST or MULTI_WORKER)
+
+# 采集主进程选举锁
+leader_lock = LeaderLock()
+
+# 运行指标：SQL 计时钩子和 WebSocket 仪表
+if metrics.METRICS_ENABLED:
+    metrics.instrument_engine(engine)
+# 慢查询日志（阈值为 0 时钩子只做一次判断）
+slow_query_log.instrument(engine)
+metrics.register_ws_gauges(ws_manager)
+metrics.register_scan_queue_gauge([root.scheduler for root in SOURCE_ROOTS])
+metrics.register_message_cache_gauges(message_cache)
+metrics.register_endpoint_gauges(endpoint_gates)
+
+# 扫描调度：有 WebSocket 客户端订阅 team:<name> 的团队视为正在被查看
+view_tracker.set_ws_counter(lambda team: ws_manager.subscriber_count(f"team:{team}"))
 
 # WebSocket 认证令牌
 # 从环境变量读取，默认为固定值（生产环境应通过环境变量设置）
@@ -45,49 +82,151 @@ logger.info(f"WebSocket 认证令牌: {WS_TOKEN}")
 
 
 async def broadcast_to_clients(event: dict):
-    """向所有已连接的 WebSocket 客户端广播事件"""
-    if not connected_clients:
-        return
-    message = json.dumps(event, ensure_ascii=False)
-    disconnected = set()
-    for client in connected_clients:
+    """向订阅了事件所属主题的 WebSocket 客户端广播事件
+
+    每个事件都会写入事件日志并分配单调递增的 seq，无论当前是否有客户端连接。
+    """
+    with metrics.BROADCAST_DURATION.time():
+        event_log.append(event)
+        await ws_manager.broadcast(event)
+
+
+# 全局变量：各数据源根目录的文件监控器 (observer, handler)
+_watchers = []
+# 全局变量：follower 轮询事件日志的协程
+_follower_task = None
+# 全局变量：后台全量扫描的协程
+_scan_task = None
+# 全局变量：定期汇总任务吞吐量的协程
+_rollup_task = None
+
+
+def _start_watching():
+    """启动文件监控，变更事件调度到当前事件循环中广播
+
+    本进程从此负责入库，同时启用由入库维护的最近消息缓存。
+    """
+    global _watchers
+    message_cache.enabled = True
+    _watchers = start_watchers(broadcast_to_clients)
+    loop = asyncio.get_running_loop()
+    for _, handler in _watchers:
+        handler.set_loop(loop)
+    logger.info(f"文件监控已启动，共 {len(_watchers)} 个数据源目录")
+
+
+async def _initial_scan():
+    """每个数据源根目录在各自的线程中全量扫描，某个根目录完成即推送一次 scan_complete 事件
+
+    事件 data 为所有根目录的汇总进度，source 为刚完成的根目录名称（默认根目录为空字符串）。
+    """
+    async def scan_root(root):
+        await asyncio.to_thread(full_scan, root)
+        await broadcast_to_clients({
+            "type": "scan_complete",
+            "data": {**scan_progress.snapshot(), "source": root.label},
+        })
+
+    await asyncio.gather(*(scan_root(root) for root in SOURCE_ROOTS))
+
+
+async def _rollup_loop():
+    """采集主进程定期把任务状态变化日志汇总到吞吐量汇总表，并删除已汇总的变化"""
+    while True:
+        await asyncio.sleep(TASK_ROLLUP_INTERVAL)
         try:
-            await client.send_text(message)
-        except Exception:
-            disconnected.add(client)
-    # 清理断开的连接
-    connected_clients.difference_update(disconnected)
+            await asyncio.to_thread(rollup_tasks)
+        except Exception as e:
+            logger.error(f"任务吞吐量汇总失败: {e}")
+            continue
+        try:
+            await asyncio.to_thread(prune_transitions)
+        except Exception as e:
+            logger.error(f"清理任务状态变化日志失败: {e}")
 
 
-# 全局变量：文件监控器
-_observer = None
-_handler = None
+def _start_rollups():
+    global _rollup_task
+    if TASK_ROLLUP_INTERVAL > 0:
+        _rollup_task = asyncio.create_task(_rollup_loop())
 
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    """应用生命周期管理：启动时初始化数据库和扫描，关闭时停止监控"""
-    global _observer, _handler
+async def _follow_event_log():
+    """follower：轮询事件日志表，把主进程产生的事件推送给本进程的客户端
 
-    # 初始化数据库
-    init_db()
-    logger.info("数据库初始化完成")
+    主进程退出释放锁后由本进程接替采集。
+    """
+    while True:
+        await asyncio.sleep(EVENT_POLL_INTERVAL)
+        # 先竞选再读取：拿到锁时上一任主进程已退出，读完剩余事件后序列号可以接续
+        promoted = leader_lock.try_acquire()
+        try:
+            events, gap = await asyncio.to_thread(event_log.poll_store)
+        except Exception as e:
+            logger.error(f"读取事件日志失败: {e}")
+            events, gap = [], False
+        if gap:
+            ws_manager.send_all({"type": "resync_required", "reason": "evicted"})
+        for event in events:
+            await ws_manager.broadcast(event)
+
+        if promoted:
+            logger.info(f"进程 {os.getpid()} 接替为采集主进程")
+            _start_watching()
+            _start_rollups()
+            await _initial_scan()
+            return
 
-    # 全量扫描
-    full_scan()
 
-    # 启动文件监控
-    _observer, _handler = start_watcher(broadcast_to_clients)
-    _handler.set_loop(asyncio.get_event_loop())
-    logger.info("文件监控已启动")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期管理：启动时初始化数据库和扫描，关闭时停止监控"""
+    global _follower_task, _scan_task
+
+    if not MULTI_WORKER or leader_lock.try_acquire():
+        # 初始化数据库
+        init_db()
+        logger.info("数据库初始化完成")
+        event_log.load()
+
+        # 先启动文件监控再在后台全量扫描，扫描期间的文件变化不会遗漏
+        _start_watching()
+        _scan_task = asyncio.create_task(_initial_scan())
+        _start_rollups()
+        if MULTI_WORKER:
+            logger.info(f"进程 {os.getpid()} 为采集主进程")
+    else:
+        # 等待主进程完成数据库初始化，follower 不做结构变更
+        while not schema_ready():
+            await asyncio.sleep(EVENT_POLL_INTERVAL)
+        event_log.load()
+        _follower_task = asyncio.create_task(_follow_event_log())
+        logger.info(f"进程 {os.getpid()} 以只读 worker 运行，轮询事件日志")
+
+    # 启动 WebSocket 心跳
+    ws_manager.start()
 
     yield
 
+    if _follower_task:
+        _follower_task.cancel()
+    if _scan_task:
+        # 线程中的扫描无法中断，只取消等待
+        _scan_task.cancel()
+    if _rollup_task:
+        _rollup_task.cancel()
+    await ws_manager.stop()
+
     # 停止文件监控
-    if _observer:
-        _observer.stop()
-        _observer.join()
+    if _watchers:
+        for observer, handler in _watchers:
+            observer.stop()
+        for observer, handler in _watchers:
+            observer.join()
+            if handler.recorder:
+                handler.recorder.close()
         logger.info("文件监控已停止")
+    leader_lock.release()
 
 
 # 创建 FastAPI 应用
@@ -117,9 +256,21 @@ app.add_middleware(
 logger.info(f"CORS 允许的源: {ALLOWED_ORIGINS}")
 
 # 挂载路由
+# 按路由模板记录请求耗时
+if metrics.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+# 按抽样比例对请求做调用栈采样（默认关闭）
+app.add_middleware(ProfilingMiddleware)
+# 记录 HTTP 读取的团队，其文件变化优先扫描
+app.add_middleware(ViewTrackingMiddleware)
+
 app.include_router(teams_router)
 app.include_router(messages_router)
 app.include_router(tasks_router)
+app.include_router(export_router)
+app.include_router(dashboard_router)
+app.include_router(agents_router)
+app.include_router(admin_router)
 
 
 @app.get("/api/messages")
@@ -127,13 +278,28 @@ def get_all_messages(
     team: str | None = None,
     from_agent: str | None = None,
     msg_type: str | None = None,
+    payload_type: str | None = None,
+    task_id: str | None = None,
     search: str | None = None,
     limit: int = 50,
     offset: int = 0,
 ):
-    """获取全局消息列表，支持筛选"""
+    """获取全局消息列表，支持筛选
+
+    不带筛选条件（可指定团队）的最新消息优先从最近消息缓存返回。
+    """
     db = SessionLocal()
     try:
+        if offset == 0 and not (from_agent or msg_type or payload_type or task_id or search):
+            cached = None
+            if team:
+                cached = message_cache.recent(team, limit, lambda n: _recent_team_messages(db, team, n))
+            # 团队不存在时与下面的查询一样忽略团队条件
+            if cached is None:
+                cached = message_cache.recent(ALL_TEAMS, limit, lambda n: _recent_messages(db, n))
+            if cached is not None:
+                return cached[0]
+
         query = db.query(Message)
         if team:
             t = db.query(Team).filter(Team.name == team).first()
@@ -143,14 +309,32 @@ def get_all_messages(
             query = query.filter(Message.from_agent == from_agent)
         if msg_type:
             query = query.filter(Message.msg_type == msg_type)
+        if payload_type:
+            query = query.filter(Message.payload_type == payload_type)
+        if task_id:
+            query = query.filter(Message.payload_task_id == task_id)
         if search:
             query = query.filter(Message.text.contains(search))
-        messages = query.order_by(Message.timestamp.desc()).offset(offset).limit(limit).all()
+        messages = (
+            query.order_by(Message.timestamp.desc(), Message.id.desc()).offset(offset).limit(limit).all()
+        )
         return [m.to_dict() for m in messages]
     finally:
         db.close()
 
 
+def _recent_team_messages(db: Session, name: str, limit: int):
+    """最近消息缓存未命中时读取团队最新消息，团队不存在时返回 None"""
+    t = db.query(Team).filter(Team.name == name).first()
+    return recent_messages(db, t, limit) if t else None
+
+
+def _recent_messages(db: Session, limit: int):
+    """最近消息缓存未命中时读取全部团队的最新消息"""
+    messages = db.query(Message).order_by(Message.timestamp.desc(), Message.id.desc()).limit(limit).all()
+    return [m.to_dict() for m in messages], None
+
+
 @app.get("/api/tasks")
 def get_all_tasks(
     team: str | None = None,
@@ -201,18 +385,99 @@ def get_stats():
         db.close()
 
 
+@app.get("/api/ws/topics")
+def get_ws_topics():
+    """获取 WebSocket 连接数和各主题的订阅者数量"""
+    return {
+        "clients": len(ws_manager),
+        "topics": ws_manager.topic_counts(),
+    }
+
+
+@app.get("/api/ws/metrics")
+def get_ws_metrics():
+    """获取 WebSocket 发送队列深度、发送延迟及溢出/回收计数"""
+    return ws_manager.metrics()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Prometheus 文本格式的运行指标：请求/扫描/SQL 耗时直方图、文件监控速率和 WebSocket 状态"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/api/health")
+def get_health():
+    """存活检查：进程能响应请求即返回 ok"""
+    return {"status": "ok"}
+
+
+@app.get("/api/ready")
+def get_ready():
+    """就绪检查：返回初始全量扫描进度（已完成/总团队数、写入行数、预计剩余时间）
+
+    扫描完成前返回 503。只读 worker 不执行扫描，启动后即就绪。
+    """
+    is_follower = MULTI_WORKER and not leader_lock.held
+    progress = scan_progress.snapshot()
+    ready = is_follower or progress["ready"]
+    body = {"ready": ready, "role": "follower" if is_follower else "leader", "scan": progress}
+    return JSONResponse(body, status_code=200 if ready else 503)
+
+
+@app.get("/api/worker")
+def get_worker_info():
+    """获取当前 worker 进程的角色：leader 负责扫描和监听，follower 只提供读接口"""
+    return {
+        "pid": os.getpid(),
+        "multi_worker": MULTI_WORKER,
+        "role": "leader" if not MULTI_WORKER or leader_lock.held else "follower",
+        "event_seq": event_log.last_seq,
+        "epoch": event_log.epoch,
+    }
+
+
 @app.websocket("/ws")
-async def websocket_endpoint(ws: WebSocket, token: str | None = None):
+async def websocket_endpoint(
+    ws: WebSocket,
+    token: str | None = None,
+    topics: str | None = Query(None, description="逗号分隔的初始订阅主题，默认订阅全部事件"),
+    since: int | None = Query(None, description="重连时携带上次收到的事件序列号，只补收之后的事件"),
+    epoch: str | None = Query(None, description="上次连接时服务端返回的 epoch"),
+    batch_ms: int | None = Query(None, ge=0, description="批量窗口（毫秒），窗口内的事件合并为一帧发送"),
+):
     """WebSocket 端点：实时推送文件变化事件
 
     需要通过 token 参数进行认证：
     ws://localhost:8000/ws?token=xxx
 
     客户端连接后，当 ~/.claude/teams/ 或 ~/.claude/tasks/ 下的文件发生变化时，
-    会收到 JSON 格式的事件通知：
-    - {type: "team_update", data: {team: "xxx"}}
-    - {type: "message_new", data: {team: "xxx"}}
-    - {type: "task_update", data: {team: "xxx"}}
+    会收到 JSON 格式的增量事件：
+    - {type: "team_update", seq, data: {team, team_info, members, ..., counters}}
+    - {type: "message_new", seq, data: {team, messages, removed_message_ids, read_updates, counters}}
+    - {type: "task_update", seq, data: {team, tasks: [{task, old_status, new_status}], removed_task_ids, counters}}
+    - {type: "scan_complete", seq, data: {state, teams, task_dirs, rows, ...}}：启动时的后台全量扫描完成
+
+    data 中只包含实际发生变化的字段，客户端可直接合并到本地状态。
+
+    主题订阅：连接时可通过 topics 参数指定初始主题（如 topics=team:foo），
+    连接后可发送以下消息调整订阅，服务端回复 {type: "subscribed", topics: [...]}：
+    - {"action": "subscribe", "topics": ["team:foo", "event:task_update"]}
+    - {"action": "unsubscribe", "topics": ["*"]}
+    未指定主题的连接订阅全部事件（"*"）。
+
+    心跳：服务端定期发送 {type: "ping"}，客户端应回复 {"action": "pong"}，
+    长时间没有收到客户端任何消息的连接会被回收。
+    客户端发送队列溢出时会收到 {type: "resync_required"}，应重新拉取完整数据。
+
+    断线续传：连接建立后服务端先发送 {type: "hello", seq, epoch}。
+    重连时携带 since=<最后收到的 seq>&epoch=<epoch>，服务端会补发之后的事件；
+    若这些事件已被挤出事件日志或 epoch 不一致（服务已重启），
+    则发送 {type: "resync_required", reason: "evicted" | "epoch_changed"}。
+
+    批量窗口：连接时指定 batch_ms 或发送 {"action": "batch", "batch_ms": N}，
+    窗口内同一团队、同一类型的事件会被合并，多个事件以
+    {type: "batch", seq, events: [...]} 一帧发送；慢速链路可使用较大的窗口。
     """
     # 验证令牌
     if token != WS_TOKEN:
@@ -221,17 +486,30 @@ async def websocket_endpoint(ws: WebSocket, token: str | None = None):
         return
 
     await ws.accept()
-    connected_clients.add(ws)
-    logger.info(f"WebSocket 客户端已连接，当前连接数: {len(connected_clients)}")
+    initial_topics = [t.strip() for t in topics.split(",") if t.strip()] if topics else None
+    ws_manager.connect(ws, initial_topics, batch_ms)
+    # 以下步骤之间没有 await，补发的历史事件一定排在新广播的事件之前
+    ws_manager.send(ws, {"type": "hello", "seq": event_log.last_seq, "epoch": event_log.epoch})
+    if since is not None:
+        if epoch not in (None, event_log.epoch):
+            ws_manager.send(ws, {"type": "resync_required", "reason": "epoch_changed"})
+        else:
+            missed = event_log.since(since)
+            if missed is None:
+                ws_manager.send(ws, {"type": "resync_required", "reason": "evicted"})
+            else:
+                ws_manager.replay(ws, missed)
+    logger.info(f"WebSocket 客户端已连接，当前连接数: {len(ws_manager)}")
     try:
         while True:
-            # 保持连接，等待客户端消息（心跳）
-            await ws.receive_text()
+            # 接收订阅控制消息或心跳
+            text = await ws.receive_text()
+            await ws_manager.handle_client_message(ws, text)
     except WebSocketDisconnect:
         pass
     finally:
-        connected_clients.discard(ws)
-        logger.info(f"WebSocket 客户端已断开，当前连接数: {len(connected_clients)}")
+        ws_manager.disconnect(ws)
+        logger.info(f"WebSocket 客户端已断开，当前连接数: {len(ws_manager)}")
 
 
 if __name__ == "__main__":
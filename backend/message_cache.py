@@ -0,0 +1,196 @@
+"""最近消息的内存缓存
+
+每个团队在内存中保留最新的 MESSAGE_CACHE_SIZE 条消息（按时间戳、ID 降序），另有一个
+全部团队合并的最新消息环。入库时扫描器把新增、删除和已读变化的消息直接合并进缓存，
+"最新消息"的查询（/api/teams/{name}/messages 第一页、/api/messages?limit=N）
+命中时不访问数据库。
+
+总内存超过 MESSAGE_CACHE_MAX_MB 时按最近最少使用淘汰冷门团队，被淘汰或失效的团队
+下次查询时从数据库重新加载。
+
+一致性：缓存只由执行扫描的进程维护（单进程模式，或多 worker 模式下的采集主进程），
+只读 worker 不启用。加载与入库并发时，加载期间有过消息提交的结果不写入缓存，
+避免把提交前读到的数据与随后合并的增量叠加。
+"""
+import logging
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from metrics import MESSAGE_CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+# 每个团队缓存的最新消息条数，为 0 时不缓存
+MESSAGE_CACHE_SIZE = int(os.environ.get("MESSAGE_CACHE_SIZE", "100"))
+# 缓存占用内存上限（MB，按消息字段长度估算）
+MESSAGE_CACHE_MAX_MB = float(os.environ.get("MESSAGE_CACHE_MAX_MB", "64"))
+
+# 全部团队合并的最新消息环使用的键
+ALL_TEAMS = None
+
+
+def _sort_key(message: dict) -> tuple:
+    """与查询的 ORDER BY timestamp DESC, id DESC 一致"""
+    return message["timestamp"] or "", message["id"]
+
+
+def _estimate_bytes(message: dict) -> int:
+    """估算一条消息字典占用的内存：字典本身加各字段值"""
+    size = 240
+    for value in message.values():
+        size += 50 + len(value) if isinstance(value, str) else 32
+    return size
+
+
+class _Ring:
+    __slots__ = ("items", "total", "complete", "nbytes")
+
+    def __init__(self, items: list[dict], total: int | None, complete: bool):
+        self.items = items
+        # 团队消息总数，全部团队的消息环为 None
+        self.total = total
+        # 是否包含了全部消息（消息数不足容量），为 False 时环外还有更早的消息
+        self.complete = complete
+        self.nbytes = sum(_estimate_bytes(m) for m in items)
+
+
+class MessageCache:
+    """按团队划分的最新消息环，带内存上限和 LRU 淘汰"""
+
+    def __init__(self, size: int = MESSAGE_CACHE_SIZE, max_bytes: int = int(MESSAGE_CACHE_MAX_MB * 1024 * 1024)):
+        self.size = size
+        self.max_bytes = max_bytes
+        # 由执行扫描的进程启用，见模块说明
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._rings: OrderedDict = OrderedDict()
+        self._bytes = 0
+        # 团队 -> 已提交的消息变更次数 / 正在提交的写入数，用于判断加载结果是否仍然有效
+        self._generations: dict = {}
+        self._writers: dict = {}
+
+    def recent(self, team: str | None, limit: int, loader) -> tuple[list[dict], int | None] | None:
+        """返回团队最新的 limit 条消息和团队消息总数
+
+        Args:
+            team: 团队名，ALL_TEAMS 表示全部团队
+            limit: 返回条数
+            loader: 未命中时调用 loader(n)，从数据库读取最新 n 条消息（to_dict 后按时间降序）
+                和消息总数；返回 None 表示无法加载（如团队不存在），本方法也返回 None
+
+        缓存未启用或 limit 超过缓存容量时返回 None，调用方应直接查询数据库。
+        """
+        if not self.enabled or not 0 < limit <= self.size:
+            return None
+        with self._lock:
+            ring = self._rings.get(team)
+            if ring is not None:
+                self._rings.move_to_end(team)
+                MESSAGE_CACHE_REQUESTS.inc(result="hit")
+                return ring.items[:limit], ring.total
+            generation = self._generations.get(team, 0)
+        MESSAGE_CACHE_REQUESTS.inc(result="miss")
+
+        loaded = loader(self.size)
+        if loaded is None:
+            return None
+        items, total = loaded
+        with self._lock:
+            # 加载期间有消息提交（或正在提交）时，读到的可能是提交前的数据，不写入缓存
+            if self._generations.get(team, 0) == generation and not self._writers.get(team):
+                self._store(team, _Ring(items, total, len(items) < self.size))
+        return items[:limit], total
+
+    @contextmanager
+    def writing(self, team: str, changes: dict):
+        """包裹提交团队消息变更的事务
+
+        块正常结束（事务已提交）时把 changes 中的 messages / removed_message_ids / read_updates
+        合并进该团队和全部团队的消息环；块内抛出异常时丢弃这两个环。
+        """
+        if not self.enabled:
+            yield
+            return
+        keys = (team, ALL_TEAMS)
+        with self._lock:
+            for key in keys:
+                self._writers[key] = self._writers.get(key, 0) + 1
+        committed = False
+        try:
+            yield
+            committed = True
+        finally:
+            with self._lock:
+                for key in keys:
+                    self._writers[key] -= 1
+                    self._generations[key] = self._generations.get(key, 0) + 1
+                    ring = self._rings.get(key)
+                    if ring is None:
+                        continue
+                    if not committed or not self._apply(ring, changes):
+                        self._discard(key)
+                self._evict()
+
+    def invalidate(self, team: str):
+        """丢弃团队和全部团队的消息环（团队被删除时在事务提交后调用）"""
+        with self._lock:
+            for key in (team, ALL_TEAMS):
+                self._generations[key] = self._generations.get(key, 0) + 1
+                self._discard(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"teams": len(self._rings), "bytes": self._bytes}
+
+    def _apply(self, ring: _Ring, changes: dict) -> bool:
+        """把一次提交的消息变更合并进消息环，无法就地维护时返回 False"""
+        new_messages = changes.get("messages") or []
+        removed = set(changes.get("removed_message_ids") or ())
+        read_updates = {u["id"]: u["read"] for u in changes.get("read_updates") or ()}
+        if not (new_messages or removed or read_updates):
+            return True
+
+        items = [m for m in ring.items if m["id"] not in removed]
+        if len(items) < len(ring.items) and not ring.complete:
+            # 环内消息被删除后应由环外更早的消息补上，只能重新加载
+            return False
+        if read_updates:
+            # 不修改已返回给调用方的字典
+            items = [{**m, "read": read_updates[m["id"]]} if m["id"] in read_updates else m for m in items]
+        if new_messages:
+            # changes 中的字典同时作为推送事件的数据，复制后再缓存
+            items.extend(dict(m) for m in new_messages)
+            items.sort(key=_sort_key, reverse=True)
+        complete = ring.complete
+        if len(items) > self.size:
+            del items[self.size:]
+            complete = False
+        total = ring.total + len(new_messages) - len(removed) if ring.total is not None else None
+
+        self._bytes -= ring.nbytes
+        ring.items, ring.total, ring.complete = items, total, complete
+        ring.nbytes = sum(_estimate_bytes(m) for m in items)
+        self._bytes += ring.nbytes
+        return True
+
+    def _store(self, team, ring: _Ring):
+        self._discard(team)
+        self._rings[team] = ring
+        self._bytes += ring.nbytes
+        self._evict()
+
+    def _discard(self, team):
+        ring = self._rings.pop(team, None)
+        if ring is not None:
+            self._bytes -= ring.nbytes
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._rings:
+            team, ring = self._rings.popitem(last=False)
+            self._bytes -= ring.nbytes
+            logger.debug(f"最近消息缓存超出内存上限，淘汰: {team}")
+
+
+message_cache = MessageCache()
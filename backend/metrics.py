@@ -0,0 +1,379 @@
+"""进程内运行指标
+
+以 Prometheus 文本格式（text/plain; version=0.0.4）输出计数器、仪表和直方图，
+由 /metrics 接口提供，不依赖外部服务或 prometheus_client。
+
+记录一次观测只需一次加锁和一次二分查找，开销足够低，可在生产环境常开；
+设置 METRICS_ENABLED=0 可关闭 HTTP 中间件和 SQL 计时钩子。
+"""
+import bisect
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# 是否启用 HTTP 请求和 SQL 查询计时
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1").lower() in ("1", "true", "yes")
+
+# 耗时类直方图的默认桶（秒）
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# 数量类直方图的默认桶
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+_registry: list = []
+
+
+def _format_labels(labelnames: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    """可增可减的仪表
+
+    传入 callback 时在输出时调用它取值，返回数值（无标签）或 {标签值元组: 数值}。
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), callback=None):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple, float] = {}
+        self._callback = callback
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        if self._callback:
+            try:
+                result = self._callback()
+            except Exception:
+                return lines
+            items = sorted(result.items()) if isinstance(result, dict) else [((), result)]
+        else:
+            with self._lock:
+                items = sorted(self._values.items())
+        for key, value in items:
+            if value is None:
+                continue
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    """分桶直方图，输出累计桶计数、总和与样本数"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 标签值元组 -> [各桶计数..., 溢出桶计数, 总和]
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """上下文管理器：记录代码块的耗时（秒）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        with self._lock:
+            items = sorted((key, list(state)) for key, state in self._values.items())
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), state[:-1]):
+                cumulative += count
+                le = 'le="' + _format_value(float(bound)) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(state[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class RateMeter:
+    """滑动窗口内的事件速率（次/秒）"""
+
+    def __init__(self, window: float = 60.0):
+        self.window = window
+        self._times: deque[float] = deque()
+        self._lock = threading.Lock()
+
+    def mark(self):
+        now = time.monotonic()
+        with self._lock:
+            self._times.append(now)
+            self._expire(now)
+
+    def rate(self) -> float:
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            return len(self._times) / self.window
+
+    def _expire(self, now: float):
+        cutoff = now - self.window
+        while self._times and self._times[0] < cutoff:
+            self._times.popleft()
+
+
+def render() -> str:
+    """输出全部已注册指标的 Prometheus 文本格式"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ------------------------------------------------------------
+# 采集链路
+# ------------------------------------------------------------
+
+SCAN_DURATION = Histogram(
+    "scan_duration_seconds", "全量/增量扫描耗时", ("kind", "source"),
+)
+SCAN_STAGE_DURATION = Histogram(
+    "scan_stage_duration_seconds", "全量扫描各阶段累计耗时", ("stage", "source"),
+)
+SCAN_FILES_PARSED = Histogram(
+    "scan_files_parsed", "单次扫描解析的 JSON 文件数", ("kind", "source"), buckets=COUNT_BUCKETS,
+)
+SCAN_ROWS_WRITTEN = Histogram(
+    "scan_rows_written", "单次扫描写入（新增、更新或删除）的数据行数", ("kind", "source"), buckets=COUNT_BUCKETS,
+)
+WATCHER_EVENTS = Counter(
+    "watcher_events_total", "文件监控收到的 JSON 文件变化事件数", ("event", "source"),
+)
+watcher_rate = RateMeter()
+SCAN_QUEUE_WAIT = Histogram(
+    "scan_queue_wait_seconds", "扫描任务从入队到开始执行的等待时间", ("priority", "source"),
+)
+SCAN_QUEUE_AGED = Counter(
+    "scan_queue_aged_total", "因等待过久被提升优先级后才执行的扫描任务数", ("priority", "source"),
+)
+SCAN_QUEUE_COALESCED = Counter(
+    "scan_queue_coalesced_total", "与队列中同一团队待执行扫描合并的文件事件数", ("source",),
+)
+MESSAGE_CACHE_REQUESTS = Counter(
+    "message_cache_requests_total", "最新消息查询的内存缓存命中/未命中次数", ("result",),
+)
+Gauge(
+    "watcher_events_per_second", "最近 60 秒文件监控事件速率", callback=lambda: round(watcher_rate.rate(), 3),
+)
+
+# ------------------------------------------------------------
+# 数据库
+# ------------------------------------------------------------
+
+SQL_QUERY_DURATION = Histogram(
+    "sqlite_query_duration_seconds", "SQLite 语句执行耗时", ("statement",),
+)
+
+
+def _statement_kind(statement: str) -> str:
+    head = statement.lstrip()[:6].upper()
+    for kind in ("SELECT", "INSERT", "UPDATE", "DELETE"):
+        if head.startswith(kind):
+            return kind.lower()
+    return "other"
+
+
+def instrument_engine(engine):
+    """在 SQLAlchemy 引擎上注册语句计时钩子"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("query_start")
+        if starts:
+            SQL_QUERY_DURATION.observe(time.perf_counter() - starts.pop(), statement=_statement_kind(statement))
+
+
+# ------------------------------------------------------------
+# HTTP
+# ------------------------------------------------------------
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP 请求耗时（按路由模板）", ("method", "route", "status"),
+)
+
+
+class MetricsMiddleware:
+    """ASGI 中间件：按路由模板记录 HTTP 请求耗时
+
+    使用路由模板（如 /api/teams/{name}）而非实际路径作为标签，避免标签数量随参数膨胀；
+    流式响应的耗时包含完整的响应体发送时间。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - start,
+                method=scope.get("method", ""),
+                route=getattr(route, "path", "unmatched"),
+                status=status,
+            )
+
+
+ENDPOINT_COALESCED = Counter(
+    "endpoint_coalesced_total", "与进行中的相同请求合并、共享计算结果的请求数", ("endpoint",),
+)
+ENDPOINT_REJECTED = Counter(
+    "endpoint_rejected_total", "等待并发名额超时、返回 503 的请求数", ("endpoint",),
+)
+ENDPOINT_QUEUE_WAIT = Histogram(
+    "endpoint_queue_wait_seconds", "开销较大的接口等待并发名额的时间", ("endpoint",),
+)
+
+
+def register_endpoint_gauges(gates: dict):
+    """注册开销较大接口的计算中和排队中请求数"""
+    Gauge(
+        "endpoint_active", "正在线程池中计算的请求数", ("endpoint",),
+        callback=lambda: {(name,): gate.active for name, gate in gates.items()},
+    )
+    Gauge(
+        "endpoint_queued", "等待并发名额的请求数", ("endpoint",),
+        callback=lambda: {(name,): gate.queued for name, gate in gates.items()},
+    )
+
+
+# ------------------------------------------------------------
+# WebSocket
+# ------------------------------------------------------------
+
+BROADCAST_DURATION = Histogram(
+    "ws_broadcast_duration_seconds", "单个事件写入事件日志并放入各客户端发送队列的耗时",
+)
+
+
+def register_scan_queue_gauge(schedulers):
+    """注册各数据源根目录扫描队列按优先级的待执行任务数"""
+    Gauge(
+        "scan_queue_depth", "扫描队列中的待执行任务数", ("priority", "source"),
+        callback=lambda: {
+            (priority, scheduler.source): count
+            for scheduler in schedulers
+            for priority, count in scheduler.depth().items()
+        },
+    )
+
+
+def register_message_cache_gauges(cache):
+    """注册最近消息缓存的团队数和估算内存占用"""
+    Gauge("message_cache_teams", "最近消息缓存中的消息环数", callback=lambda: cache.stats()["teams"])
+    Gauge("message_cache_bytes", "最近消息缓存估算的内存占用（字节）", callback=lambda: cache.stats()["bytes"])
+
+
+def register_ws_gauges(manager):
+    """注册依赖连接管理器状态的仪表"""
+    Gauge("ws_clients", "当前 WebSocket 连接数", callback=lambda: len(manager))
+
+    def send_latency():
+        latency = manager.metrics()["send_latency_ms"]
+        return {
+            (q,): latency[key] / 1000 if latency[key] is not None else None
+            for q, key in (("0.5", "p50"), ("0.95", "p95"), ("0.99", "p99"))
+        }
+
+    Gauge(
+        "ws_send_latency_seconds", "事件从入队到发送完成的延迟（最近样本分位数）",
+        ("quantile",), callback=send_latency,
+    )
+    Gauge(
+        "ws_queue_depth", "全部客户端发送队列中的待发消息数",
+        callback=lambda: manager.metrics()["queue_depth"]["total"],
+    )
@@ -1,7 +1,7 @@
 """SQLAlchemy 数据库模型定义"""
 import json
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, Integer, Float, String, Text, Boolean, DateTime, ForeignKey, JSON, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from database import Base
 
@@ -16,11 +16,18 @@ class Team(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     config_path = Column(String(512), default="")
     lead_agent_id = Column(String(255), default="")
+    # 所属数据源根目录名称，默认根目录为空字符串
+    source = Column(String(255), default="", index=True)
 
     # 关联关系
     members = relationship("Member", back_populates="team", cascade="all, delete-orphan")
     messages = relationship("Message", back_populates="team", cascade="all, delete-orphan")
     tasks = relationship("Task", back_populates="team", cascade="all, delete-orphan")
+    task_edges = relationship("TaskEdge", back_populates="team", cascade="all, delete-orphan")
+    participants = relationship("Participant", back_populates="team", cascade="all, delete-orphan")
+    agent_pairs = relationship("AgentPair", back_populates="team", cascade="all, delete-orphan")
+    task_transitions = relationship("TaskTransition", back_populates="team", cascade="all, delete-orphan")
+    task_rollups = relationship("TaskRollup", back_populates="team", cascade="all, delete-orphan")
 
     def to_dict(self):
         return {
@@ -30,6 +37,7 @@ class Team(Base):
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "config_path": self.config_path,
             "lead_agent_id": self.lead_agent_id,
+            "source": self.source,
             "member_count": len(self.members) if self.members else 0,
         }
 
@@ -50,6 +58,11 @@ class Member(Base):
     # 关联关系
     team = relationship("Team", back_populates="members")
 
+    __table_args__ = (
+        # 扫描时按 (团队, 成员名) 就地更新成员行
+        UniqueConstraint("team_id", "name", name="uq_members_team_name"),
+    )
+
     def to_dict(self):
         return {
             "id": self.id,
@@ -77,10 +90,27 @@ class Message(Base):
     color = Column(String(50), default="")
     read = Column(Boolean, default=False)
     msg_type = Column(String(50), default="normal")
+    # 入库时从 text 中解析出的结构化字段，查询时无需再解析
+    payload_type = Column(String(100), default="")
+    payload_subject = Column(String(512), default="")
+    payload_task_id = Column(String(50), default="")
+    display_summary = Column(String(512), default="")
+    # 消息内容哈希（收件箱、发送者、时间戳、正文），增量入库时用于比对消息是否已存在
+    content_hash = Column(String(40), default="")
 
     # 关联关系
     team = relationship("Team", back_populates="messages")
 
+    __table_args__ = (
+        # 支持 "某任务的 task_assignment 消息" 这类筛选
+        Index("ix_messages_team_payload", "team_id", "payload_type", "payload_task_id"),
+        # 支持按团队的时间范围查询和时间分桶统计
+        Index("ix_messages_team_timestamp", "team_id", "timestamp"),
+        # 按发送者 / 收件人筛选的 agent 相关消息查询
+        Index("ix_messages_team_from", "team_id", "from_agent", "timestamp"),
+        Index("ix_messages_team_inbox", "team_id", "inbox_owner", "timestamp"),
+    )
+
     def to_dict(self):
         return {
             "id": self.id,
@@ -93,6 +123,10 @@ class Message(Base):
             "color": self.color,
             "read": self.read,
             "msg_type": self.msg_type,
+            "payload_type": self.payload_type,
+            "payload_subject": self.payload_subject,
+            "payload_task_id": self.payload_task_id,
+            "display_summary": self.display_summary,
         }
 
 
@@ -114,6 +148,12 @@ class Task(Base):
     # 关联关系
     team = relationship("Team", back_populates="tasks")
 
+    __table_args__ = (
+        # 扫描时按 (团队, 任务 ID) 就地更新任务行
+        UniqueConstraint("team_id", "task_id", name="uq_tasks_team_task_id"),
+        Index("ix_tasks_team_status", "team_id", "status"),
+    )
+
     def to_dict(self):
         return {
             "id": self.id,
@@ -127,3 +167,183 @@ class Task(Base):
             "blocks": self.blocks or [],
             "blocked_by": self.blocked_by or [],
         }
+
+
+class TaskEdge(Base):
+    """任务依赖边表
+
+    由扫描器根据任务文件的 blocks / blockedBy 维护，
+    每行表示 blocker_id 完成之前 blocked_id 无法开始。
+    """
+    __tablename__ = "task_edges"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    team_id = Column(Integer, ForeignKey("teams.id"), nullable=False)
+    blocker_id = Column(String(50), nullable=False)
+    blocked_id = Column(String(50), nullable=False)
+
+    # 关联关系
+    team = relationship("Team", back_populates="task_edges")
+
+    __table_args__ = (
+        Index("ix_task_edges_team_blocker", "team_id", "blocker_id"),
+        Index("ix_task_edges_team_blocked", "team_id", "blocked_id"),
+    )
+
+    def to_dict(self):
+        return {
+            "blocker_id": self.blocker_id,
+            "blocked_id": self.blocked_id,
+        }
+
+
+class TaskTransition(Base):
+    """任务状态变化日志表
+
+    任务文件被覆盖后数据库中只剩最新状态，入库时比对新旧状态把每次变化追加到该表。
+    首次入库的任务 from_status 为空，被删除的任务 to_status 为空。
+    """
+    __tablename__ = "task_transitions"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    team_id = Column(Integer, ForeignKey("teams.id"), nullable=False)
+    task_id = Column(String(50), nullable=False)
+    # 变化后的负责人
+    owner = Column(String(255), default="")
+    from_status = Column(String(50), default="")
+    to_status = Column(String(50), default="")
+    at = Column(DateTime, default=datetime.utcnow)
+    # 是否由文件变化实时记录；全量扫描时发现的变化，at 只是发现的时间
+    live = Column(Boolean, default=False)
+    # 在 from_status 中停留的秒数，进入该状态的时间未知时为空
+    seconds_in_from = Column(Float, nullable=True)
+
+    # 关联关系
+    team = relationship("Team", back_populates="task_transitions")
+
+    __table_args__ = (
+        Index("ix_task_transitions_at", "at"),
+        Index("ix_task_transitions_team_task", "team_id", "task_id", "at"),
+    )
+
+    def to_dict(self):
+        return {
+            "task_id": self.task_id,
+            "owner": self.owner,
+            "from_status": self.from_status,
+            "to_status": self.to_status,
+            "at": self.at.isoformat() if self.at else None,
+            "live": self.live,
+            "seconds_in_from": self.seconds_in_from,
+        }
+
+
+class TaskRollup(Base):
+    """任务吞吐量汇总表
+
+    后台定期按小时桶汇总状态变化日志，每行对应 (团队, 负责人, 桶, 状态)，
+    速度图表直接读取该表，不扫描日志。
+    """
+    __tablename__ = "task_rollups"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    team_id = Column(Integer, ForeignKey("teams.id"), nullable=False)
+    owner = Column(String(255), default="")
+    bucket_start = Column(DateTime, nullable=False)
+    status = Column(String(50), nullable=False)
+    # 汇总时处于该状态的任务数；该小时内没有执行过汇总时为空
+    task_count = Column(Integer, nullable=True)
+    # 进入 / 离开该状态的次数，进入 completed 的次数即完成吞吐量
+    entered = Column(Integer, default=0)
+    exited = Column(Integer, default=0)
+    # 离开该状态时已知停留时间的次数及停留秒数之和
+    timed_exits = Column(Integer, default=0)
+    seconds_in_status = Column(Float, default=0)
+
+    # 关联关系
+    team = relationship("Team", back_populates="task_rollups")
+
+    __table_args__ = (
+        UniqueConstraint("team_id", "bucket_start", "owner", "status", name="uq_task_rollups_key"),
+        Index("ix_task_rollups_bucket", "bucket_start"),
+    )
+
+
+class Participant(Base):
+    """团队通信参与者索引表
+
+    入库时按 (team, agent) 汇总该 agent 发送和接收的消息数及最早、最近活跃时间。
+    config.json 中没有的团队成员由该表补充。
+    """
+    __tablename__ = "participants"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    team_id = Column(Integer, ForeignKey("teams.id"), nullable=False)
+    agent = Column(String(255), nullable=False)
+    sent_count = Column(Integer, default=0)
+    received_count = Column(Integer, default=0)
+    first_seen = Column(String(50), default="")
+    last_seen = Column(String(50), default="")
+
+    # 关联关系
+    team = relationship("Team", back_populates="participants")
+
+    __table_args__ = (
+        UniqueConstraint("team_id", "agent", name="uq_participants_team_agent"),
+    )
+
+    def to_dict(self):
+        return {
+            "agent": self.agent,
+            "sent_count": self.sent_count,
+            "received_count": self.received_count,
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+        }
+
+
+class AgentPair(Base):
+    """agent 通信对索引表
+
+    入库时按 (team, from_agent, to_agent) 汇总消息数及最近一次通信时间，
+    to_agent 即消息所在收件箱的所有者。
+    """
+    __tablename__ = "agent_pairs"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    team_id = Column(Integer, ForeignKey("teams.id"), nullable=False)
+    from_agent = Column(String(255), nullable=False)
+    to_agent = Column(String(255), nullable=False)
+    count = Column(Integer, default=0)
+    last_seen = Column(String(50), default="")
+
+    # 关联关系
+    team = relationship("Team", back_populates="agent_pairs")
+
+    __table_args__ = (
+        UniqueConstraint("team_id", "from_agent", "to_agent", name="uq_agent_pairs_team_pair"),
+        Index("ix_agent_pairs_team_to", "team_id", "to_agent"),
+    )
+
+    def to_dict(self):
+        return {
+            "from": self.from_agent,
+            "to": self.to_agent,
+            "count": self.count,
+            "last_seen": self.last_seen,
+        }
+
+
+class EventRecord(Base):
+    """WebSocket 事件日志表
+
+    开启 EVENT_LOG_PERSIST 时保存最近广播的事件，服务重启后客户端仍可按序列号续传。
+    """
+    __tablename__ = "event_log"
+
+    seq = Column(Integer, primary_key=True, autoincrement=False)
+    epoch = Column(String(32), nullable=False)
+    type = Column(String(50), default="")
+    team = Column(String(255), default="")
+    payload = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,225 @@
+"""按需开启的性能剖析
+
+- 采样剖析：按 PROFILE_SAMPLE_RATE 的比例抽样请求，被抽中的请求处理期间，
+  后台线程每隔 PROFILE_INTERVAL_MS 通过 sys._current_frames() 采集所有忙碌线程的调用栈，
+  聚合为 collapsed stack 格式（"帧;帧;帧 次数"），可直接交给 flamegraph.pl / speedscope 生成火焰图。
+- 慢查询日志：SQL 执行耗时超过 SLOW_QUERY_MS 时记录语句、参数、耗时和 EXPLAIN QUERY PLAN。
+
+两者默认关闭，可通过环境变量或 /api/admin/profiling 接口（需设置 ADMIN_TOKEN）在运行时开关。
+"""
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# 请求抽样比例（0~1），0 表示关闭采样剖析
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+# 调用栈采样间隔（毫秒）
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", "5"))
+# collapsed stack 导出目录
+PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join(os.path.dirname(__file__), "profiles"))
+# 慢查询阈值（毫秒），0 表示关闭慢查询日志
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", "0"))
+
+# 聚合的不同调用栈数量上限，超出后新调用栈计入 "[truncated]"
+_MAX_STACKS = 20000
+# 调用栈最大深度
+_MAX_DEPTH = 128
+# 保留的最近慢查询条数
+_SLOW_QUERY_HISTORY = 100
+# 本项目代码所在目录：只记录正在执行本项目代码的线程，空闲的线程池、事件循环和监控线程不计入
+_APP_DIR = os.path.dirname(os.path.abspath(__file__)) + os.sep
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def _is_app_file(filename: str) -> bool:
+    return filename.startswith(_APP_DIR) and "site-packages" not in filename
+
+
+class StackSampler:
+    """被抽样的请求处理期间周期性采集线程调用栈"""
+
+    def __init__(self, sample_rate: float = PROFILE_SAMPLE_RATE, interval_ms: float = PROFILE_INTERVAL_MS):
+        self.sample_rate = sample_rate
+        self.interval = interval_ms / 1000
+        self._stacks: Counter = Counter()
+        self._lock = threading.Lock()
+        self._active = 0
+        self._wakeup = threading.Condition(self._lock)
+        self._thread: threading.Thread | None = None
+        self.samples = 0
+        self.profiled_requests = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+
+    def configure(self, sample_rate: float | None = None, interval_ms: float | None = None):
+        if sample_rate is not None:
+            self.sample_rate = max(0.0, min(1.0, sample_rate))
+        if interval_ms is not None:
+            self.interval = max(0.001, interval_ms / 1000)
+
+    def should_sample(self) -> bool:
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def begin(self):
+        """被抽中的请求开始处理"""
+        with self._lock:
+            self._active += 1
+            self.profiled_requests += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self._thread.start()
+            self._wakeup.notify()
+
+    def end(self):
+        with self._lock:
+            self._active -= 1
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        while True:
+            with self._lock:
+                while self._active <= 0:
+                    self._wakeup.wait()
+            if len(names) != threading.active_count():
+                names = {t.ident: t.name for t in threading.enumerate()}
+            self._sample(own, names)
+            time.sleep(self.interval)
+
+    def _sample(self, own: int, names: dict):
+        stacks = []
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            labels = []
+            busy = False
+            while frame is not None and len(labels) < _MAX_DEPTH:
+                labels.append(_frame_label(frame))
+                busy = busy or _is_app_file(frame.f_code.co_filename)
+                frame = frame.f_back
+            if not busy:
+                continue
+            labels.append(names.get(ident, f"thread-{ident}"))
+            stacks.append(";".join(reversed(labels)))
+        with self._lock:
+            self.samples += 1
+            for stack in stacks:
+                if stack not in self._stacks and len(self._stacks) >= _MAX_STACKS:
+                    stack = "[truncated]"
+                self._stacks[stack] += 1
+
+    def collapsed(self, reset: bool = False) -> str:
+        """返回 collapsed stack 文本"""
+        with self._lock:
+            items = self._stacks.most_common()
+            if reset:
+                self._stacks.clear()
+        return "".join(f"{stack} {count}\n" for stack, count in items)
+
+    def dump(self, reset: bool = False) -> str:
+        """将 collapsed stack 写入 PROFILE_DIR，返回文件路径"""
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"stacks-{datetime.now().strftime('%Y%m%d-%H%M%S')}.collapsed")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.collapsed(reset=reset))
+        return path
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "sample_rate": self.sample_rate,
+                "interval_ms": round(self.interval * 1000, 3),
+                "profiled_requests": self.profiled_requests,
+                "active_requests": self._active,
+                "samples": self.samples,
+                "distinct_stacks": len(self._stacks),
+            }
+
+
+sampler = StackSampler()
+
+
+class ProfilingMiddleware:
+    """ASGI 中间件：按抽样比例对请求开启调用栈采样"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not sampler.should_sample():
+            await self.app(scope, receive, send)
+            return
+        sampler.begin()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            sampler.end()
+
+
+class SlowQueryLog:
+    """记录超过阈值的 SQL 语句及其查询计划"""
+
+    def __init__(self, threshold_ms: float = SLOW_QUERY_MS):
+        self.threshold_ms = threshold_ms
+        self.recent: deque[dict] = deque(maxlen=_SLOW_QUERY_HISTORY)
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold_ms > 0
+
+    def instrument(self, engine):
+        """在 SQLAlchemy 引擎上注册计时钩子"""
+        from sqlalchemy import event
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def _before(conn, cursor, statement, parameters, context, executemany):
+            if self.enabled:
+                conn.info.setdefault("slow_query_start", []).append(time.perf_counter())
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def _after(conn, cursor, statement, parameters, context, executemany):
+            starts = conn.info.get("slow_query_start")
+            if not starts:
+                return
+            elapsed_ms = (time.perf_counter() - starts.pop()) * 1000
+            if self.enabled and elapsed_ms >= self.threshold_ms:
+                self._record(cursor, statement, parameters, executemany, elapsed_ms)
+
+    def _record(self, cursor, statement: str, parameters, executemany: bool, elapsed_ms: float):
+        plan = None
+        if not executemany and statement.lstrip()[:6].upper() in ("SELECT", "UPDATE", "DELETE"):
+            try:
+                rows = cursor.connection.execute(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+                plan = [row[-1] for row in rows]
+            except Exception as e:
+                plan = [f"EXPLAIN 失败: {e}"]
+        params = repr(parameters)
+        entry = {
+            "at": datetime.now().isoformat(timespec="seconds"),
+            "elapsed_ms": round(elapsed_ms, 3),
+            "statement": " ".join(statement.split()),
+            "parameters": params[:500] + ("..." if len(params) > 500 else ""),
+            "plan": plan,
+        }
+        self.recent.append(entry)
+        logger.warning(
+            f"慢查询 {entry['elapsed_ms']}ms: {entry['statement'][:1000]} 参数={entry['parameters']} "
+            f"查询计划={plan}"
+        )
+
+
+slow_query_log = SlowQueryLog()
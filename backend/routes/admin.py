@@ -0,0 +1,73 @@
+"""运维管理 API 路由
+
+运行时开关采样剖析、导出 collapsed stack 和查看慢查询。
+需要通过 token 参数或 X-Admin-Token 请求头认证（ADMIN_TOKEN）。
+未设置 ADMIN_TOKEN 时管理接口不启用，所有请求返回 404。
+"""
+import os
+import secrets
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from profiling import sampler, slow_query_log
+
+router = APIRouter(prefix="/api/admin", tags=["admin"])
+
+# 管理令牌，为空时不启用管理接口（不回退到 WS_TOKEN 或任何默认值）
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+
+
+def require_admin(
+    token: str | None = Query(None),
+    x_admin_token: str | None = Header(None),
+):
+    """校验管理令牌，未设置 ADMIN_TOKEN 时管理接口视为不存在"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="管理接口未启用")
+    # 常量时间比较，不通过响应时间泄露令牌前缀
+    if not secrets.compare_digest((token or x_admin_token or "").encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="管理令牌无效")
+
+
+@router.get("/profiling", dependencies=[Depends(require_admin)])
+def get_profiling_status():
+    """获取采样剖析和慢查询日志的当前配置与统计"""
+    return {
+        "sampler": sampler.status(),
+        "slow_query": {
+            "enabled": slow_query_log.enabled,
+            "threshold_ms": slow_query_log.threshold_ms,
+            "recorded": len(slow_query_log.recent),
+        },
+    }
+
+
+@router.post("/profiling", dependencies=[Depends(require_admin)])
+def update_profiling(
+    sample_rate: float | None = Query(None, ge=0, le=1, description="请求抽样比例，0 为关闭"),
+    interval_ms: float | None = Query(None, gt=0, le=1000, description="调用栈采样间隔（毫秒）"),
+    slow_query_ms: float | None = Query(None, ge=0, description="慢查询阈值（毫秒），0 为关闭"),
+):
+    """运行时调整采样剖析和慢查询日志"""
+    sampler.configure(sample_rate=sample_rate, interval_ms=interval_ms)
+    if slow_query_ms is not None:
+        slow_query_log.threshold_ms = slow_query_ms
+    return get_profiling_status()
+
+
+@router.get("/profiling/stacks", dependencies=[Depends(require_admin)], response_class=PlainTextResponse)
+def get_collapsed_stacks(
+    reset: bool = Query(False, description="导出后清空已采集的调用栈"),
+    save: bool = Query(False, description="同时写入 PROFILE_DIR 目录"),
+):
+    """导出 collapsed stack 文本（每行 "帧;帧;帧 次数"），可用 flamegraph.pl 或 speedscope 生成火焰图"""
+    if save:
+        path = sampler.dump(reset=reset)
+        with open(path, encoding="utf-8") as f:
+            return PlainTextResponse(f.read(), headers={"X-Profile-Path": path})
+    return PlainTextResponse(sampler.collapsed(reset=reset))
+
+
+@router.get("/slow-queries", dependencies=[Depends(require_admin)])
+def get_slow_queries(limit: int = Query(20, ge=1, le=100)):
+    """获取最近的慢查询及其 EXPLAIN QUERY PLAN，最新的在前"""
+    return list(reversed(slow_query_log.recent))[:limit]
@@ -0,0 +1,106 @@
+"""agent 通信索引相关 API 路由
+
+基于入库时维护的 participants / agent_pairs 索引表，
+提供参与者统计、通信关系和单个 agent 的会话视图。
+"""
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+from database import get_db
+from models import Team, Message, Participant, AgentPair
+from routes.messages import agent_message_ids
+
+router = APIRouter(prefix="/api/teams", tags=["agents"])
+
+
+def _get_team(name: str, db: Session) -> Team:
+    team = db.query(Team).filter(Team.name == name).first()
+    if not team:
+        raise HTTPException(status_code=404, detail=f"团队 '{name}' 不存在")
+    return team
+
+
+@router.get("/{name}/agents")
+def list_team_agents(name: str, db: Session = Depends(get_db)):
+    """获取团队通信参与者列表，含发送/接收消息数和最近活跃时间"""
+    team = _get_team(name, db)
+    participants = (
+        db.query(Participant)
+        .filter(Participant.team_id == team.id)
+        .order_by(Participant.last_seen.desc())
+        .all()
+    )
+    return [p.to_dict() for p in participants]
+
+
+@router.get("/{name}/communication")
+def get_team_communication(name: str, db: Session = Depends(get_db)):
+    """获取团队 "谁和谁通信" 关系：每个 (发送者, 收件人) 对的消息数和最近通信时间"""
+    team = _get_team(name, db)
+    pairs = (
+        db.query(AgentPair)
+        .filter(AgentPair.team_id == team.id)
+        .order_by(AgentPair.count.desc())
+        .all()
+    )
+    return [p.to_dict() for p in pairs]
+
+
+@router.get("/{name}/agents/{agent}/conversations")
+def get_agent_conversations(name: str, agent: str, db: Session = Depends(get_db)):
+    """获取某 agent 的会话列表：与每个对端之间的发送数、接收数和最近通信时间"""
+    team = _get_team(name, db)
+    pairs = (
+        db.query(AgentPair)
+        .filter(
+            AgentPair.team_id == team.id,
+            or_(AgentPair.from_agent == agent, AgentPair.to_agent == agent),
+        )
+        .all()
+    )
+    if not pairs:
+        raise HTTPException(status_code=404, detail=f"团队 '{name}' 中不存在 agent '{agent}' 的通信记录")
+
+    peers = {}
+    for p in pairs:
+        peer = p.to_agent if p.from_agent == agent else p.from_agent
+        item = peers.setdefault(peer, {"peer": peer, "sent_count": 0, "received_count": 0, "last_seen": ""})
+        # 自己发给自己的消息同时计入发送和接收
+        if p.from_agent == agent:
+            item["sent_count"] += p.count
+        if p.to_agent == agent:
+            item["received_count"] += p.count
+        item["last_seen"] = max(item["last_seen"], p.last_seen or "")
+
+    return {
+        "agent": agent,
+        "conversations": sorted(peers.values(), key=lambda c: c["last_seen"], reverse=True),
+    }
+
+
+@router.get("/{name}/agents/{agent}/messages")
+def get_agent_messages(
+    name: str,
+    agent: str,
+    peer: str | None = Query(None, description="只返回与该对端之间的消息"),
+    page: int = Query(1, ge=1, description="页码"),
+    size: int = Query(20, ge=1, le=100, description="每页数量"),
+    db: Session = Depends(get_db),
+):
+    """获取某 agent 发送或接收的消息，按时间戳降序分页"""
+    team = _get_team(name, db)
+    query = db.query(Message).filter(Message.id.in_(agent_message_ids(team.id, agent, peer)))
+
+    total = query.count()
+    messages = (
+        query.order_by(Message.timestamp.desc(), Message.id.desc())
+        .offset((page - 1) * size)
+        .limit(size)
+        .all()
+    )
+    return {
+        "total": total,
+        "page": page,
+        "size": size,
+        "items": [m.to_dict() for m in messages],
+    }
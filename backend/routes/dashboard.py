@@ -0,0 +1,142 @@
+"""团队仪表盘聚合 API 路由
+
+一次请求返回团队详情页所需的全部数据，避免前端并发多个请求、
+每个请求各自按名称查找团队并打开独立会话。
+"""
+from collections import defaultdict
+from fastapi import APIRouter, HTTPException, Query
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from admission import endpoint_gate
+from message_cache import message_cache
+from models import Team, Member, Message, Task
+from routes.messages import recent_messages
+
+router = APIRouter(prefix="/api/teams", tags=["dashboard"])
+
+# 可通过 include 参数选择的数据块
+DASHBOARD_SECTIONS = ("team", "stats", "messages", "tasks", "flow")
+
+# 团队更新时所有打开的仪表盘会同时刷新：相同参数的并发请求合并计算，并限制并发数
+_dashboard_gate = endpoint_gate("dashboard")
+
+
+def _parse_include(include: str | None) -> set[str]:
+    """解析 include 参数，未指定时返回全部数据块"""
+    if not include:
+        return set(DASHBOARD_SECTIONS)
+    sections = {s.strip() for s in include.split(",") if s.strip()}
+    unknown = sections - set(DASHBOARD_SECTIONS)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"未知的 include 数据块: {', '.join(sorted(unknown))}，可选: {', '.join(DASHBOARD_SECTIONS)}",
+        )
+    return sections
+
+
+def _team_stats(db: Session, team_id: int) -> dict:
+    """统计单个团队的成员数、消息数和各状态任务数"""
+    member_count = db.query(func.count(Member.id)).filter(Member.team_id == team_id).scalar()
+    message_count = db.query(func.count(Message.id)).filter(Message.team_id == team_id).scalar()
+    status_counts = dict(
+        db.query(Task.status, func.count(Task.id))
+        .filter(Task.team_id == team_id)
+        .group_by(Task.status)
+        .all()
+    )
+    task_count = sum(status_counts.values())
+    completed_count = status_counts.get("completed", 0)
+    completion_rate = (completed_count / task_count * 100) if task_count > 0 else 0
+    return {
+        "member_count": member_count,
+        "message_count": message_count,
+        "task_count": task_count,
+        "completed_count": completed_count,
+        "completion_rate": round(completion_rate, 1),
+        "tasks_by_status": status_counts,
+    }
+
+
+def _flow_aggregates(db: Session, team_id: int) -> dict:
+    """用 GROUP BY 计算消息流转统计，不加载消息本身"""
+    rows = (
+        db.query(Message.from_agent, Message.inbox_owner, Message.msg_type, func.count(Message.id))
+        .filter(Message.team_id == team_id)
+        .group_by(Message.from_agent, Message.inbox_owner, Message.msg_type)
+        .all()
+    )
+    flow_map = defaultdict(lambda: {"count": 0, "types": {}})
+    type_stats = defaultdict(int)
+    for from_agent, inbox_owner, msg_type, count in rows:
+        msg_type = msg_type or "normal"
+        flow = flow_map[(from_agent, inbox_owner)]
+        flow["count"] += count
+        flow["types"][msg_type] = flow["types"].get(msg_type, 0) + count
+        type_stats[msg_type] += count
+    return {
+        "flows": [
+            {"from": k[0], "to": k[1], "count": v["count"], "types": v["types"]}
+            for k, v in flow_map.items()
+        ],
+        "type_stats": dict(type_stats),
+    }
+
+
+@router.get("/{name}/dashboard")
+async def get_team_dashboard(
+    name: str,
+    include: str | None = Query(None, description="逗号分隔的数据块: team,stats,messages,tasks,flow，默认全部"),
+    message_limit: int = Query(20, ge=1, le=100, description="返回的最新消息数量"),
+):
+    """获取团队仪表盘聚合数据
+
+    在同一个数据库会话中返回团队详情（含成员）、团队统计、最新消息、
+    按状态分组的任务和消息流转统计。并发数超限且排队超时时返回 503。
+    """
+    sections = _parse_include(include)
+    return await _dashboard_gate.run(
+        (name, frozenset(sections), message_limit), _team_dashboard, name, sections, message_limit,
+    )
+
+
+def _team_dashboard(name: str, sections: set[str], message_limit: int, db: Session) -> dict:
+    team = db.query(Team).filter(Team.name == name).first()
+    if not team:
+        raise HTTPException(status_code=404, detail=f"团队 '{name}' 不存在")
+
+    result = {"team_name": team.name}
+
+    if "team" in sections:
+        team_data = team.to_dict()
+        team_data["members"] = [m.to_dict() for m in team.members]
+        result["team"] = team_data
+
+    if "stats" in sections:
+        result["stats"] = _team_stats(db, team.id)
+
+    if "messages" in sections:
+        cached = message_cache.recent(name, message_limit, lambda limit: recent_messages(db, team, limit))
+        if cached is not None:
+            result["messages"] = cached[0]
+        else:
+            messages = (
+                db.query(Message)
+                .filter(Message.team_id == team.id)
+                .order_by(Message.timestamp.desc(), Message.id.desc())
+                .limit(message_limit)
+                .all()
+            )
+            result["messages"] = [m.to_dict() for m in messages]
+
+    if "tasks" in sections:
+        grouped = {"pending": [], "in_progress": [], "completed": []}
+        tasks = db.query(Task).filter(Task.team_id == team.id).order_by(Task.task_id).all()
+        for t in tasks:
+            grouped.setdefault(t.status or "pending", []).append(t.to_dict())
+        result["tasks"] = grouped
+
+    if "flow" in sections:
+        result["flow"] = _flow_aggregates(db, team.id)
+
+    return result
@@ -0,0 +1,151 @@
+"""团队数据导出 API 路由
+
+以流式响应导出团队的完整消息和任务历史，支持 NDJSON / CSV 两种格式及可选 gzip 压缩。
+数据通过服务端游标（yield_per）分批读取，内存占用与数据量无关。
+"""
+import csv
+import io
+import json
+import zlib
+from urllib.parse import quote
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from database import get_db, SessionLocal
+from models import Team, Message, Task
+
+router = APIRouter(prefix="/api/teams", tags=["export"])
+
+# 每批从游标读取的行数
+EXPORT_BATCH_SIZE = 1000
+# 输出缓冲达到该字节数后才向客户端发送一个分块，减少小分块开销
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+# 各资源导出的列，顺序即 CSV 表头顺序
+MESSAGE_COLUMNS = [
+    "id", "team_id", "inbox_owner", "from_agent", "text", "summary", "timestamp",
+    "color", "read", "msg_type", "payload_type", "payload_subject", "payload_task_id",
+    "display_summary",
+]
+TASK_COLUMNS = [
+    "id", "team_id", "task_id", "subject", "description", "status", "active_form",
+    "owner", "blocks", "blocked_by",
+]
+
+
+def _iter_rows(team_id: int, resource: str):
+    """使用独立会话和服务端游标逐行读取导出数据
+
+    响应流式发送期间请求依赖注入的会话可能已关闭，因此这里自行管理会话。
+    产出 (kind, row_mapping) 元组。
+    """
+    db = SessionLocal()
+    try:
+        if resource in ("messages", "all"):
+            table = Message.__table__
+            stmt = (
+                select(*[table.c[c] for c in MESSAGE_COLUMNS])
+                .where(table.c.team_id == team_id)
+                .order_by(table.c.timestamp.asc(), table.c.id.asc())
+                .execution_options(yield_per=EXPORT_BATCH_SIZE)
+            )
+            for row in db.execute(stmt):
+                yield "message", row._mapping
+        if resource in ("tasks", "all"):
+            table = Task.__table__
+            stmt = (
+                select(*[table.c[c] for c in TASK_COLUMNS])
+                .where(table.c.team_id == team_id)
+                .order_by(table.c.id.asc())
+                .execution_options(yield_per=EXPORT_BATCH_SIZE)
+            )
+            for row in db.execute(stmt):
+                yield "task", row._mapping
+    finally:
+        db.close()
+
+
+def _iter_ndjson(team_id: int, resource: str):
+    """逐行生成 NDJSON 文本，导出全部资源时每行带 kind 字段区分类型"""
+    with_kind = resource == "all"
+    for kind, row in _iter_rows(team_id, resource):
+        item = {"kind": kind, **row} if with_kind else dict(row)
+        yield json.dumps(item, ensure_ascii=False) + "\n"
+
+
+def _iter_csv(team_id: int, resource: str):
+    """逐行生成 CSV 文本，列表类字段以 JSON 字符串写入单元格"""
+    columns = MESSAGE_COLUMNS if resource == "messages" else TASK_COLUMNS
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for _, row in _iter_rows(team_id, resource):
+        writer.writerow([
+            json.dumps(v, ensure_ascii=False) if isinstance(v, (list, dict)) else v
+            for v in (row[c] for c in columns)
+        ])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    yield buffer.getvalue()
+
+
+def _chunked(lines, compress: bool):
+    """将文本行合并为较大的字节分块，可选 gzip 压缩"""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS) if compress else None
+    parts = []
+    size = 0
+    for line in lines:
+        data = line.encode("utf-8")
+        parts.append(data)
+        size += len(data)
+        if size >= EXPORT_CHUNK_BYTES:
+            chunk = b"".join(parts)
+            parts, size = [], 0
+            if compressor:
+                chunk = compressor.compress(chunk)
+            if chunk:
+                yield chunk
+    chunk = b"".join(parts)
+    if compressor:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
+
+
+@router.get("/{name}/export")
+def export_team_data(
+    name: str,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="导出格式: ndjson/csv"),
+    resource: str = Query("all", pattern="^(messages|tasks|all)$", description="导出内容: messages/tasks/all"),
+    gzip: bool = Query(False, description="是否 gzip 压缩输出"),
+    db: Session = Depends(get_db),
+):
+    """流式导出团队的消息和任务历史
+
+    CSV 格式各资源列不同，只能导出单一资源（messages 或 tasks）。
+    """
+    team = db.query(Team).filter(Team.name == name).first()
+    if not team:
+        raise HTTPException(status_code=404, detail=f"团队 '{name}' 不存在")
+    if format == "csv" and resource == "all":
+        raise HTTPException(status_code=400, detail="CSV 导出需要指定 resource=messages 或 resource=tasks")
+
+    if format == "csv":
+        lines = _iter_csv(team.id, resource)
+        media_type = "text/csv; charset=utf-8"
+    else:
+        lines = _iter_ndjson(team.id, resource)
+        media_type = "application/x-ndjson"
+
+    filename = f"{name}-{resource}.{format}"
+    if gzip:
+        filename += ".gz"
+        media_type = "application/gzip"
+
+    return StreamingResponse(
+        _chunked(lines, gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename)}"},
+    )
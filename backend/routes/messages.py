@@ -1,27 +1,49 @@
 """消息相关 API 路由"""
+import math
 from collections import defaultdict
+from datetime import datetime, timezone
 from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import func, select, union, Integer
 from sqlalchemy.orm import Session
+from admission import endpoint_gate
 from database import get_db
+from message_cache import message_cache
 from models import Team, Message, Member
 
 router = APIRouter(prefix="/api/teams", tags=["messages"])
 
+# 活动直方图的基础桶宽（秒）
+ACTIVITY_BUCKET_SECONDS = {"minute": 60, "hour": 3600, "day": 86400}
+# 活动直方图支持的分组字段
+ACTIVITY_GROUP_COLUMNS = {"from_agent": Message.from_agent, "msg_type": Message.msg_type}
+
+# 读取团队全部消息的接口：相同参数的并发请求合并计算，并限制并发数
+_flow_gate = endpoint_gate("message-flow")
+_activity_gate = endpoint_gate("activity")
+
 
 @router.get("/{name}/messages")
 def get_team_messages(
     name: str,
     sender: str | None = Query(None, description="按发送者筛选"),
     msg_type: str | None = Query(None, description="按消息类型筛选"),
+    payload_type: str | None = Query(None, description="按消息负载的原始 type 筛选，如 task_assignment"),
+    task_id: str | None = Query(None, description="按消息负载中的任务 ID 筛选"),
     page: int = Query(1, ge=1, description="页码"),
     size: int = Query(20, ge=1, le=100, description="每页数量"),
     db: Session = Depends(get_db),
 ):
-    """获取团队消息，支持分页和筛选"""
-    team = db.query(Team).filter(Team.name == name).first()
-    if not team:
-        raise HTTPException(status_code=404, detail=f"团队 '{name}' 不存在")
+    """获取团队消息，支持分页和筛选
+
+    不带筛选条件的第一页优先从最近消息缓存返回，不访问数据库。
+    """
+    if page == 1 and not (sender or msg_type or payload_type or task_id):
+        cached = message_cache.recent(name, size, lambda limit: recent_messages(db, _get_team(db, name), limit))
+        if cached is not None:
+            items, total = cached
+            return {"total": total, "page": page, "size": size, "items": items}
 
+    team = _get_team(db, name)
     query = db.query(Message).filter(Message.team_id == team.id)
 
     # 筛选条件
@@ -29,13 +51,17 @@ def get_team_messages(
         query = query.filter(Message.from_agent == sender)
     if msg_type:
         query = query.filter(Message.msg_type == msg_type)
+    if payload_type:
+        query = query.filter(Message.payload_type == payload_type)
+    if task_id:
+        query = query.filter(Message.payload_task_id == task_id)
 
     # 总数
     total = query.count()
 
-    # 按时间戳降序排列，分页
+    # 按时间戳降序排列（同一时间戳按 ID，与最近消息缓存的顺序一致），分页
     messages = (
-        query.order_by(Message.timestamp.desc())
+        query.order_by(Message.timestamp.desc(), Message.id.desc())
         .offset((page - 1) * size)
         .limit(size)
         .all()
@@ -50,15 +76,19 @@ def get_team_messages(
 
 
 @router.get("/{name}/message-flow")
-def get_team_message_flow(
+async def get_team_message_flow(
     name: str,
     agent: str | None = Query(None, description="按 agent 筛选，只显示该 agent 相关的消息流转"),
-    db: Session = Depends(get_db),
 ):
     """获取团队消息流转分析数据，包括通信矩阵、时间线和 Mermaid 序列图
 
     支持 agent 参数：当指定 agent 时，只返回该 agent 发送或接收的消息流转。
+    并发数超限且排队超时时返回 503。
     """
+    return await _flow_gate.run((name, agent), _team_message_flow, name, agent)
+
+
+def _team_message_flow(name: str, agent: str | None, db: Session) -> dict:
     team = db.query(Team).filter(Team.name == name).first()
     if not team:
         raise HTTPException(status_code=404, detail=f"团队 '{name}' 不存在")
@@ -67,13 +97,18 @@ def get_team_message_flow(
     members = [m.name for m in db.query(Member).filter(Member.team_id == team.id).all()]
 
     # 获取该团队所有消息，按时间升序
-    query = db.query(Message).filter(Message.team_id == team.id)
+    # 只读取流转分析需要的列，摘要已在入库时解析好，无需再解析消息文本
+    query = db.query(
+        Message.from_agent,
+        Message.inbox_owner,
+        Message.msg_type,
+        Message.display_summary,
+        Message.timestamp,
+    ).filter(Message.team_id == team.id)
 
     # 如果指定了 agent，只获取该 agent 相关的消息
     if agent:
-        query = query.filter(
-            (Message.from_agent == agent) | (Message.inbox_owner == agent)
-        )
+        query = query.filter(Message.id.in_(agent_message_ids(team.id, agent)))
 
     all_messages = query.order_by(Message.timestamp.asc()).all()
 
@@ -103,7 +138,7 @@ def get_team_message_flow(
             "from": msg.from_agent,
             "to": msg.inbox_owner,
             "msg_type": msg.msg_type or "normal",
-            "summary": _extract_summary(msg.summary, msg.text),
+            "summary": msg.display_summary or "",
             "timestamp": msg.timestamp,
         }
         for msg in all_messages
@@ -123,6 +158,129 @@ def get_team_message_flow(
     }
 
 
+@router.get("/{name}/activity")
+async def get_team_activity(
+    name: str,
+    bucket: str = Query("auto", pattern="^(auto|minute|hour|day)$", description="桶粒度: auto/minute/hour/day"),
+    group_by: str | None = Query(None, pattern="^(from_agent|msg_type)$", description="按 from_agent 或 msg_type 拆分计数"),
+    start: str | None = Query(None, description="起始时间（ISO 8601，含）"),
+    end: str | None = Query(None, description="结束时间（ISO 8601，不含）"),
+    max_buckets: int = Query(200, ge=1, le=2000, description="最多返回的时间桶数量"),
+):
+    """获取团队消息活动直方图，按时间分桶统计消息数量
+
+    计数由 SQL GROUP BY 在 (team_id, timestamp) 索引上完成。
+    当时间范围按所选粒度会超过 max_buckets 时，桶宽自动放大为基础粒度的整数倍，
+    保证返回的数据量有上限。只返回有消息的桶。并发数超限且排队超时时返回 503。
+    """
+    return await _activity_gate.run(
+        (name, bucket, group_by, start, end, max_buckets),
+        _team_activity, name, bucket, group_by, start, end, max_buckets,
+    )
+
+
+def _team_activity(
+    name: str, bucket: str, group_by: str | None, start: str | None, end: str | None, max_buckets: int, db: Session
+) -> dict:
+    team = db.query(Team).filter(Team.name == name).first()
+    if not team:
+        raise HTTPException(status_code=404, detail=f"团队 '{name}' 不存在")
+
+    filters = [Message.team_id == team.id, Message.timestamp != ""]
+    if start:
+        filters.append(Message.timestamp >= start)
+    if end:
+        filters.append(Message.timestamp < end)
+
+    # 时间戳以 ISO 8601 字符串存储，截取到秒后交给 SQLite 转为 Unix 秒
+    epoch = func.cast(func.strftime("%s", func.substr(Message.timestamp, 1, 19)), Integer)
+
+    first, last = db.query(func.min(epoch), func.max(epoch)).filter(*filters).one()
+    bucket_seconds = _choose_bucket_seconds(bucket, (last - first) if first is not None else 0, max_buckets)
+
+    result = {
+        "team_name": name,
+        "bucket_seconds": bucket_seconds,
+        "group_by": group_by,
+        "buckets": [],
+    }
+    if first is None:
+        return result
+
+    bucket_expr = (epoch // bucket_seconds * bucket_seconds).label("bucket")
+    columns = [bucket_expr]
+    if group_by:
+        columns.append(ACTIVITY_GROUP_COLUMNS[group_by])
+    rows = (
+        db.query(*columns, func.count(Message.id))
+        .filter(*filters, epoch.isnot(None))
+        .group_by(*columns)
+        .order_by(bucket_expr)
+        .all()
+    )
+
+    buckets = {}
+    for row in rows:
+        bucket_start, count = row[0], row[-1]
+        item = buckets.get(bucket_start)
+        if item is None:
+            item = buckets[bucket_start] = {
+                "start": datetime.fromtimestamp(bucket_start, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "count": 0,
+            }
+            if group_by:
+                item["groups"] = {}
+        item["count"] += count
+        if group_by:
+            key = row[1] or ""
+            item["groups"][key] = item["groups"].get(key, 0) + count
+
+    result["buckets"] = list(buckets.values())
+    return result
+
+
+def _get_team(db: Session, name: str) -> Team:
+    team = db.query(Team).filter(Team.name == name).first()
+    if not team:
+        raise HTTPException(status_code=404, detail=f"团队 '{name}' 不存在")
+    return team
+
+
+def recent_messages(db: Session, team: Team, limit: int) -> tuple[list[dict], int]:
+    """从数据库读取团队最新的 limit 条消息和消息总数，用于填充最近消息缓存"""
+    query = db.query(Message).filter(Message.team_id == team.id)
+    messages = query.order_by(Message.timestamp.desc(), Message.id.desc()).limit(limit).all()
+    return [m.to_dict() for m in messages], query.count()
+
+
+def agent_message_ids(team_id: int, agent: str, peer: str | None = None):
+    """构造某 agent 相关消息 ID 的子查询
+
+    用两个分别命中 (team_id, from_agent) 和 (team_id, inbox_owner) 索引的查询取并集，
+    代替 SQLite 无法用单个索引满足的 OR 条件。指定 peer 时只保留与该 agent 之间的消息。
+    """
+    sent = select(Message.id).where(Message.team_id == team_id, Message.from_agent == agent)
+    received = select(Message.id).where(Message.team_id == team_id, Message.inbox_owner == agent)
+    if peer is not None:
+        sent = sent.where(Message.inbox_owner == peer)
+        received = received.where(Message.from_agent == peer)
+    return union(sent, received)
+
+
+def _choose_bucket_seconds(bucket: str, span_seconds: int, max_buckets: int) -> int:
+    """根据粒度和时间跨度确定桶宽，使桶数量不超过 max_buckets
+
+    auto 时从 minute 开始选取第一个满足数量上限的粒度；
+    仍超出上限时将桶宽放大为该粒度的整数倍（降采样）。
+    """
+    candidates = list(ACTIVITY_BUCKET_SECONDS.values()) if bucket == "auto" else [ACTIVITY_BUCKET_SECONDS[bucket]]
+    for width in candidates:
+        if span_seconds // width + 1 <= max_buckets:
+            return width
+    base = candidates[-1]
+    return base * math.ceil((span_seconds + 1) / (max_buckets * base))
+
+
 def _escape_mermaid_label(text: str) -> str:
     """转义 Mermaid 标签中的特殊字符
 
@@ -150,42 +308,6 @@ def _escape_mermaid_label(text: str) -> str:
     return result[:50]  # 限制长度
 
 
-def _extract_summary(summary: str, text: str) -> str:
-    """提取消息摘要，优先从 JSON 格式中获取 subject 字段
-
-    当 summary 或 text 是 JSON/Python 字典格式时，尝试提取 subject 字段作为可读摘要。
-    """
-    import ast
-
-    # 优先处理 summary
-    for candidate in [summary, text]:
-        if not candidate:
-            continue
-        stripped = candidate.strip()
-        if stripped.startswith("{") or stripped.startswith("'"):
-            try:
-                # 尝试使用 ast.literal_eval 解析 Python 字面量（支持单引号）
-                data = ast.literal_eval(stripped)
-                if isinstance(data, dict):
-                    # 优先取 subject 字段
-                    if "subject" in data:
-                        return str(data["subject"])
-                    # 其次取 summary 字段
-                    if "summary" in data:
-                        return str(data["summary"])
-                    # 其次取 type 字段
-                    if "type" in data:
-                        return str(data["type"])
-                    # 都没有就返回类型名
-                    return "任务消息"
-            except (ValueError, SyntaxError, TypeError):
-                pass
-        else:
-            return candidate[:80] if candidate else ""
-
-    return summary[:80] if summary else (text[:80] if text else "")
-
-
 def _generate_mermaid(members: list[str], timeline: list[dict]) -> str:
     """根据成员和时间线生成 Mermaid 序列图文本"""
     lines = ["sequenceDiagram"]
@@ -1,11 +1,19 @@
 """任务相关 API 路由"""
+from collections import defaultdict
+from datetime import datetime, timezone
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from sqlalchemy import and_
+from sqlalchemy.orm import Session, aliased
+from admission import endpoint_gate
 from database import get_db
-from models import Team, Task
+from models import Team, Task, TaskEdge, TaskRollup
+from task_graph import DONE_STATUSES, analyze_task_graph, task_sort_key
 
 router = APIRouter(prefix="/api/tasks", tags=["tasks"])
 
+# 依赖图分析读取团队全部任务和依赖边：相同团队的并发请求合并计算，并限制并发数
+_graph_gate = endpoint_gate("task-graph")
+
 
 @router.get("/{team_name}")
 def get_team_tasks(
@@ -25,3 +33,141 @@ def get_team_tasks(
 
     tasks = query.order_by(Task.task_id).all()
     return [t.to_dict() for t in tasks]
+
+
+@router.get("/{team_name}/ready")
+def get_team_ready_tasks(team_name: str, db: Session = Depends(get_db)):
+    """获取团队的就绪任务：状态为 pending 且所有阻塞任务均已完成
+
+    直接在 task_edges 索引上用 NOT EXISTS 子查询完成筛选。
+    """
+    team = db.query(Team).filter(Team.name == team_name).first()
+    if not team:
+        raise HTTPException(status_code=404, detail=f"团队 '{team_name}' 不存在")
+
+    blocker = aliased(Task)
+    unresolved = (
+        db.query(TaskEdge.id)
+        .join(blocker, and_(blocker.team_id == TaskEdge.team_id, blocker.task_id == TaskEdge.blocker_id))
+        .filter(
+            TaskEdge.team_id == team.id,
+            TaskEdge.blocked_id == Task.task_id,
+            blocker.status.notin_(DONE_STATUSES),
+        )
+    )
+    tasks = (
+        db.query(Task)
+        .filter(Task.team_id == team.id, Task.status == "pending", ~unresolved.exists())
+        .all()
+    )
+    tasks.sort(key=lambda t: task_sort_key(t.task_id))
+    return [t.to_dict() for t in tasks]
+
+
+@router.get("/{team_name}/graph")
+async def get_team_task_graph(team_name: str):
+    """获取团队任务依赖图分析：就绪集合、阻塞链、依赖环和关键路径
+
+    只读取任务 ID、状态和 task_edges 中的依赖边，分析过程对节点和边线性遍历。
+    并发数超限且排队超时时返回 503。
+    """
+    return await _graph_gate.run(team_name, _team_task_graph, team_name)
+
+
+def _team_task_graph(team_name: str, db: Session) -> dict:
+    team = db.query(Team).filter(Team.name == team_name).first()
+    if not team:
+        raise HTTPException(status_code=404, detail=f"团队 '{team_name}' 不存在")
+
+    statuses = dict(db.query(Task.task_id, Task.status).filter(Task.team_id == team.id).all())
+    edges = db.query(TaskEdge.blocker_id, TaskEdge.blocked_id).filter(TaskEdge.team_id == team.id).all()
+
+    result = analyze_task_graph(statuses, [tuple(e) for e in edges])
+    result["team_name"] = team_name
+    return result
+
+
+@router.get("/{team_name}/velocity")
+def get_team_task_velocity(
+    team_name: str,
+    bucket: str = Query("hour", pattern="^(hour|day)$", description="桶粒度: hour/day"),
+    owner: str | None = Query(None, description="只统计该负责人的任务，空字符串表示未分配"),
+    start: str | None = Query(None, description="起始时间（ISO 8601，含）"),
+    end: str | None = Query(None, description="结束时间（ISO 8601，不含）"),
+    db: Session = Depends(get_db),
+):
+    """获取团队任务速度：各时间桶的完成数、进入各状态的次数、平均停留时间和各状态任务数
+
+    只读取后台定期写入的吞吐量汇总表（按小时汇总，最近一次汇总之后的变化尚未计入）。
+    tasks 为该桶内最后一次汇总时各状态的任务数，桶内没有执行过汇总时不返回。
+    """
+    team = db.query(Team).filter(Team.name == team_name).first()
+    if not team:
+        raise HTTPException(status_code=404, detail=f"团队 '{team_name}' 不存在")
+
+    query = db.query(TaskRollup).filter(TaskRollup.team_id == team.id)
+    if owner is not None:
+        query = query.filter(TaskRollup.owner == owner)
+    try:
+        if start:
+            query = query.filter(TaskRollup.bucket_start >= _parse_time(start))
+        if end:
+            query = query.filter(TaskRollup.bucket_start < _parse_time(end))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start / end 不是有效的 ISO 8601 时间")
+
+    buckets = {}
+    # 桶 -> {小时: {状态: 任务数}}，天粒度取当天最后一次汇总
+    snapshots = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
+    owners = defaultdict(lambda: {"completed": 0, "entered": 0})
+    for row in query.order_by(TaskRollup.bucket_start):
+        key = row.bucket_start if bucket == "hour" else row.bucket_start.replace(hour=0)
+        item = buckets.get(key)
+        if item is None:
+            item = buckets[key] = {
+                "entered": defaultdict(int),
+                "exited": defaultdict(int),
+                "timed": defaultdict(lambda: [0, 0.0]),
+            }
+        item["entered"][row.status] += row.entered
+        item["exited"][row.status] += row.exited
+        timed = item["timed"][row.status]
+        timed[0] += row.timed_exits
+        timed[1] += row.seconds_in_status
+        if row.task_count is not None:
+            snapshots[key][row.bucket_start][row.status] += row.task_count
+        owners[row.owner]["entered"] += row.entered
+        if row.status == "completed":
+            owners[row.owner]["completed"] += row.entered
+
+    result = []
+    for key, item in buckets.items():
+        entry = {
+            "start": key.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "completed": item["entered"].get("completed", 0),
+            "entered": {s: n for s, n in item["entered"].items() if n},
+            "exited": {s: n for s, n in item["exited"].items() if n},
+            "avg_seconds_in_status": {
+                s: round(seconds / n, 1) for s, (n, seconds) in item["timed"].items() if n
+            },
+        }
+        if key in snapshots:
+            latest = snapshots[key][max(snapshots[key])]
+            entry["tasks"] = {s: n for s, n in latest.items() if n}
+        result.append(entry)
+
+    return {
+        "team_name": team_name,
+        "bucket": bucket,
+        "owner": owner,
+        "buckets": result,
+        "owners": {o: v for o, v in owners.items() if v["entered"]},
+    }
+
+
+def _parse_time(value: str) -> datetime:
+    """解析 ISO 8601 时间，带时区的转换为 UTC（汇总表中的时间为 UTC）"""
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
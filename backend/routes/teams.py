@@ -1,5 +1,5 @@
 """团队相关 API 路由"""
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from database import get_db
 from models import Team, Task
@@ -8,10 +8,15 @@ router = APIRouter(prefix="/api/teams", tags=["teams"])
 
 
 @router.get("")
-def list_teams(db: Session = Depends(get_db)):
+def list_teams(
+    source: str | None = Query(None, description="只返回指定数据源根目录的团队，默认根目录为空字符串"),
+    db: Session = Depends(get_db),
+):
     """获取所有团队列表"""
-    teams = db.query(Team).all()
-    return [t.to_dict() for t in teams]
+    query = db.query(Team)
+    if source is not None:
+        query = query.filter(Team.source == source)
+    return [t.to_dict() for t in query.all()]
 
 
 @router.get("/{name}")
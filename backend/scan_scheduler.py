@@ -0,0 +1,200 @@
+"""按优先级调度的扫描队列
+
+每个数据源根目录有一个 ScanScheduler 和一个工作线程，该根目录的所有扫描都在这个线程中执行：
+- 高优先级：正在被查看的团队（有 WebSocket 客户端订阅 team:<name>，或近期有 HTTP 读取）的文件变化
+- 普通优先级：其他团队的文件变化
+- 低优先级：后台对账（全量扫描各团队、任务目录和清理）
+
+文件变化任务的优先级在出队时计算，入队后才开始查看的团队同样会被提前。
+同一团队同类文件的待执行扫描会合并为一次（扫描执行时读取的是文件最新内容）。
+任务每等待 SCAN_AGING_SECONDS 秒提升一级，低优先级任务不会被持续的高优先级任务饿死。
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+from urllib.parse import parse_qs
+
+from metrics import SCAN_QUEUE_AGED, SCAN_QUEUE_COALESCED, SCAN_QUEUE_WAIT
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+PRIORITY_NAMES = {PRIORITY_HIGH: "high", PRIORITY_NORMAL: "normal", PRIORITY_LOW: "low"}
+
+# 任务每等待多少秒提升一个优先级
+SCAN_AGING_SECONDS = float(os.environ.get("SCAN_AGING_SECONDS", "5"))
+# HTTP 读取后多少秒内视为团队正在被查看
+SCAN_VIEW_TTL = float(os.environ.get("SCAN_VIEW_TTL", "30"))
+
+
+class ViewTracker:
+    """记录哪些团队正在被查看：WebSocket 订阅由连接管理器提供，HTTP 读取由中间件记录"""
+
+    def __init__(self):
+        self._http_reads: dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._ws_viewers = None
+
+    def set_ws_counter(self, counter):
+        """设置返回团队 WebSocket 订阅数的函数"""
+        self._ws_viewers = counter
+
+    def touch(self, team: str):
+        """记录一次对团队数据的 HTTP 读取"""
+        now = time.monotonic()
+        with self._lock:
+            self._http_reads[team] = now
+            # 顺带清理过期记录，避免团队名无限累积
+            if len(self._http_reads) > 1000:
+                self._http_reads = {t: at for t, at in self._http_reads.items() if now - at < SCAN_VIEW_TTL}
+
+    def is_viewed(self, team: str) -> bool:
+        if self._ws_viewers and self._ws_viewers(team) > 0:
+            return True
+        with self._lock:
+            at = self._http_reads.get(team)
+        return at is not None and time.monotonic() - at < SCAN_VIEW_TTL
+
+
+view_tracker = ViewTracker()
+
+
+class _Job:
+    __slots__ = ("fn", "priority", "team", "key", "enqueued", "future")
+
+    def __init__(self, fn, priority: int, team: str | None, key):
+        self.fn = fn
+        self.priority = priority
+        self.team = team
+        self.key = key
+        self.enqueued = time.monotonic()
+        self.future = Future()
+
+
+class ScanScheduler:
+    """单个数据源根目录的扫描队列，由一个工作线程按优先级执行"""
+
+    def __init__(self, source: str):
+        """
+        Args:
+            source: 数据源根目录名称，用于线程名和指标标签
+        """
+        self.source = source
+        self._cond = threading.Condition()
+        self._jobs: list[_Job] = []
+        self._pending: dict[object, _Job] = {}
+        self._running = False
+        self._thread = None
+
+    def submit(self, fn, priority: int = PRIORITY_NORMAL, team: str | None = None, key=None) -> Future:
+        """提交扫描任务，返回 Future
+
+        Args:
+            fn: 在工作线程中执行的无参函数
+            priority: 基础优先级；PRIORITY_NORMAL 的任务在团队被查看时按高优先级执行
+            team: 任务所属团队（数据库中的团队名），用于判断是否正在被查看
+            key: 合并键，队列中已有相同键的任务时不再新增，返回已有任务的 Future
+        """
+        with self._cond:
+            if key is not None and key in self._pending:
+                job = self._pending[key]
+                job.priority = min(job.priority, priority)
+                SCAN_QUEUE_COALESCED.inc(source=self.source)
+                return job.future
+            job = _Job(fn, priority, team, key)
+            self._jobs.append(job)
+            if key is not None:
+                self._pending[key] = job
+            self._ensure_worker()
+            self._cond.notify_all()
+            return job.future
+
+    def _ensure_worker(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name=f"scan-{self.source}", daemon=True)
+            self._thread.start()
+
+    def _class_of(self, job: _Job) -> int:
+        """任务的优先级类别（不含等待提升）"""
+        if job.priority == PRIORITY_NORMAL and job.team and view_tracker.is_viewed(job.team):
+            return PRIORITY_HIGH
+        return job.priority
+
+    def _pick(self) -> tuple[_Job, int, bool]:
+        """取出有效优先级最高的任务，同级按入队先后；返回 (任务, 优先级类别, 是否因等待被提升)"""
+        now = time.monotonic()
+        best = None
+        for job in self._jobs:
+            cls = self._class_of(job)
+            aged = int((now - job.enqueued) / SCAN_AGING_SECONDS) if SCAN_AGING_SECONDS > 0 else 0
+            rank = (max(PRIORITY_HIGH, cls - aged), job.enqueued)
+            if best is None or rank < best[0]:
+                best = (rank, job, cls)
+        (effective, _), job, cls = best
+        self._jobs.remove(job)
+        if job.key is not None:
+            self._pending.pop(job.key, None)
+        return job, cls, effective < cls
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._jobs:
+                    self._cond.wait()
+                job, cls, aged = self._pick()
+                self._running = True
+            priority = PRIORITY_NAMES[cls]
+            SCAN_QUEUE_WAIT.observe(time.monotonic() - job.enqueued, priority=priority, source=self.source)
+            if aged:
+                SCAN_QUEUE_AGED.inc(priority=priority, source=self.source)
+            try:
+                if job.future.set_running_or_notify_cancel():
+                    job.future.set_result(job.fn())
+            except Exception as e:
+                logger.error(f"扫描任务出错 ({self.source}): {e}")
+                job.future.set_exception(e)
+            finally:
+                with self._cond:
+                    self._running = False
+                    self._cond.notify_all()
+
+    def wait_idle(self, timeout: float | None = None) -> bool:
+        """等待队列清空且没有任务在执行，超时返回 False"""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._jobs and not self._running, timeout)
+
+    def depth(self) -> dict[str, int]:
+        """各优先级类别的待执行任务数"""
+        counts = {name: 0 for name in PRIORITY_NAMES.values()}
+        with self._cond:
+            for job in self._jobs:
+                counts[PRIORITY_NAMES[self._class_of(job)]] += 1
+        return counts
+
+
+def _viewed_team(scope) -> str | None:
+    """从请求中取出被读取的团队名：/api/teams/<name>/...、/api/tasks/<name>/... 或 ?team=<name>"""
+    parts = scope.get("path", "").split("/")
+    if len(parts) > 3 and parts[1] == "api" and parts[2] in ("teams", "tasks") and parts[3]:
+        return parts[3]
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    team = query.get("team")
+    return team[0] if team and team[0] else None
+
+
+class ViewTrackingMiddleware:
+    """记录 HTTP 读取的团队，供扫描调度判断团队是否正在被查看"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope.get("method") == "GET":
+            team = _viewed_team(scope)
+            if team:
+                view_tracker.touch(team)
+        await self.app(scope, receive, send)
@@ -1,18 +1,276 @@
 """文件扫描器：扫描 ~/.claude/teams/ 和 ~/.claude/tasks/ 目录，解析数据并写入数据库"""
 import os
+import ast
 import json
+import hashlib
 import logging
+import threading
+import time
+import zlib
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
 from datetime import datetime
 from pathlib import Path
+from sqlalchemy import func, update
 from sqlalchemy.orm import Session
 from database import SessionLocal
-from models import Team, Member, Message, Task
+from message_cache import message_cache
+from metrics import SCAN_DURATION, SCAN_FILES_PARSED, SCAN_ROWS_WRITTEN, SCAN_STAGE_DURATION
+from models import Team, Member, Message, Task, TaskEdge, TaskTransition, TaskRollup, Participant, AgentPair
+from scan_scheduler import PRIORITY_LOW, ScanScheduler
 
 logger = logging.getLogger(__name__)
 
-# 数据源目录
-TEAMS_DIR = os.path.expanduser("~/.claude/teams")
-TASKS_DIR = os.path.expanduser("~/.claude/tasks")
+# 数据源目录，可通过 CLAUDE_DIR 环境变量指定根目录（默认 ~/.claude）
+CLAUDE_DIR = os.path.expanduser(os.environ.get("CLAUDE_DIR", "~/.claude"))
+TEAMS_DIR = os.path.join(CLAUDE_DIR, "teams")
+TASKS_DIR = os.path.join(CLAUDE_DIR, "tasks")
+# 额外的数据源根目录（如共享构建机上其他用户或容器的 .claude），逗号分隔，
+# 每项为 "名称=路径" 或 "路径"（名称取目录名，.claude 取上级目录名）。
+# 这些根目录下的团队在数据库中命名为 "名称:团队名"，默认根目录的团队名不变
+EXTRA_CLAUDE_DIRS = os.environ.get("EXTRA_CLAUDE_DIRS", "")
+
+# 按 ID 批量删除时每批的数量，避免超过 SQLite 的参数个数上限
+SQL_IN_BATCH_SIZE = 500
+
+
+class ScanProgress:
+    """全量扫描进度，供就绪检查接口查询"""
+
+    def __init__(self):
+        self.state = "pending"
+        self.teams_total = 0
+        self.teams_done = 0
+        self.task_dirs_total = 0
+        self.task_dirs_done = 0
+        self.rows = 0
+        self.files_parsed = 0
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+        self._started = None
+        # 各阶段累计耗时（秒）：在扫描队列中等待、团队配置与消息、任务、清理已删除团队
+        self.stages: dict[str, float] = defaultdict(float)
+        # 扫描期间由增量扫描写入的团队，清理已删除团队时不能误删
+        self.touched_teams: set[str] = set()
+
+    @property
+    def running(self) -> bool:
+        return self.state == "running"
+
+    @property
+    def ready(self) -> bool:
+        """全量扫描已结束（失败时仍以已有数据提供服务）"""
+        return self.state in ("completed", "failed")
+
+    def start(self, teams_total: int, task_dirs_total: int):
+        self.__init__()
+        self.state = "running"
+        self.teams_total = teams_total
+        self.task_dirs_total = task_dirs_total
+        self.started_at = datetime.utcnow().isoformat()
+        self._started = time.monotonic()
+
+    @contextmanager
+    def timed(self, stage: str):
+        """累计代码块耗时到指定阶段"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[stage] += time.perf_counter() - start
+
+    def finish(self, error: str | None = None):
+        self.state = "failed" if error else "completed"
+        self.error = error
+        self.finished_at = datetime.utcnow().isoformat()
+
+    def snapshot(self) -> dict:
+        """返回进度快照，ETA 按已完成目录的平均耗时估算"""
+        elapsed = time.monotonic() - self._started if self._started else 0
+        done = self.teams_done + self.task_dirs_done
+        total = self.teams_total + self.task_dirs_total
+        eta = None
+        if self.running and done:
+            eta = round(elapsed / done * (total - done), 1)
+        return {
+            "state": self.state,
+            "ready": self.ready,
+            "teams": {"done": self.teams_done, "total": self.teams_total},
+            "task_dirs": {"done": self.task_dirs_done, "total": self.task_dirs_total},
+            "rows": self.rows,
+            "stages": {stage: round(seconds, 3) for stage, seconds in self.stages.items()},
+            "elapsed_seconds": round(elapsed, 1) if self._started else None,
+            "eta_seconds": eta,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+        }
+
+
+class SourceRoot:
+    """一个数据源根目录（相当于一个 ~/.claude）
+
+    每个根目录有独立的扫描锁、全量扫描进度、文件监控线程和扫描队列：
+    后台全量扫描与增量扫描都在根目录的扫描队列中按优先级执行，
+    某个根目录扫描缓慢或文件变化频繁时不会阻塞其他根目录。
+    """
+
+    def __init__(self, path: str, label: str = ""):
+        self.path = path
+        self.label = label
+        self.teams_dir = os.path.join(path, "teams")
+        self.tasks_dir = os.path.join(path, "tasks")
+        self.lock = threading.RLock()
+        self.progress = ScanProgress()
+        self.scheduler = ScanScheduler(label or "default")
+
+    def team_name(self, local_name: str) -> str:
+        """目录中的团队名 -> 数据库中的团队名"""
+        return f"{self.label}:{local_name}" if self.label else local_name
+
+    def local_name(self, team_name: str) -> str:
+        """数据库中的团队名 -> 目录中的团队名"""
+        prefix = f"{self.label}:"
+        return team_name[len(prefix):] if self.label and team_name.startswith(prefix) else team_name
+
+    def contains(self, path: str) -> bool:
+        """路径是否位于该根目录的 teams 或 tasks 目录内"""
+        target = Path(path).resolve()
+        for base in (self.teams_dir, self.tasks_dir):
+            try:
+                target.relative_to(Path(base).resolve())
+                return True
+            except ValueError:
+                continue
+        return False
+
+
+def _parse_source_roots() -> list[SourceRoot]:
+    """根据 CLAUDE_DIR 和 EXTRA_CLAUDE_DIRS 构造数据源根目录列表，第一个为默认根目录"""
+    roots = [SourceRoot(CLAUDE_DIR)]
+    labels = set()
+    for item in EXTRA_CLAUDE_DIRS.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        label, sep, path = item.partition("=")
+        if not sep:
+            path = label
+            label = ""
+        path = os.path.expanduser(path.strip())
+        label = label.strip()
+        if not label:
+            base = os.path.basename(os.path.normpath(path))
+            label = os.path.basename(os.path.dirname(os.path.normpath(path))) if base == ".claude" else base
+        if not label or ":" in label or label in labels:
+            raise ValueError(f"EXTRA_CLAUDE_DIRS 中的根目录名称无效或重复: {item}")
+        labels.add(label)
+        roots.append(SourceRoot(path, label))
+    return roots
+
+
+# 所有数据源根目录，第一个为 CLAUDE_DIR
+SOURCE_ROOTS = _parse_source_roots()
+DEFAULT_ROOT = SOURCE_ROOTS[0]
+
+
+def root_for_path(path: str) -> SourceRoot | None:
+    """查找路径所属的数据源根目录"""
+    for root in SOURCE_ROOTS:
+        if root.contains(path):
+            return root
+    return None
+
+
+class ScanProgressGroup:
+    """所有数据源根目录的全量扫描进度汇总，供就绪检查接口查询"""
+
+    def __init__(self, roots: list[SourceRoot]):
+        self.roots = roots
+
+    @property
+    def ready(self) -> bool:
+        return all(root.progress.ready for root in self.roots)
+
+    def snapshot(self) -> dict:
+        """汇总各根目录的进度；有多个根目录时附带每个根目录的进度"""
+        parts = {root.label: root.progress.snapshot() for root in self.roots}
+        if len(parts) == 1:
+            return next(iter(parts.values()))
+        states = [p["state"] for p in parts.values()]
+        if "running" in states or ("pending" in states and len(set(states)) > 1):
+            state = "running"
+        elif "pending" in states:
+            state = "pending"
+        else:
+            state = "failed" if "failed" in states else "completed"
+        stages = defaultdict(float)
+        for p in parts.values():
+            for stage, seconds in p["stages"].items():
+                stages[stage] += seconds
+        etas = [p["eta_seconds"] for p in parts.values() if p["eta_seconds"] is not None]
+        elapsed = [p["elapsed_seconds"] for p in parts.values() if p["elapsed_seconds"] is not None]
+        started = [p["started_at"] for p in parts.values() if p["started_at"]]
+        finished = [p["finished_at"] for p in parts.values() if p["finished_at"]]
+        errors = [f"{label or 'default'}: {p['error']}" for label, p in parts.items() if p["error"]]
+        return {
+            "state": state,
+            "ready": self.ready,
+            "teams": {
+                "done": sum(p["teams"]["done"] for p in parts.values()),
+                "total": sum(p["teams"]["total"] for p in parts.values()),
+            },
+            "task_dirs": {
+                "done": sum(p["task_dirs"]["done"] for p in parts.values()),
+                "total": sum(p["task_dirs"]["total"] for p in parts.values()),
+            },
+            "rows": sum(p["rows"] for p in parts.values()),
+            "stages": {stage: round(seconds, 3) for stage, seconds in stages.items()},
+            "elapsed_seconds": max(elapsed) if elapsed else None,
+            "eta_seconds": max(etas) if etas else None,
+            "started_at": min(started) if started else None,
+            "finished_at": max(finished) if len(finished) == len(parts) else None,
+            "error": "; ".join(errors) or None,
+            "sources": {label or "default": p for label, p in parts.items()},
+        }
+
+
+# 当前进程最近一次全量扫描的进度（所有根目录汇总）
+scan_progress = ScanProgressGroup(SOURCE_ROOTS)
+
+
+# 当前线程本次扫描已解析的文件数，用于扫描指标
+_parse_stats = threading.local()
+
+
+def _load_json_file(path: str):
+    """读取并解析 JSON 文件，同时累计当前线程解析的文件数"""
+    with open(path, "r", encoding="utf-8") as f:
+        _parse_stats.files = getattr(_parse_stats, "files", 0) + 1
+        return json.load(f)
+
+
+def _take_files_parsed() -> int:
+    """返回并清零当前线程累计的解析文件数"""
+    count = getattr(_parse_stats, "files", 0)
+    _parse_stats.files = 0
+    return count
+
+
+def _changes_row_count(changes: dict) -> int:
+    """变更字典中新增、更新或删除的行数（members 是完整成员列表，按实际写入的成员行数计）"""
+    return changes.get("members_written", 0) + sum(
+        len(changes.get(key) or [])
+        for key in ("messages", "removed_message_ids", "read_updates", "tasks", "removed_task_ids")
+    )
+
+
+def _count_subdirs(path: str) -> int:
+    if not os.path.isdir(path):
+        return 0
+    return sum(1 for name in os.listdir(path) if os.path.isdir(os.path.join(path, name)))
 
 
 def _is_safe_path(base_dir: str, target_path: str) -> bool:
@@ -35,48 +293,129 @@ def _is_safe_path(base_dir: str, target_path: str) -> bool:
         return False
 
 
-def detect_msg_type(text: str) -> str:
-    """根据消息文本内容判断消息类型
+def _parse_dict_literal(text: str) -> tuple[dict | None, bool]:
+    """将 JSON 或 Python 字面量格式的字典文本解析为 dict
+
+    优先按 JSON 解析；失败时再尝试 ast.literal_eval（兼容单引号的 Python 字典）。
+
+    Returns:
+        (data, is_json) 元组，data 非字典时为 None，is_json 表示是否为合法 JSON
+    """
+    if not text:
+        return None, False
+    stripped = text.strip()
+    if not (stripped.startswith("{") or stripped.startswith("'")):
+        return None, False
+    is_json = False
+    try:
+        data = json.loads(stripped)
+        is_json = True
+    except (json.JSONDecodeError, ValueError):
+        try:
+            data = ast.literal_eval(stripped)
+        except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+            return None, False
+    return (data, is_json) if isinstance(data, dict) else (None, False)
+
+
+def _classify_payload_type(payload_type: str) -> str:
+    """将负载中的原始 type 字段归类为 msg_type
 
-    解析 JSON 格式的消息文本，提取 type 字段进行分类：
     - idle_notification -> idle
     - shutdown_request / shutdown_response -> shutdown
     - task_assignment -> task_assignment
     - plan_approval_request / plan_approval_response -> plan_approval
-    - 其他或非 JSON -> normal
+    - 其他 -> normal
     """
-    if not text or not text.strip().startswith("{"):
-        return "normal"
-    try:
-        data = json.loads(text)
-        msg_type = data.get("type", "")
-        if "idle" in msg_type:
-            return "idle"
-        elif "shutdown" in msg_type:
-            return "shutdown"
-        elif "task_assignment" in msg_type:
-            return "task_assignment"
-        elif "plan_approval" in msg_type:
-            return "plan_approval"
+    if "idle" in payload_type:
+        return "idle"
+    elif "shutdown" in payload_type:
+        return "shutdown"
+    elif "task_assignment" in payload_type:
+        return "task_assignment"
+    elif "plan_approval" in payload_type:
+        return "plan_approval"
+    return "normal"
+
+
+def _summary_from_payload(data: dict) -> str:
+    """从结构化负载中提取可读摘要：subject > summary > type"""
+    if "subject" in data:
+        return str(data["subject"])
+    if "summary" in data:
+        return str(data["summary"])
+    if "type" in data:
+        return str(data["type"])
+    return "任务消息"
+
+
+def extract_message_fields(text: str, summary: str) -> dict:
+    """入库时一次性解析消息负载，返回需要写入 Message 的结构化字段
+
+    返回字段：
+    - msg_type: 消息分类（仅合法 JSON 对象按 type 字段分类，其他均为 normal）
+    - payload_type / payload_subject / payload_task_id: 负载中的原始字段
+    - display_summary: 展示用摘要，优先从 summary/text 的字典负载中取 subject
+    """
+    text = text or ""
+    summary = summary or ""
+    payload, is_json = _parse_dict_literal(text)
+
+    # 只有合法 JSON 对象才参与分类，Python 字典字面量只用于提取摘要
+    msg_type = "normal"
+    if is_json:
+        msg_type = _classify_payload_type(str(payload.get("type", "")))
+
+    # 展示摘要：依次尝试 summary 和 text，字典格式取其中的字段，普通文本直接截断
+    display_summary = None
+    for candidate, parsed in ((summary, None), (text, payload)):
+        if not candidate:
+            continue
+        stripped = candidate.strip()
+        if stripped.startswith("{") or stripped.startswith("'"):
+            data = parsed if parsed is not None else _parse_dict_literal(candidate)[0]
+            if data is not None:
+                display_summary = _summary_from_payload(data)
+                break
         else:
-            return "normal"
-    except (json.JSONDecodeError, AttributeError):
-        return "normal"
-
-
-def scan_team(team_dir: str, db: Session) -> Team | None:
+            display_summary = candidate[:80]
+            break
+    if display_summary is None:
+        display_summary = summary[:80] if summary else text[:80]
+
+    payload = payload or {}
+    task_id = payload.get("taskId", payload.get("task_id", ""))
+    return {
+        "msg_type": msg_type,
+        "payload_type": str(payload.get("type", "") or ""),
+        "payload_subject": str(payload.get("subject", "") or ""),
+        "payload_task_id": str(task_id) if task_id not in (None, "") else "",
+        "display_summary": display_summary,
+    }
+
+
+def scan_team(
+    team_dir: str, db: Session, changes: dict | None = None, root: SourceRoot = DEFAULT_ROOT
+) -> Team | None:
     """扫描单个团队目录，解析 config.json 和 inboxes，写入数据库
 
+    传入 changes 字典时，本次扫描实际产生的变更（新增/删除的消息、成员列表等）
+    会写入其中，用于构造 WebSocket 增量事件。非默认根目录的团队名带根目录名前缀。
+
     返回创建或更新后的 Team 对象
     """
-    # 验证 team_dir 是否在 TEAMS_DIR 内，防止路径遍历攻击
-    if not _is_safe_path(TEAMS_DIR, team_dir):
+    # 消息变更还要同步到最近消息缓存，调用方不关心变更时也需要收集
+    if changes is None:
+        changes = {}
+
+    # 验证 team_dir 是否在根目录的 teams 目录内，防止路径遍历攻击
+    if not _is_safe_path(root.teams_dir, team_dir):
         logger.error(f"安全检查失败: {team_dir} 不在允许的目录内")
         return None
 
     config_path = os.path.join(team_dir, "config.json")
     # 验证 config_path 是否在安全范围内
-    if not _is_safe_path(TEAMS_DIR, config_path):
+    if not _is_safe_path(root.teams_dir, config_path):
         logger.error(f"安全检查失败: {config_path} 不在允许的目录内")
         return None
 
@@ -84,18 +423,17 @@ def scan_team(team_dir: str, db: Session) -> Team | None:
         return None
 
     try:
-        with open(config_path, "r", encoding="utf-8") as f:
-            config = json.load(f)
+        config = _load_json_file(config_path)
     except (json.JSONDecodeError, IOError) as e:
         logger.error(f"读取配置文件失败 {config_path}: {e}")
         return None
 
-    team_name = config.get("name", os.path.basename(team_dir))
+    team_name = root.team_name(config.get("name", os.path.basename(team_dir)))
 
     # 查找或创建团队记录
     team = db.query(Team).filter(Team.name == team_name).first()
     if not team:
-        team = Team(name=team_name)
+        team = Team(name=team_name, source=root.label)
         db.add(team)
 
     # 更新团队信息
@@ -108,255 +446,682 @@ def scan_team(team_dir: str, db: Session) -> Team | None:
 
     db.flush()  # 获取 team.id
 
-    # 清除旧的成员数据并重新写入
-    db.query(Member).filter(Member.team_id == team.id).delete()
+    # 成员名 -> 列值，config.json 中重名的成员以最后一个为准
+    wanted_members = {}
     for m in config.get("members", []):
-        member = Member(
-            team_id=team.id,
-            name=m.get("name", ""),
-            agent_id=m.get("agentId", ""),
-            agent_type=m.get("agentType", ""),
-            model=m.get("model", ""),
-            color=m.get("color", ""),
-            cwd=m.get("cwd", ""),
-        )
-        db.add(member)
+        wanted_members[m.get("name", "")] = {
+            "agent_id": m.get("agentId", ""),
+            "agent_type": m.get("agentType", ""),
+            "model": m.get("model", ""),
+            "color": m.get("color", ""),
+            "cwd": m.get("cwd", ""),
+        }
 
     # 扫描 inboxes 目录中的消息
     inboxes_dir = os.path.join(team_dir, "inboxes")
     if os.path.isdir(inboxes_dir):
-        # 清除旧消息并重新写入
-        db.query(Message).filter(Message.team_id == team.id).delete()
-        for inbox_file in os.listdir(inboxes_dir):
-            if not inbox_file.endswith(".json"):
-                continue
-            inbox_owner = inbox_file.replace(".json", "")
-            inbox_path = os.path.join(inboxes_dir, inbox_file)
-            try:
-                with open(inbox_path, "r", encoding="utf-8") as f:
-                    messages = json.load(f)
-                if not isinstance(messages, list):
-                    continue
-                for msg in messages:
-                    text = msg.get("text", "")
-                    message = Message(
-                        team_id=team.id,
-                        inbox_owner=inbox_owner,
-                        from_agent=msg.get("from", ""),
-                        text=text,
-                        summary=msg.get("summary", ""),
-                        timestamp=msg.get("timestamp", ""),
-                        color=msg.get("color", ""),
-                        read=msg.get("read", False),
-                        msg_type=detect_msg_type(text),
-                    )
-                    db.add(message)
-            except (json.JSONDecodeError, IOError) as e:
-                logger.error(f"读取 inbox 文件失败 {inbox_path}: {e}")
+        _sync_team_messages(team.id, inboxes_dir, db, changes)
 
-    db.commit()
+    # 从参与者索引补充 config.json 中没有的成员
+    _supplement_members_from_participants(team, wanted_members, db)
+    members = _sync_team_members(team, wanted_members, db, changes)
+    changes["members"] = [m.to_dict() for m in members]
+
+    # 提交后把消息变更合并进最近消息缓存
+    with message_cache.writing(team.name, changes):
+        db.commit()
     return team
 
 
-def scan_tasks_for_team(team_name: str, team_id: int, db: Session):
-    """扫描指定团队的任务目录，解析任务 JSON 文件并写入数据库"""
-    tasks_dir = os.path.join(TASKS_DIR, team_name)
+def _upsert_rows(db: Session, existing: dict, wanted: dict, create) -> tuple[list, list, list]:
+    """按自然键把 wanted（键 -> 列值）同步到 existing（键 -> 已有行）
 
-    # 验证任务目录是否在 TASKS_DIR 内，防止路径遍历攻击
-    if not _is_safe_path(TASKS_DIR, tasks_dir):
-        logger.error(f"安全检查失败: 任务目录 {tasks_dir} 不在允许的目录内")
-        return
+    只插入新出现的键、更新列值有变化的行、删除已不存在的键，未变化的行不会被改写，
+    行 ID 保持不变。create(key, values) 创建新行。返回 (新增行, 更新行, 删除行)。
+    """
+    added, updated = [], []
+    for key, values in wanted.items():
+        row = existing.pop(key, None)
+        if row is None:
+            row = create(key, values)
+            db.add(row)
+            added.append(row)
+            continue
+        diff = {column: value for column, value in values.items() if getattr(row, column) != value}
+        if diff:
+            for column, value in diff.items():
+                setattr(row, column, value)
+            updated.append(row)
+    removed = list(existing.values())
+    for row in removed:
+        db.delete(row)
+    return added, updated, removed
+
+
+def _sync_team_members(team: Team, wanted: dict[str, dict], db: Session, changes: dict) -> list[Member]:
+    """按成员名就地更新团队成员，返回按 wanted 顺序排列的全部成员"""
+    existing = {m.name: m for m in db.query(Member).filter(Member.team_id == team.id)}
+    rows = dict(existing)
+    added, updated, removed = _upsert_rows(
+        db, existing, wanted, lambda name, values: Member(team_id=team.id, name=name, **values),
+    )
+    db.flush()
+    for member in added:
+        rows[member.name] = member
+        if member.agent_type == "participant":
+            logger.debug(f"从参与者索引补充成员: {member.name} -> 团队 {team.name}")
+    changes["members_written"] = len(added) + len(updated) + len(removed)
+    return [rows[name] for name in wanted]
 
-    if not os.path.isdir(tasks_dir):
-        return
 
-    # 清除旧任务数据并重新写入
-    db.query(Task).filter(Task.team_id == team_id).delete()
+def _message_hash(inbox_owner: str, from_agent: str, timestamp: str, text: str) -> str:
+    """计算消息的内容哈希，作为同一团队内消息的自然标识"""
+    raw = "\x1f".join((inbox_owner, from_agent, timestamp, text))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
 
-    for task_file in os.listdir(tasks_dir):
+
+def _sync_team_messages(team_id: int, inboxes_dir: str, db: Session, changes: dict | None = None):
+    """将收件箱文件同步到消息表
+
+    按内容哈希与已有消息比对：只插入新消息、删除文件中已不存在的消息、
+    更新已读状态变化的消息，未变化的消息不会被改写。
+    读取失败的收件箱文件视为未变化，其已有消息保持不动。
+    """
+    # 内容哈希 -> [(id, inbox_owner, read)]，同一内容可能重复出现多次
+    existing = defaultdict(list)
+    for msg_id, content_hash, inbox_owner, read in (
+        db.query(Message.id, Message.content_hash, Message.inbox_owner, Message.read)
+        .filter(Message.team_id == team_id)
+    ):
+        existing[content_hash].append((msg_id, inbox_owner, read))
+
+    new_messages = []
+    read_updates = []
+    skipped_owners = set()
+    for inbox_file in os.listdir(inboxes_dir):
+        if not inbox_file.endswith(".json"):
+            continue
+        inbox_owner = inbox_file.replace(".json", "")
+        inbox_path = os.path.join(inboxes_dir, inbox_file)
+        try:
+            messages = _load_json_file(inbox_path)
+        except (json.JSONDecodeError, IOError) as e:
+            logger.error(f"读取 inbox 文件失败 {inbox_path}: {e}")
+            skipped_owners.add(inbox_owner)
+            continue
+        if not isinstance(messages, list):
+            continue
+        for msg in messages:
+            from_agent = msg.get("from", "")
+            text = msg.get("text", "")
+            summary = msg.get("summary", "")
+            timestamp = msg.get("timestamp", "")
+            read = bool(msg.get("read", False))
+            content_hash = _message_hash(inbox_owner, from_agent, timestamp, text or "")
+
+            matches = existing.get(content_hash)
+            if matches:
+                msg_id, _, old_read = matches.pop()
+                if not matches:
+                    del existing[content_hash]
+                if old_read != read:
+                    read_updates.append({"id": msg_id, "read": read})
+                continue
+
+            new_messages.append(Message(
+                team_id=team_id,
+                inbox_owner=inbox_owner,
+                from_agent=from_agent,
+                text=text,
+                summary=summary,
+                timestamp=timestamp,
+                color=msg.get("color", ""),
+                read=read,
+                content_hash=content_hash,
+                **extract_message_fields(text, summary),
+            ))
+
+    removed_ids = [
+        msg_id
+        for rows in existing.values()
+        for msg_id, inbox_owner, _ in rows
+        if inbox_owner not in skipped_owners
+    ]
+    for i in range(0, len(removed_ids), SQL_IN_BATCH_SIZE):
+        batch = removed_ids[i:i + SQL_IN_BATCH_SIZE]
+        db.query(Message).filter(Message.id.in_(batch)).delete(synchronize_session=False)
+    if read_updates:
+        db.execute(update(Message), read_updates)
+    db.add_all(new_messages)
+    db.flush()
+
+    if removed_ids:
+        # 删除消息后最早/最近时间可能回退，按剩余消息重建
+        _rebuild_agent_index(team_id, db)
+    elif new_messages:
+        _add_to_agent_index(team_id, new_messages, db)
+
+    if changes is not None:
+        changes["messages"] = [m.to_dict() for m in new_messages]
+        changes["removed_message_ids"] = removed_ids
+        changes["read_updates"] = read_updates
+
+
+def _rebuild_agent_index(team_id: int, db: Session):
+    """根据团队当前消息重建 agent 通信对和参与者索引
+
+    通信对由 SQL GROUP BY 汇总，参与者统计再从（数量很小的）通信对中累加得到，
+    不需要加载消息对象。
+    """
+    db.query(AgentPair).filter(AgentPair.team_id == team_id).delete()
+    db.query(Participant).filter(Participant.team_id == team_id).delete()
+
+    pairs = (
+        db.query(
+            Message.from_agent, Message.inbox_owner, func.count(Message.id),
+            func.min(func.nullif(Message.timestamp, "")), func.max(Message.timestamp),
+        )
+        .filter(Message.team_id == team_id)
+        .group_by(Message.from_agent, Message.inbox_owner)
+        .all()
+    )
+    _merge_agent_index(team_id, [(f, t, c, first or "", last or "") for f, t, c, first, last in pairs], db)
+
+
+def _add_to_agent_index(team_id: int, new_messages: list[Message], db: Session):
+    """把新增消息累加到 agent 通信对和参与者索引，只读写这两张小表"""
+    deltas = {}
+    for msg in new_messages:
+        timestamp = msg.timestamp or ""
+        key = (msg.from_agent, msg.inbox_owner)
+        if key not in deltas:
+            deltas[key] = [0, timestamp, timestamp]
+        delta = deltas[key]
+        delta[0] += 1
+        if timestamp and (not delta[1] or timestamp < delta[1]):
+            delta[1] = timestamp
+        delta[2] = max(delta[2], timestamp)
+    _merge_agent_index(team_id, [(f, t, c, first, last) for (f, t), (c, first, last) in deltas.items()], db)
+
+
+def _merge_times(first: str, last: str, new_first: str, new_last: str) -> tuple[str, str]:
+    """合并最早/最近时间，空字符串表示未知"""
+    if new_first and (not first or new_first < first):
+        first = new_first
+    return first, max(last, new_last)
+
+
+def _merge_agent_index(team_id: int, pairs: list[tuple[str, str, int, str, str]], db: Session):
+    """把 (from_agent, to_agent, 消息数, 最早时间, 最近时间) 累加到通信对和参与者表"""
+    existing_pairs = {
+        (p.from_agent, p.to_agent): p
+        for p in db.query(AgentPair).filter(AgentPair.team_id == team_id)
+    }
+    existing_participants = {
+        p.agent: p for p in db.query(Participant).filter(Participant.team_id == team_id)
+    }
+    for from_agent, to_agent, count, first_seen, last_seen in pairs:
+        pair = existing_pairs.get((from_agent, to_agent))
+        if pair is None:
+            pair = AgentPair(team_id=team_id, from_agent=from_agent, to_agent=to_agent, count=0, last_seen="")
+            db.add(pair)
+            existing_pairs[(from_agent, to_agent)] = pair
+        pair.count += count
+        pair.last_seen = max(pair.last_seen, last_seen)
+
+        for agent, field in ((from_agent, "sent_count"), (to_agent, "received_count")):
+            if not agent:
+                continue
+            participant = existing_participants.get(agent)
+            if participant is None:
+                participant = Participant(
+                    team_id=team_id, agent=agent, sent_count=0, received_count=0, first_seen="", last_seen="",
+                )
+                db.add(participant)
+                existing_participants[agent] = participant
+            setattr(participant, field, getattr(participant, field) + count)
+            participant.first_seen, participant.last_seen = _merge_times(
+                participant.first_seen, participant.last_seen, first_seen, last_seen,
+            )
+    db.flush()
+
+
+def _task_edges(task_id: str, blocks: list, blocked_by: list) -> set[tuple[str, str]]:
+    """根据任务的 blocks / blockedBy 生成 (blocker_id, blocked_id) 依赖边"""
+    edges = set()
+    for other in blocked_by or []:
+        edges.add((str(other), task_id))
+    for other in blocks or []:
+        edges.add((task_id, str(other)))
+    return edges
+
+
+def _scan_task_dir(
+    team_id: int, tasks_dir: str, db: Session, changes: dict | None = None, live: bool = True
+):
+    """解析任务目录下的全部任务文件，按任务 ID 就地更新该团队的任务和依赖边
+
+    只写入新增、内容变化和已删除的任务；读取失败的任务文件视为未变化，
+    其已有任务（任务 ID 与文件名相同）保持不动。状态变化追加到任务状态变化日志，
+    live 表示由文件变化触发（全量扫描为 False）。
+    传入 changes 字典时记录内容发生变化的任务（含新旧状态）和被删除的任务 ID。
+    """
+    existing = {t.task_id: t for t in db.query(Task).filter(Task.team_id == team_id)}
+    old_status = {task_id: t.status for task_id, t in existing.items()}
+
+    # 任务 ID -> 列值，多个文件声明同一任务 ID 时以文件名排序靠后的为准
+    wanted = {}
+    unreadable = set()
+    for task_file in sorted(os.listdir(tasks_dir)):
         if not task_file.endswith(".json"):
             continue
         task_path = os.path.join(tasks_dir, task_file)
 
         # 验证任务文件路径是否在安全范围内
-        if not _is_safe_path(TASKS_DIR, task_path):
+        if not _is_safe_path(tasks_dir, task_path):
             logger.warning(f"安全检查失败: 跳过不安全的任务文件 {task_path}")
             continue
         try:
-            with open(task_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            task = Task(
-                team_id=team_id,
-                task_id=data.get("id", task_file.replace(".json", "")),
-                subject=data.get("subject", ""),
-                description=data.get("description", ""),
-                status=data.get("status", "pending"),
-                active_form=data.get("activeForm", ""),
-                owner=data.get("owner", ""),
-                blocks=data.get("blocks", []),
-                blocked_by=data.get("blockedBy", []),
-            )
-            db.add(task)
+            data = _load_json_file(task_path)
         except (json.JSONDecodeError, IOError) as e:
             logger.error(f"读取任务文件失败 {task_path}: {e}")
+            unreadable.add(task_file.replace(".json", ""))
+            continue
+        task_id = str(data.get("id", task_file.replace(".json", "")))
+        wanted[task_id] = {
+            "subject": data.get("subject", ""),
+            "description": data.get("description", ""),
+            "status": data.get("status", "pending"),
+            "active_form": data.get("activeForm", ""),
+            "owner": data.get("owner", ""),
+            "blocks": data.get("blocks", []),
+            "blocked_by": data.get("blockedBy", []),
+        }
+
+    edges = set()
+    for task_id, values in wanted.items():
+        edges |= _task_edges(task_id, values["blocks"], values["blocked_by"])
+    # 读取失败的文件对应的已有任务保持不动，依赖边沿用已有内容
+    for task_id in unreadable - wanted.keys():
+        task = existing.get(task_id)
+        if task is not None:
+            wanted[task_id] = {}
+            edges |= _task_edges(task_id, task.blocks, task.blocked_by)
+
+    added, updated, removed = _upsert_rows(
+        db, existing, wanted, lambda task_id, values: Task(team_id=team_id, task_id=task_id, **values),
+    )
+
+    transitions = [
+        (t.task_id, t.owner, old_status.get(t.task_id) or "", t.status or "")
+        for t in added + updated
+        if (old_status.get(t.task_id) or "") != (t.status or "")
+    ]
+    transitions += [(t.task_id, t.owner, t.status or "", "") for t in removed]
+    _record_transitions(team_id, transitions, live, db)
+
+    # 依赖边同样只增删有变化的部分
+    old_edges = {
+        (e.blocker_id, e.blocked_id): e for e in db.query(TaskEdge).filter(TaskEdge.team_id == team_id)
+    }
+    for edge in edges - old_edges.keys():
+        db.add(TaskEdge(team_id=team_id, blocker_id=edge[0], blocked_id=edge[1]))
+    for edge in old_edges.keys() - edges:
+        db.delete(old_edges[edge])
+
+    if changes is not None:
+        db.flush()
+        changed = []
+        for task in added + updated:
+            data = task.to_dict()
+            changed.append({
+                "task": data,
+                "old_status": old_status.get(task.task_id),
+                "new_status": data["status"],
+            })
+        changes.setdefault("tasks", []).extend(changed)
+        changes.setdefault("removed_task_ids", []).extend(t.task_id for t in removed)
+
+
+def _record_transitions(team_id: int, transitions: list[tuple[str, str, str, str]], live: bool, db: Session):
+    """追加任务状态变化 (task_id, owner, from_status, to_status)
+
+    任务上一次变化是实时记录的，才能得出在 from_status 中停留的时间。
+    """
+    if not transitions:
+        return
+    now = datetime.utcnow()
+    timed_ids = [task_id for task_id, _, from_status, _ in transitions if from_status]
+    entered_at = {}
+    for i in range(0, len(timed_ids), SQL_IN_BATCH_SIZE):
+        batch = timed_ids[i:i + SQL_IN_BATCH_SIZE]
+        for task_id, at, was_live in (
+            db.query(TaskTransition.task_id, TaskTransition.at, TaskTransition.live)
+            .filter(TaskTransition.team_id == team_id, TaskTransition.task_id.in_(batch))
+            .order_by(TaskTransition.at)
+        ):
+            entered_at[task_id] = at if was_live else None
+
+    for task_id, owner, from_status, to_status in transitions:
+        since = entered_at.get(task_id) if from_status else None
+        db.add(TaskTransition(
+            team_id=team_id,
+            task_id=task_id,
+            owner=owner or "",
+            from_status=from_status,
+            to_status=to_status,
+            at=now,
+            live=live,
+            seconds_in_from=(now - since).total_seconds() if since else None,
+        ))
+
+
+def scan_tasks_for_team(
+    team_name: str, team_id: int, db: Session, changes: dict | None = None, root: SourceRoot = DEFAULT_ROOT
+):
+    """扫描指定团队的任务目录，解析任务 JSON 文件并写入数据库
+
+    changes 的含义同 scan_team。
+    """
+    tasks_dir = os.path.join(root.tasks_dir, root.local_name(team_name))
+
+    # 验证任务目录是否在根目录的 tasks 目录内，防止路径遍历攻击
+    if not _is_safe_path(root.tasks_dir, tasks_dir):
+        logger.error(f"安全检查失败: 任务目录 {tasks_dir} 不在允许的目录内")
+        return
+
+    if not os.path.isdir(tasks_dir):
+        return
 
+    _scan_task_dir(team_id, tasks_dir, db, changes)
     db.commit()
 
 
-def scan_all_tasks(db: Session):
-    """扫描所有任务目录，将任务关联到对应团队
+def _run_background(root: SourceRoot, progress: ScanProgress | None, fn):
+    """把全量扫描的一步作为低优先级任务交给根目录的扫描队列执行，等待并返回结果
+
+    在队列中等待的时间计入 queue_wait 阶段，解析的文件数计入 progress.files_parsed。
+    """
+    queued = time.perf_counter()
+
+    def job():
+        if progress:
+            progress.stages["queue_wait"] += time.perf_counter() - queued
+        _take_files_parsed()
+        try:
+            with root.lock:
+                return fn()
+        finally:
+            if progress:
+                progress.files_parsed += _take_files_parsed()
+
+    return root.scheduler.submit(job, PRIORITY_LOW).result()
+
+
+def scan_all_tasks(db: Session, progress: ScanProgress | None = None, root: SourceRoot = DEFAULT_ROOT):
+    """扫描根目录下的所有任务目录，将任务关联到对应团队
 
-    遍历 TASKS_DIR 下所有子目录，如果目录名与团队名匹配，
-    则将任务数据关联到该团队。
+    遍历 tasks 目录下所有子目录，如果目录名与该根目录的团队名匹配，
+    则将任务数据关联到该团队。每个目录作为低优先级任务在扫描队列中执行。
+    传入 progress 时记录已处理的目录数和写入行数。
     """
-    if not os.path.isdir(TASKS_DIR):
+    if not os.path.isdir(root.tasks_dir):
         return
 
-    # 获取所有团队名和 ID 的映射
-    teams = {t.name: t.id for t in db.query(Team).all()}
+    # 获取该根目录所有团队名和 ID 的映射
+    teams = {t.name: t.id for t in db.query(Team).filter(Team.source == root.label).all()}
 
-    for task_dir_name in os.listdir(TASKS_DIR):
-        task_dir = os.path.join(TASKS_DIR, task_dir_name)
+    for task_dir_name in os.listdir(root.tasks_dir):
+        task_dir = os.path.join(root.tasks_dir, task_dir_name)
         if not os.path.isdir(task_dir):
             continue
 
         # 检查目录名是否匹配团队名
-        team_id = teams.get(task_dir_name)
-        if not team_id:
-            continue
+        team_id = teams.get(root.team_name(task_dir_name))
+        if team_id:
+            changes = {}
 
-        # 清除旧任务数据并重新写入
-        db.query(Task).filter(Task.team_id == team_id).delete()
+            def scan_dir(team_id=team_id, task_dir=task_dir, changes=changes):
+                with progress.timed("tasks") if progress else nullcontext():
+                    _scan_task_dir(team_id, task_dir, db, changes, live=False)
+                    db.commit()
 
-        for task_file in os.listdir(task_dir):
-            if not task_file.endswith(".json"):
-                continue
-            task_path = os.path.join(task_dir, task_file)
-            try:
-                with open(task_path, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                task = Task(
-                    team_id=team_id,
-                    task_id=data.get("id", task_file.replace(".json", "")),
-                    subject=data.get("subject", ""),
-                    description=data.get("description", ""),
-                    status=data.get("status", "pending"),
-                    active_form=data.get("activeForm", ""),
-                    owner=data.get("owner", ""),
-                    blocks=data.get("blocks", []),
-                    blocked_by=data.get("blockedBy", []),
-                )
-                db.add(task)
-            except (json.JSONDecodeError, IOError) as e:
-                logger.error(f"读取任务文件失败 {task_path}: {e}")
+            _run_background(root, progress, scan_dir)
+            if progress:
+                progress.rows += _changes_row_count(changes)
+        if progress:
+            progress.task_dirs_done += 1
 
     db.commit()
 
 
-def full_scan():
+def full_scan(root: SourceRoot | None = None):
     """全量扫描所有团队和任务数据
 
+    不指定 root 时扫描全部数据源根目录，多个根目录各在一个线程中并行扫描，
+    互不等待各自的扫描锁，全部完成后返回。
+    """
+    if root is not None:
+        _full_scan_root(root)
+    elif len(SOURCE_ROOTS) == 1:
+        _full_scan_root(DEFAULT_ROOT)
+    else:
+        with ThreadPoolExecutor(max_workers=len(SOURCE_ROOTS), thread_name_prefix="full-scan") as executor:
+            list(executor.map(_full_scan_root, SOURCE_ROOTS))
+
+
+def _full_scan_root(root: SourceRoot):
+    """全量扫描一个根目录的团队和任务数据
+
     扫描文件系统中的团队目录，同步到数据库。
-    已从文件系统删除的团队会从数据库中清理。
-    同时从消息记录中补充已离开但曾参与过的团队成员。
+    已从文件系统删除的团队会从数据库中清理（只清理属于该根目录的团队）。
+
+    扫描进度记录在 root.progress 中。每个团队、任务目录和最后的清理都作为低优先级任务
+    交给根目录的扫描队列执行并单独提交，文件变化触发的增量扫描可以插队，
+    期间已有数据照常提供查询。
     """
-    logger.info("开始全量扫描...")
+    source = root.label or "default"
+    logger.info(f"开始全量扫描: {root.path}")
+    started = time.perf_counter()
+    progress = root.progress
+    progress.start(_count_subdirs(root.teams_dir), _count_subdirs(root.tasks_dir))
     db = SessionLocal()
     try:
-        if not os.path.isdir(TEAMS_DIR):
-            logger.warning(f"团队目录不存在: {TEAMS_DIR}")
+        if not os.path.isdir(root.teams_dir):
+            logger.warning(f"团队目录不存在: {root.teams_dir}")
+            progress.finish()
             return
 
         # 记录本次扫描到的团队名，用于清理已删除团队
         scanned_team_names = set()
 
-        for team_dir_name in os.listdir(TEAMS_DIR):
-            team_dir = os.path.join(TEAMS_DIR, team_dir_name)
+        for team_dir_name in os.listdir(root.teams_dir):
+            team_dir = os.path.join(root.teams_dir, team_dir_name)
             if not os.path.isdir(team_dir):
                 continue
-            team = scan_team(team_dir, db)
+            changes = {}
+
+            def scan_one(team_dir=team_dir, changes=changes):
+                with progress.timed("teams"):
+                    return scan_team(team_dir, db, changes, root)
+
+            team = _run_background(root, progress, scan_one)
+            progress.teams_done += 1
             if team:
                 scanned_team_names.add(team.name)
-                # 从消息中补充实际参与的成员
-                _supplement_members_from_messages(team, db)
+                progress.rows += _changes_row_count(changes)
                 logger.info(f"已扫描团队: {team.name}")
 
         # 扫描所有任务目录
-        scan_all_tasks(db)
-        logger.info("任务扫描完成")
-
-        # 清理数据库中已不存在于文件系统的团队
-        all_db_teams = db.query(Team).all()
-        for team in all_db_teams:
-            if team.name not in scanned_team_names:
-                logger.info(f"清理已删除团队: {team.name}")
-                db.query(Message).filter(Message.team_id == team.id).delete()
-                db.query(Task).filter(Task.team_id == team.id).delete()
-                db.query(Member).filter(Member.team_id == team.id).delete()
-                db.delete(team)
-        db.commit()
-
-        logger.info("全量扫描完成")
+        scan_all_tasks(db, progress, root)
+        logger.info(f"任务扫描完成: {root.path}")
+
+        # 清理数据库中已不存在于文件系统的团队（扫描期间由增量扫描新建的团队除外）
+        def cleanup():
+            with progress.timed("cleanup"):
+                all_db_teams = db.query(Team).filter(Team.source == root.label).all()
+                removed_teams = []
+                for team in all_db_teams:
+                    if team.name in scanned_team_names or team.name in progress.touched_teams:
+                        continue
+                    logger.info(f"清理已删除团队: {team.name}")
+                    db.query(Message).filter(Message.team_id == team.id).delete()
+                    db.query(Task).filter(Task.team_id == team.id).delete()
+                    db.query(TaskEdge).filter(TaskEdge.team_id == team.id).delete()
+                    db.query(TaskTransition).filter(TaskTransition.team_id == team.id).delete()
+                    db.query(TaskRollup).filter(TaskRollup.team_id == team.id).delete()
+                    db.query(AgentPair).filter(AgentPair.team_id == team.id).delete()
+                    db.query(Participant).filter(Participant.team_id == team.id).delete()
+                    db.query(Member).filter(Member.team_id == team.id).delete()
+                    db.delete(team)
+                    removed_teams.append(team.name)
+                db.commit()
+                for name in removed_teams:
+                    message_cache.invalidate(name)
+
+        _run_background(root, progress, cleanup)
+
+        progress.finish()
+        stages = ", ".join(f"{stage}={seconds:.3f}s" for stage, seconds in progress.stages.items())
+        logger.info(f"全量扫描完成: {root.path}，各阶段耗时: {stages}")
     except Exception as e:
-        logger.error(f"全量扫描出错: {e}")
+        logger.error(f"全量扫描出错 {root.path}: {e}")
+        progress.finish(error=str(e))
         db.rollback()
     finally:
         db.close()
+        SCAN_DURATION.observe(time.perf_counter() - started, kind="full", source=source)
+        SCAN_FILES_PARSED.observe(progress.files_parsed, kind="full", source=source)
+        SCAN_ROWS_WRITTEN.observe(progress.rows, kind="full", source=source)
+        for stage, seconds in progress.stages.items():
+            SCAN_STAGE_DURATION.observe(seconds, stage=stage, source=source)
+
+
+# 补充成员的颜色，按 agent 名的 CRC32 选取，同一 agent 每次扫描颜色不变
+SUPPLEMENT_COLORS = ["#3b82f6", "#22c55e", "#ef4444", "#f59e0b", "#8b5cf6", "#ec4899", "#06b6d4", "#84cc16"]
 
 
-def _supplement_members_from_messages(team: Team, db: Session):
-    """从消息记录中补充团队的实际参与成员
+def _supplement_color(agent_name: str) -> str:
+    return SUPPLEMENT_COLORS[zlib.crc32(agent_name.encode("utf-8")) % len(SUPPLEMENT_COLORS)]
+
+
+def _supplement_members_from_participants(team: Team, wanted: dict[str, dict], db: Session):
+    """从参与者索引中补充团队的实际参与成员
 
     config.json 中可能缺少已离开的成员（如团队结束后被移除），
-    但消息记录中保留了这些 agent 的通信历史。
-    通过消息中的 from_agent 和 inbox_owner 字段发现并补充这些成员。
+    但消息记录中保留了这些 agent 的通信历史。参与者表在消息入库时维护，
+    这里只需读取该团队的参与者名，不加载消息。缺少的成员加入 wanted。
     """
-    # 获取当前数据库中已有的成员名
-    existing_names = {m.name for m in db.query(Member).filter(Member.team_id == team.id).all()}
-
-    # 从消息中收集所有 agent 名称
-    messages = db.query(Message).filter(Message.team_id == team.id).all()
-    agents_from_msgs = set()
-    for msg in messages:
-        if msg.from_agent:
-            agents_from_msgs.add(msg.from_agent)
-        if msg.inbox_owner:
-            agents_from_msgs.add(msg.inbox_owner)
-
-    # 补充缺少的成员
-    # 为补充的成员生成不同颜色
-    colors = ["#3b82f6", "#22c55e", "#ef4444", "#f59e0b", "#8b5cf6", "#ec4899", "#06b6d4", "#84cc16"]
-    color_idx = len(existing_names)
-    for agent_name in sorted(agents_from_msgs - existing_names):
-        member = Member(
-            team_id=team.id,
-            name=agent_name,
-            agent_id="",
-            agent_type="participant",
-            model="",
-            color=colors[color_idx % len(colors)],
-            cwd="",
-        )
-        db.add(member)
-        color_idx += 1
-        logger.info(f"从消息中补充成员: {agent_name} -> 团队 {team.name}")
-
-    db.flush()
+    participant_names = (
+        agent for (agent,) in
+        db.query(Participant.agent).filter(Participant.team_id == team.id).order_by(Participant.agent)
+    )
+    for agent_name in participant_names:
+        if agent_name in wanted:
+            continue
+        wanted[agent_name] = {
+            "agent_id": "",
+            "agent_type": "participant",
+            "model": "",
+            "color": _supplement_color(agent_name),
+            "cwd": "",
+        }
+
+
+def team_counters(team_id: int, db: Session) -> dict:
+    """统计团队当前的成员数、消息数和各状态任务数，随增量事件下发"""
+    status_counts = dict(
+        db.query(Task.status, func.count(Task.id))
+        .filter(Task.team_id == team_id)
+        .group_by(Task.status)
+        .all()
+    )
+    return {
+        "member_count": db.query(func.count(Member.id)).filter(Member.team_id == team_id).scalar(),
+        "message_count": db.query(func.count(Message.id)).filter(Message.team_id == team_id).scalar(),
+        "task_count": sum(status_counts.values()),
+        "tasks_by_status": status_counts,
+    }
+
+
+def _build_event(event_type: str, team: Team, changes: dict, db: Session) -> dict | None:
+    """根据扫描变更构造 WebSocket 增量事件
+
+    事件 data 中携带实际变更的数据，客户端可据此就地更新而无需重新拉取：
+    - messages / removed_message_ids / read_updates: 新增消息行、被删除的消息 ID、已读状态变化
+    - tasks: 变化的任务行及其新旧状态；removed_task_ids: 被删除的任务 ID
+    - members: 团队配置变化时的完整成员列表
+    - counters: 团队最新计数
+    消息和任务均无变化时返回 None，不推送事件。
+    """
+    data = {"team": team.name}
+    if event_type == "team_update":
+        data["team_info"] = team.to_dict()
+        data["members"] = changes.get("members", [])
+    for key in ("messages", "removed_message_ids", "read_updates", "tasks", "removed_task_ids"):
+        if changes.get(key):
+            data[key] = changes[key]
+    if event_type != "team_update" and len(data) == 1:
+        return None
+    data["counters"] = team_counters(team.id, db)
+    return {"type": event_type, "data": data}
 
 
-def incremental_scan(changed_path: str) -> dict | None:
+def incremental_scan(changed_path: str, root: SourceRoot | None = None) -> dict | None:
     """增量扫描：根据变化的文件路径，更新对应的数据
 
-    返回变更事件字典，用于 WebSocket 推送
+    root 为文件所属的数据源根目录，不传时按路径查找。只持有该根目录的扫描锁。
+    返回携带增量数据的变更事件字典，用于 WebSocket 推送；没有实际变化时返回 None
+    """
+    if root is None:
+        root = root_for_path(changed_path)
+        if root is None:
+            logger.warning(f"安全检查失败: 变更路径 {changed_path} 不在任何数据源目录内")
+            return None
+    source = root.label or "default"
+    started = time.perf_counter()
+    changes = {}
+    with root.lock:
+        _take_files_parsed()
+        event = _incremental_scan(changed_path, root, changes)
+        files_parsed = _take_files_parsed()
+    SCAN_DURATION.observe(time.perf_counter() - started, kind="incremental", source=source)
+    SCAN_FILES_PARSED.observe(files_parsed, kind="incremental", source=source)
+    SCAN_ROWS_WRITTEN.observe(_changes_row_count(changes) if event else 0, kind="incremental", source=source)
+    if event and root.progress.running:
+        root.progress.touched_teams.add(event["data"]["team"])
+    return event
+
+
+def change_scope(changed_path: str, root: SourceRoot) -> tuple[str | None, str]:
+    """文件变化所属的团队（数据库中的团队名）和扫描类别
+
+    同一团队同一类别（config / inboxes / tasks）的文件变化触发的增量扫描完全相同，
+    扫描队列据此合并尚未执行的扫描。无法识别时团队为 None。
     """
+    path = Path(changed_path)
+    for kind, base in (("teams", root.teams_dir), ("tasks", root.tasks_dir)):
+        try:
+            parts = path.relative_to(base).parts
+        except ValueError:
+            continue
+        if not parts:
+            break
+        if kind == "teams":
+            kind = "inboxes" if "inboxes" in parts else "config"
+        return root.team_name(parts[0]), kind
+    return None, changed_path
+
+
+def _incremental_scan(changed_path: str, root: SourceRoot, changes: dict) -> dict | None:
     db = SessionLocal()
     try:
         path = Path(changed_path)
         path_str = str(path)
 
         # 验证路径是否在允许的目录内，防止路径遍历攻击
-        is_in_teams = _is_safe_path(TEAMS_DIR, path_str)
-        is_in_tasks = _is_safe_path(TASKS_DIR, path_str)
+        is_in_teams = _is_safe_path(root.teams_dir, path_str)
+        is_in_tasks = _is_safe_path(root.tasks_dir, path_str)
 
         if not is_in_teams and not is_in_tasks:
             logger.warning(f"安全检查失败: 变更路径 {changed_path} 不在允许的目录内")
@@ -365,35 +1130,32 @@ def incremental_scan(changed_path: str) -> dict | None:
         # 判断变化属于哪个团队
         if is_in_teams:
             # 从路径中提取团队名
-            rel = path.relative_to(TEAMS_DIR)
+            rel = path.relative_to(root.teams_dir)
             team_name = rel.parts[0] if rel.parts else None
             if not team_name:
                 return None
 
-            team_dir = os.path.join(TEAMS_DIR, team_name)
-            team = scan_team(team_dir, db)
+            team_dir = os.path.join(root.teams_dir, team_name)
+            team = scan_team(team_dir, db, changes, root)
             if not team:
                 return None
 
+            scan_tasks_for_team(team.name, team.id, db, changes, root)
             # 判断是消息变化还是团队配置变化
-            if "inboxes" in path_str:
-                scan_tasks_for_team(team.name, team.id, db)
-                return {"type": "message_new", "data": {"team": team.name}}
-            else:
-                scan_tasks_for_team(team.name, team.id, db)
-                return {"type": "team_update", "data": {"team": team.name}}
+            event_type = "message_new" if "inboxes" in path_str else "team_update"
+            return _build_event(event_type, team, changes, db)
 
         elif is_in_tasks:
             # 从路径中提取团队名
-            rel = path.relative_to(TASKS_DIR)
+            rel = path.relative_to(root.tasks_dir)
             team_name = rel.parts[0] if rel.parts else None
             if not team_name:
                 return None
 
-            team = db.query(Team).filter(Team.name == team_name).first()
+            team = db.query(Team).filter(Team.name == root.team_name(team_name)).first()
             if team:
-                scan_tasks_for_team(team.name, team.id, db)
-                return {"type": "task_update", "data": {"team": team.name}}
+                scan_tasks_for_team(team.name, team.id, db, changes, root)
+                return _build_event("task_update", team, changes, db)
 
         return None
     except Exception as e:
@@ -60,6 +60,8 @@ class MessageFilterParams(BaseModel):
     """消息筛选参数"""
     sender: Optional[str] = Field(default=None, description="按发送者筛选")
     msg_type: Optional[MessageType] = Field(default=None, description="按消息类型筛选")
+    payload_type: Optional[str] = Field(default=None, description="按消息负载的原始 type 筛选")
+    task_id: Optional[str] = Field(default=None, description="按消息负载中的任务 ID 筛选")
     search: Optional[str] = Field(default=None, description="关键词搜索")
 
 
@@ -109,6 +111,10 @@ class MessageDTO(BaseModel):
     color: str = ""
     read: bool = False
     msg_type: str = "normal"
+    payload_type: str = ""
+    payload_subject: str = ""
+    payload_task_id: str = ""
+    display_summary: str = ""
 
 
 class TaskDTO(BaseModel):
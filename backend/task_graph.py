@@ -0,0 +1,166 @@
+"""任务依赖图分析
+
+基于 task_edges 索引表中的依赖边，计算就绪任务、阻塞链、依赖环和关键路径。
+所有计算都是对节点和边的线性遍历（Tarjan 强连通分量 + Kahn 拓扑排序），
+不需要解析任务的 JSON 字段。
+"""
+from collections import defaultdict, deque
+
+# 视为已完成、不再阻塞后续任务的状态
+DONE_STATUSES = ("completed", "deleted")
+
+
+def task_sort_key(task_id: str):
+    """任务 ID 排序键：数字 ID 按数值排序，其余按字符串排序"""
+    # isdigit() 也接受 '²'、'①' 等 int() 无法解析的字符，只按 ASCII 十进制数字判断
+    if task_id.isascii() and task_id.isdecimal():
+        return (0, int(task_id), "")
+    return (1, 0, task_id)
+
+
+def _find_cycles(nodes: list[str], successors: dict[str, list[str]]) -> list[list[str]]:
+    """使用迭代版 Tarjan 算法找出所有依赖环（大小 > 1 的强连通分量或自环）"""
+    index_of = {}
+    lowlink = {}
+    on_stack = set()
+    stack = []
+    cycles = []
+    counter = 0
+
+    for root in nodes:
+        if root in index_of:
+            continue
+        index_of[root] = lowlink[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(successors[root]))]
+        while work:
+            node, it = work[-1]
+            advanced = False
+            for nxt in it:
+                if nxt not in index_of:
+                    index_of[nxt] = lowlink[nxt] = counter
+                    counter += 1
+                    stack.append(nxt)
+                    on_stack.add(nxt)
+                    work.append((nxt, iter(successors[nxt])))
+                    advanced = True
+                    break
+                if nxt in on_stack:
+                    lowlink[node] = min(lowlink[node], index_of[nxt])
+            if advanced:
+                continue
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                lowlink[parent] = min(lowlink[parent], lowlink[node])
+            if lowlink[node] == index_of[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == node:
+                        break
+                if len(component) > 1 or node in successors[node]:
+                    cycles.append(sorted(component, key=task_sort_key))
+    return cycles
+
+
+def analyze_task_graph(statuses: dict[str, str], edges: list[tuple[str, str]]) -> dict:
+    """分析任务依赖图
+
+    Args:
+        statuses: 任务 ID -> 状态
+        edges: (blocker_id, blocked_id) 依赖边列表，指向不存在任务的边会被忽略
+
+    Returns:
+        包含 ready / blocked / cycles / blocked_by_cycle / critical_path 的字典：
+        - ready: 所有阻塞任务均已完成的 pending 任务
+        - blocked: 仍被未完成任务阻塞的任务，含直接阻塞者、所在最长阻塞链的深度和链首任务
+        - cycles: 依赖环
+        - blocked_by_cycle: 位于依赖环中或依赖环下游、永远无法就绪的未完成任务
+        - critical_path: 未完成任务构成的最长依赖链
+    """
+    nodes = sorted(statuses, key=task_sort_key)
+    successors = defaultdict(list)
+    predecessors = defaultdict(list)
+    edge_count = 0
+    for blocker, blocked in edges:
+        if blocker in statuses and blocked in statuses:
+            successors[blocker].append(blocked)
+            predecessors[blocked].append(blocker)
+            edge_count += 1
+
+    def is_done(task_id: str) -> bool:
+        return statuses[task_id] in DONE_STATUSES
+
+    ready = [
+        n for n in nodes
+        if statuses[n] == "pending" and all(is_done(b) for b in predecessors[n])
+    ]
+
+    cycles = _find_cycles(nodes, successors)
+
+    # 在未完成任务的子图上做 Kahn 拓扑排序，同时计算最长链
+    open_nodes = [n for n in nodes if not is_done(n)]
+    indegree = {n: sum(1 for b in predecessors[n] if not is_done(b)) for n in open_nodes}
+    depth = {}
+    chain_prev = {}
+    topo_order = []
+    queue = deque(n for n in open_nodes if indegree[n] == 0)
+    for n in queue:
+        depth[n] = 1
+        chain_prev[n] = None
+    while queue:
+        node = queue.popleft()
+        topo_order.append(node)
+        for nxt in successors[node]:
+            if is_done(nxt):
+                continue
+            if depth[node] + 1 > depth.get(nxt, 0):
+                depth[nxt] = depth[node] + 1
+                chain_prev[nxt] = node
+            indegree[nxt] -= 1
+            if indegree[nxt] == 0:
+                queue.append(nxt)
+
+    # 拓扑排序未能处理到的节点位于环中或受环阻塞
+    sorted_nodes = set(topo_order)
+    blocked_by_cycle = [n for n in open_nodes if n not in sorted_nodes]
+
+    # 按拓扑序传递最长链的链首，前驱总是先于后继处理，保证整体线性
+    roots = {}
+    blocked = []
+    for n in topo_order:
+        prev = chain_prev[n]
+        roots[n] = n if prev is None else roots[prev]
+        waiting_on = [b for b in predecessors[n] if not is_done(b)]
+        if waiting_on:
+            blocked.append({
+                "task_id": n,
+                "status": statuses[n],
+                "waiting_on": sorted(waiting_on, key=task_sort_key),
+                "depth": depth[n],
+                "root": roots[n],
+            })
+    blocked.sort(key=lambda item: task_sort_key(item["task_id"]))
+
+    critical_path = []
+    if topo_order:
+        end = max(topo_order, key=lambda n: depth[n])
+        while end is not None:
+            critical_path.append(end)
+            end = chain_prev[end]
+        critical_path.reverse()
+
+    return {
+        "task_count": len(nodes),
+        "edge_count": edge_count,
+        "ready": ready,
+        "blocked": blocked,
+        "cycles": cycles,
+        "blocked_by_cycle": blocked_by_cycle,
+        "critical_path": {"length": len(critical_path), "tasks": critical_path},
+    }
@@ -0,0 +1,143 @@
+"""任务吞吐量汇总
+
+采集进程定期把任务状态变化日志按小时桶汇总到 task_rollups 表，每行对应 (团队, 负责人, 桶, 状态)：
+- entered / exited：进入和离开该状态的次数，进入 completed 的次数即完成吞吐量
+- timed_exits / seconds_in_status：已知停留时间的离开次数及停留秒数之和
+- task_count：汇总时处于该状态的任务数（只写入执行汇总时所在的桶）
+
+首次入库的任务只记录了发现时的状态：全量扫描时发现的不计入进入次数，
+文件变化时新建的任务计入。每次汇总重新计算上次汇总所在的桶及之后的桶。
+
+汇总后删除早于上次汇总所在桶的状态变化（已汇总、不会再被读取），但保留每个现存任务的
+最近一次变化，用于计算下次变化时在原状态中的停留时间。
+"""
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, or_, select
+
+from database import SessionLocal
+from models import Task, TaskRollup, TaskTransition
+
+logger = logging.getLogger(__name__)
+
+# 汇总间隔（秒），为 0 时不定期汇总
+TASK_ROLLUP_INTERVAL = float(os.environ.get("TASK_ROLLUP_INTERVAL", "300"))
+
+
+def bucket_of(at: datetime) -> datetime:
+    """时间所在的小时桶"""
+    return at.replace(minute=0, second=0, microsecond=0)
+
+
+def _counts() -> dict:
+    return {"entered": 0, "exited": 0, "timed_exits": 0, "seconds_in_status": 0.0}
+
+
+def rollup_tasks(now: datetime | None = None) -> int:
+    """汇总尚未汇总的状态变化，返回写入（新增或更新）的汇总行数"""
+    now = now or datetime.utcnow()
+    current = bucket_of(now)
+    db = SessionLocal()
+    try:
+        last = db.query(func.max(TaskRollup.bucket_start)).scalar()
+        if last is None:
+            first = db.query(func.min(TaskTransition.at)).scalar()
+            last = bucket_of(first) if first else current
+        start = min(last, current)
+
+        # (team_id, owner, 桶, 状态) -> 计数
+        totals = defaultdict(_counts)
+        transitions = (
+            db.query(
+                TaskTransition.team_id, TaskTransition.owner, TaskTransition.from_status,
+                TaskTransition.to_status, TaskTransition.at, TaskTransition.live, TaskTransition.seconds_in_from,
+            )
+            .filter(TaskTransition.at >= start, TaskTransition.at < current + timedelta(hours=1))
+        )
+        for team_id, owner, from_status, to_status, at, live, seconds in transitions:
+            bucket = bucket_of(at)
+            owner = owner or ""
+            if to_status and (from_status or live):
+                totals[(team_id, owner, bucket, to_status)]["entered"] += 1
+            if from_status:
+                counts = totals[(team_id, owner, bucket, from_status)]
+                counts["exited"] += 1
+                if seconds is not None:
+                    counts["timed_exits"] += 1
+                    counts["seconds_in_status"] += seconds
+
+        snapshot = {
+            (team_id, owner or "", current, status or ""): count
+            for team_id, owner, status, count in (
+                db.query(Task.team_id, Task.owner, Task.status, func.count(Task.id))
+                .group_by(Task.team_id, Task.owner, Task.status)
+            )
+        }
+        # 没有状态变化的 (团队, 负责人, 状态) 也写入当前任务数
+        for key in snapshot:
+            totals.setdefault(key, _counts())
+
+        existing = {
+            (r.team_id, r.owner, r.bucket_start, r.status): r
+            for r in db.query(TaskRollup).filter(TaskRollup.bucket_start >= start)
+        }
+        written = 0
+        for key, counts in totals.items():
+            values = dict(counts)
+            if key[2] == current:
+                values["task_count"] = snapshot.get(key, 0)
+            row = existing.pop(key, None)
+            if row is None:
+                team_id, owner, bucket, status = key
+                db.add(TaskRollup(team_id=team_id, owner=owner, bucket_start=bucket, status=status, **values))
+                written += 1
+            elif any(getattr(row, column) != value for column, value in values.items()):
+                for column, value in values.items():
+                    setattr(row, column, value)
+                written += 1
+        # 当前桶里已不再有任务处于该状态的行
+        for key, row in existing.items():
+            if key[2] == current and row.task_count:
+                row.task_count = 0
+                written += 1
+        db.commit()
+        logger.debug(f"任务吞吐量汇总完成，写入 {written} 行")
+        return written
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def prune_transitions() -> int:
+    """删除已汇总的状态变化，返回删除的行数
+
+    早于最新汇总桶的变化不会再参与汇总；其中任务的最近一次变化保留，
+    任务已被删除（to_status 为空）时不再需要。
+    """
+    db = SessionLocal()
+    try:
+        cutoff = db.query(func.max(TaskRollup.bucket_start)).scalar()
+        if cutoff is None:
+            return 0
+        latest = select(func.max(TaskTransition.id)).group_by(TaskTransition.team_id, TaskTransition.task_id)
+        deleted = (
+            db.query(TaskTransition)
+            .filter(
+                TaskTransition.at < cutoff,
+                or_(TaskTransition.id.not_in(latest), TaskTransition.to_status == ""),
+            )
+            .delete(synchronize_session=False)
+        )
+        db.commit()
+        logger.debug(f"删除已汇总的任务状态变化 {deleted} 行")
+        return deleted
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
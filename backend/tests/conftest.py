@@ -0,0 +1,8 @@
+"""测试使用临时数据库，需在导入后端模块之前设置 DATABASE_PATH"""
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="dashboard-test-"), "test.db")
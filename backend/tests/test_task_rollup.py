@@ -0,0 +1,95 @@
+"""任务状态变化日志的汇总与清理"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from database import SessionLocal, engine, init_db, Base
+from models import Team, TaskRollup, TaskTransition
+from task_rollup import prune_transitions, rollup_tasks
+
+NOW = datetime(2026, 1, 1, 12, 30)
+
+
+@pytest.fixture
+def team_id():
+    init_db()
+    db = SessionLocal()
+    try:
+        team = Team(name="alpha")
+        db.add(team)
+        db.commit()
+        yield team.id
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+
+
+def _add(db, team_id, task_id, from_status, to_status, at):
+    db.add(TaskTransition(
+        team_id=team_id, task_id=task_id, owner="bob",
+        from_status=from_status, to_status=to_status, at=at, live=True,
+    ))
+
+
+def _remaining(db):
+    return sorted(
+        (t.task_id, t.from_status, t.to_status)
+        for t in db.query(TaskTransition.task_id, TaskTransition.from_status, TaskTransition.to_status)
+    )
+
+
+def test_prune_without_rollups_keeps_everything(team_id):
+    db = SessionLocal()
+    try:
+        _add(db, team_id, "1", "", "pending", NOW - timedelta(days=2))
+        db.commit()
+        assert prune_transitions() == 0
+        assert len(_remaining(db)) == 1
+    finally:
+        db.close()
+
+
+def test_prune_drops_rolled_up_transitions(team_id):
+    old = NOW - timedelta(days=2)
+    db = SessionLocal()
+    try:
+        # 任务 1：早期的变化已汇总，只保留最近一次
+        _add(db, team_id, "1", "", "pending", old)
+        _add(db, team_id, "1", "pending", "in_progress", old + timedelta(minutes=10))
+        # 任务 2：已被删除，全部早于汇总桶
+        _add(db, team_id, "2", "", "pending", old)
+        _add(db, team_id, "2", "pending", "", old + timedelta(minutes=5))
+        # 任务 3：变化在当前桶内，仍会被下次汇总重新计算
+        _add(db, team_id, "3", "", "pending", NOW - timedelta(minutes=20))
+        _add(db, team_id, "3", "pending", "completed", NOW - timedelta(minutes=5))
+        db.commit()
+    finally:
+        db.close()
+
+    rollup_tasks(now=NOW)
+    before = SessionLocal()
+    try:
+        rollups = {(r.bucket_start, r.status): r.entered for r in before.query(TaskRollup)}
+    finally:
+        before.close()
+
+    assert prune_transitions() == 3
+
+    db = SessionLocal()
+    try:
+        assert _remaining(db) == [
+            ("1", "pending", "in_progress"),
+            ("3", "", "pending"),
+            ("3", "pending", "completed"),
+        ]
+    finally:
+        db.close()
+
+    # 再次汇总不受清理影响
+    rollup_tasks(now=NOW)
+    db = SessionLocal()
+    try:
+        assert {(r.bucket_start, r.status): r.entered for r in db.query(TaskRollup)} == rollups
+    finally:
+        db.close()
@@ -0,0 +1,129 @@
+"""文件监控事件录制
+
+设置 WATCHER_TRACE_PATH 后，FileChangeHandler 收到的每个原始 watchdog 事件
+（含目录事件、非 JSON 文件事件、删除和移动）都会连同当时的文件内容写入 JSONL 追踪文件，
+只读访问事件除外。可以用 `python -m bench.replay` 离线重放。
+
+追踪文件格式（每行一个 JSON 对象，路径均相对于 CLAUDE_DIR）：
+    {"kind": "header", "version": 1, "claude_dir": ..., "started_at": ...}
+    {"kind": "snapshot", "path": ..., "content": ...}   录制开始时已存在的 JSON 文件
+    {"kind": "event", "t": 秒, "event": "modified", "path": ..., "dest": ..., "is_directory": false, "content": ...}
+
+content 为事件发生时读到的文件内容（移动事件为目标文件内容），读取失败时为 null。
+"""
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# 追踪文件路径，为空时不录制
+WATCHER_TRACE_PATH = os.environ.get("WATCHER_TRACE_PATH", "")
+# 是否在录制开始时保存已有 JSON 文件的快照；不保存时重放只能基于录制时的同一数据目录
+WATCHER_TRACE_SNAPSHOT = os.environ.get("WATCHER_TRACE_SNAPSHOT", "1") == "1"
+
+TRACE_VERSION = 1
+
+# 只读访问事件（inotify 的 opened / closed_no_write）不记录：扫描器和录制器自己读文件都会产生，
+# 录制时读取文件内容又会触发新的访问事件，形成循环
+ACCESS_EVENT_TYPES = {"opened", "closed_no_write"}
+
+
+def _read_text(path: str) -> str | None:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+    except (OSError, UnicodeDecodeError):
+        return None
+
+
+class TraceRecorder:
+    """把原始文件事件追加写入追踪文件，watchdog 的分发线程和后续调用方之间加锁"""
+
+    def __init__(self, path: str, root: str, snapshot_dirs: list[str] | None = None):
+        """
+        Args:
+            path: 追踪文件路径
+            root: 数据根目录（CLAUDE_DIR），记录的路径相对于该目录
+            snapshot_dirs: 录制开始时需要快照的目录
+        """
+        self.root = root
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+        self._file = open(path, "a", encoding="utf-8")
+        self.events = 0
+        self._write({
+            "kind": "header",
+            "version": TRACE_VERSION,
+            "claude_dir": root,
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+        })
+        for directory in snapshot_dirs or []:
+            self._snapshot(directory)
+        self._file.flush()
+        logger.info(f"文件事件录制已启动: {path}")
+
+    def _relative(self, path: str) -> str:
+        return os.path.relpath(path, self.root)
+
+    def _write(self, record: dict):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def _snapshot(self, directory: str):
+        for dirpath, _, filenames in os.walk(directory):
+            for filename in sorted(filenames):
+                if not filename.endswith(".json"):
+                    continue
+                path = os.path.join(dirpath, filename)
+                self._write({"kind": "snapshot", "path": self._relative(path), "content": _read_text(path)})
+
+    def record(self, event):
+        """记录一个 watchdog 事件，在处理事件之前调用，内容与扫描读到的最接近"""
+        if event.event_type in ACCESS_EVENT_TYPES:
+            return
+        dest = getattr(event, "dest_path", "") or ""
+        content = None
+        if not event.is_directory and event.event_type != "deleted":
+            content = _read_text(dest or event.src_path)
+        record = {
+            "kind": "event",
+            "t": round(time.monotonic() - self._start, 6),
+            "event": event.event_type,
+            "path": self._relative(event.src_path),
+            "dest": self._relative(dest) if dest else "",
+            "is_directory": event.is_directory,
+            "content": content,
+        }
+        with self._lock:
+            self._write(record)
+            self._file.flush()
+            self.events += 1
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+        logger.info(f"文件事件录制结束，共 {self.events} 个事件")
+
+
+def load_trace(path: str) -> tuple[dict, list[dict], list[dict]]:
+    """读取追踪文件，返回 (header, snapshots, events)"""
+    header, snapshots, events = {}, [], []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            kind = record.get("kind")
+            if kind == "header":
+                header = record
+            elif kind == "snapshot":
+                snapshots.append(record)
+            elif kind == "event":
+                events.append(record)
+    if header.get("version") != TRACE_VERSION:
+        raise ValueError(f"不支持的追踪文件版本: {header.get('version')}")
+    return header, snapshots, events
@@ -1,10 +1,12 @@
-"""文件监控：使用 watchdog 监听 ~/.claude/teams/ 和 ~/.claude/tasks/ 目录变化"""
+"""文件监控：使用 watchdog 监听各数据源根目录（默认 ~/.claude）下 teams/ 和 tasks/ 目录变化"""
 import os
 import asyncio
 import logging
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
-from scanner import TEAMS_DIR, TASKS_DIR, incremental_scan
+from scanner import DEFAULT_ROOT, SOURCE_ROOTS, SourceRoot, change_scope, incremental_scan
+from metrics import WATCHER_EVENTS, watcher_rate
+from watch_trace import WATCHER_TRACE_PATH, WATCHER_TRACE_SNAPSHOT, TraceRecorder
 
 logger = logging.getLogger(__name__)
 
@@ -12,16 +14,21 @@ logger = logging.getLogger(__name__)
 class FileChangeHandler(FileSystemEventHandler):
     """文件变化事件处理器
 
-    监听 JSON 文件的创建和修改事件，触发增量扫描并通过回调推送变更通知
+    监听 JSON 文件的创建和修改事件，把增量扫描提交到根目录的扫描队列，
+    扫描完成后通过回调推送变更通知。事件分发线程不等待扫描完成。
     """
 
-    def __init__(self, callback):
+    def __init__(self, callback, recorder: TraceRecorder | None = None, root: SourceRoot = DEFAULT_ROOT):
         """
         Args:
             callback: 异步回调函数，接收变更事件字典用于 WebSocket 推送
+            recorder: 可选的事件录制器，记录每个原始事件及当时的文件内容
+            root: 监控的数据源根目录
         """
         super().__init__()
         self.callback = callback
+        self.recorder = recorder
+        self.root = root
         self._loop = None
 
     def set_loop(self, loop):
@@ -37,11 +44,27 @@ class FileChangeHandler(FileSystemEventHandler):
             return
 
         logger.debug(f"检测到文件变化: {event.src_path}")
-        result = incremental_scan(event.src_path)
+        WATCHER_EVENTS.inc(event=event.event_type, source=self.root.label or "default")
+        watcher_rate.mark()
+        team, kind = change_scope(event.src_path, self.root)
+        # 同一团队同类文件尚未执行的扫描会被合并，被查看的团队优先执行
+        self.root.scheduler.submit(lambda path=event.src_path: self._scan(path), team=team, key=(team, kind))
+
+    def _scan(self, path: str):
+        """在扫描队列的工作线程中执行增量扫描"""
+        result = incremental_scan(path, self.root)
         if result and self._loop:
             # 在事件循环中调度异步回调
             asyncio.run_coroutine_threadsafe(self.callback(result), self._loop)
 
+    def on_any_event(self, event):
+        # watchdog 在调用 on_created/on_modified 等方法之前分发到这里
+        if self.recorder:
+            try:
+                self.recorder.record(event)
+            except Exception as e:
+                logger.error(f"录制文件事件失败: {e}")
+
     def on_created(self, event):
         self._handle_event(event)
 
@@ -49,29 +72,45 @@ class FileChangeHandler(FileSystemEventHandler):
         self._handle_event(event)
 
 
-def start_watcher(callback) -> tuple[Observer, FileChangeHandler]:
-    """启动文件监控
+def start_watcher(callback, root: SourceRoot = DEFAULT_ROOT) -> tuple[Observer, FileChangeHandler]:
+    """启动一个数据源根目录的文件监控
 
-    监控 ~/.claude/teams/ 和 ~/.claude/tasks/ 两个目录
+    监控根目录下的 teams/ 和 tasks/ 两个目录。事件录制只覆盖默认根目录。
 
     Args:
         callback: 异步回调函数，文件变化时被调用
+        root: 数据源根目录
 
     Returns:
         (observer, handler) 元组，observer 为 watchdog 观察者实例
     """
-    handler = FileChangeHandler(callback)
+    recorder = None
+    if WATCHER_TRACE_PATH and root is DEFAULT_ROOT:
+        recorder = TraceRecorder(
+            WATCHER_TRACE_PATH, root.path,
+            [root.teams_dir, root.tasks_dir] if WATCHER_TRACE_SNAPSHOT else None,
+        )
+    handler = FileChangeHandler(callback, recorder, root)
     observer = Observer()
 
     # 监控团队目录
-    if os.path.isdir(TEAMS_DIR):
-        observer.schedule(handler, TEAMS_DIR, recursive=True)
-        logger.info(f"开始监控目录: {TEAMS_DIR}")
+    if os.path.isdir(root.teams_dir):
+        observer.schedule(handler, root.teams_dir, recursive=True)
+        logger.info(f"开始监控目录: {root.teams_dir}")
 
     # 监控任务目录
-    if os.path.isdir(TASKS_DIR):
-        observer.schedule(handler, TASKS_DIR, recursive=True)
-        logger.info(f"开始监控目录: {TASKS_DIR}")
+    if os.path.isdir(root.tasks_dir):
+        observer.schedule(handler, root.tasks_dir, recursive=True)
+        logger.info(f"开始监控目录: {root.tasks_dir}")
 
     observer.start()
     return observer, handler
+
+
+def start_watchers(callback) -> list[tuple[Observer, FileChangeHandler]]:
+    """为每个数据源根目录启动独立的文件监控
+
+    每个 Observer 在自己的线程中分发事件并执行增量扫描，
+    某个根目录的事件风暴或慢扫描不会延迟其他根目录的事件处理。
+    """
+    return [start_watcher(callback, root) for root in SOURCE_ROOTS]
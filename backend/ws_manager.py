@@ -0,0 +1,500 @@
+"""WebSocket 连接管理
+
+维护已连接客户端及其订阅的主题，按主题索引分发事件，
+使某个团队的事件只发送给正在查看该团队的客户端。
+
+主题格式：
+- "*": 所有事件
+- "team:<团队名>": 指定团队的事件
+- "event:<事件类型>": 指定类型的事件，如 event:task_update
+
+每个连接有独立的有界发送队列和写协程，广播只负责入队，
+单个慢速或卡死的客户端不会拖慢其他客户端。
+
+连接可设置批量窗口（batch_ms）：窗口内的事件按 (团队, 事件类型) 合并，
+窗口结束时以一个 {type: "batch", events: [...]} 帧发送，
+增加的延迟不超过窗口长度，窗口长度不超过 WS_BATCH_MAX_MS。
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import defaultdict, deque
+from fastapi import WebSocket
+
+logger = logging.getLogger(__name__)
+
+# 订阅全部事件的主题
+ALL_TOPIC = "*"
+
+# 每个连接发送队列的容量
+WS_QUEUE_SIZE = int(os.environ.get("WS_QUEUE_SIZE", "100"))
+# 队列满时的处理策略：resync（清空队列并通知客户端全量重新同步）或 drop（断开连接）
+WS_OVERFLOW_POLICY = os.environ.get("WS_OVERFLOW_POLICY", "resync")
+# 单条消息发送超时（秒），超时视为连接失效
+WS_SEND_TIMEOUT = float(os.environ.get("WS_SEND_TIMEOUT", "10"))
+# 服务端心跳间隔（秒）
+WS_PING_INTERVAL = float(os.environ.get("WS_PING_INTERVAL", "20"))
+# 超过该时长（秒）未收到客户端任何消息则判定连接已死并回收
+WS_PING_TIMEOUT = float(os.environ.get("WS_PING_TIMEOUT", "60"))
+
+# 新连接默认的批量窗口（毫秒），0 表示逐条发送
+WS_BATCH_MS = int(os.environ.get("WS_BATCH_MS", "0"))
+# 客户端可设置的批量窗口上限（毫秒），即批量合并带来的最大附加延迟
+WS_BATCH_MAX_MS = int(os.environ.get("WS_BATCH_MAX_MS", "2000"))
+
+# 单个批量窗口内累积的原始事件数达到该值时提前发送，限制合并数据的大小
+_BATCH_MAX_EVENTS = 200
+
+# 统计发送延迟时保留的最近样本数
+_LATENCY_SAMPLES = 1000
+
+
+def event_topics(event: dict) -> list[str]:
+    """返回事件所属的主题列表"""
+    topics = [ALL_TOPIC, f"event:{event.get('type', '')}"]
+    team = (event.get("data") or {}).get("team")
+    if team:
+        topics.append(f"team:{team}")
+    return topics
+
+
+def _merge_by_key(older: list, newer: list, key) -> list:
+    """按 key 合并两个列表，相同 key 的元素以较新的为准，保持首次出现的顺序"""
+    merged = {key(item): item for item in older}
+    for item in newer:
+        merged[key(item)] = item
+    return list(merged.values())
+
+
+def merge_events(older: dict, newer: dict) -> dict:
+    """将同一团队、同一类型的两个增量事件合并为一个
+
+    新增消息和变化任务累加，删除 ID 取并集并剔除已被删除的行，
+    已读状态、成员、团队信息和计数器以较新的事件为准；任务保留最早的 old_status。
+    """
+    old_data = older.get("data") or {}
+    new_data = newer.get("data") or {}
+    data = {**old_data, **new_data}
+
+    removed_messages = set(old_data.get("removed_message_ids") or []) | set(new_data.get("removed_message_ids") or [])
+    messages = _merge_by_key(old_data.get("messages") or [], new_data.get("messages") or [], lambda m: m.get("id"))
+    messages = [m for m in messages if m.get("id") not in removed_messages]
+    read_updates = _merge_by_key(old_data.get("read_updates") or [], new_data.get("read_updates") or [], lambda u: u.get("id"))
+    read_updates = [u for u in read_updates if u.get("id") not in removed_messages]
+
+    old_tasks = {c["task"].get("task_id"): c for c in old_data.get("tasks") or []}
+    tasks = {}
+    for change in (old_data.get("tasks") or []) + (new_data.get("tasks") or []):
+        task_id = change["task"].get("task_id")
+        first = old_tasks.get(task_id, change)
+        tasks[task_id] = {**change, "old_status": first.get("old_status")}
+    new_removed_tasks = set(new_data.get("removed_task_ids") or [])
+    new_task_ids = {c["task"].get("task_id") for c in new_data.get("tasks") or []}
+    # 先删除后重新出现的任务不再视为已删除
+    removed_tasks = (set(old_data.get("removed_task_ids") or []) - new_task_ids) | new_removed_tasks
+    tasks = [c for task_id, c in tasks.items() if task_id not in new_removed_tasks]
+
+    for key, value in (
+        ("messages", messages),
+        ("removed_message_ids", sorted(removed_messages)),
+        ("read_updates", read_updates),
+        ("tasks", tasks),
+        ("removed_task_ids", sorted(removed_tasks)),
+    ):
+        if value:
+            data[key] = value
+        else:
+            data.pop(key, None)
+
+    merged = {**older, **newer, "data": data}
+    merged["merged"] = older.get("merged", 1) + newer.get("merged", 1)
+    return merged
+
+
+class ClientConnection:
+    """单个 WebSocket 连接的状态：订阅主题、发送队列和写协程"""
+
+    def __init__(self, ws: WebSocket, queue_size: int, batch_ms: int = 0):
+        self.ws = ws
+        self.topics: set[str] = set()
+        # 队列元素为 (消息文本, 入队时间)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.writer: asyncio.Task | None = None
+        # 批量窗口：(团队, 事件类型) -> 合并后的事件，窗口结束时统一发送
+        self.batch_ms = batch_ms
+        self.pending: dict[tuple, dict] = {}
+        self.pending_count = 0
+        self.flush_handle: asyncio.TimerHandle | None = None
+        self.last_seen = time.monotonic()
+        self.connected_at = time.time()
+        self.sent = 0
+        self.resyncs = 0
+
+
+class ConnectionManager:
+    """WebSocket 连接与主题订阅管理器
+
+    topic -> 订阅者集合 的索引使广播只需查找事件所属主题的订阅者，
+    而不是遍历所有连接。
+    """
+
+    def __init__(
+        self,
+        queue_size: int = WS_QUEUE_SIZE,
+        overflow_policy: str = WS_OVERFLOW_POLICY,
+        send_timeout: float = WS_SEND_TIMEOUT,
+        ping_interval: float = WS_PING_INTERVAL,
+        ping_timeout: float = WS_PING_TIMEOUT,
+        batch_ms: int = WS_BATCH_MS,
+        batch_max_ms: int = WS_BATCH_MAX_MS,
+    ):
+        self.queue_size = queue_size
+        self.overflow_policy = overflow_policy
+        self.send_timeout = send_timeout
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self.batch_max_ms = batch_max_ms
+        self.batch_ms = self._clamp_batch_ms(batch_ms)
+
+        self._conns: dict[WebSocket, ClientConnection] = {}
+        self._subscribers: dict[str, set[WebSocket]] = defaultdict(set)
+        self._heartbeat: asyncio.Task | None = None
+
+        # 运行指标
+        self._latencies: deque[float] = deque(maxlen=_LATENCY_SAMPLES)
+        self._counters = defaultdict(int)
+
+    def __len__(self) -> int:
+        return len(self._conns)
+
+    # ------------------------------------------------------------
+    # 生命周期
+    # ------------------------------------------------------------
+
+    def start(self):
+        """启动心跳协程，需在事件循环中调用"""
+        if self._heartbeat is None:
+            self._heartbeat = asyncio.create_task(self._heartbeat_loop())
+
+    async def stop(self):
+        """停止心跳并关闭全部连接的写协程"""
+        if self._heartbeat:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+        for ws in list(self._conns):
+            self.disconnect(ws)
+
+    def connect(self, ws: WebSocket, topics: list[str] | None = None, batch_ms: int | None = None):
+        """登记已接受的连接并启动其写协程，未指定主题时订阅全部事件
+
+        batch_ms 为该连接的批量窗口，未指定时使用默认值。
+        """
+        conn = ClientConnection(
+            ws, self.queue_size,
+            self.batch_ms if batch_ms is None else self._clamp_batch_ms(batch_ms),
+        )
+        self._conns[ws] = conn
+        conn.writer = asyncio.create_task(self._writer_loop(conn))
+        self.subscribe(ws, topics or [ALL_TOPIC])
+        self._counters["connected"] += 1
+
+    def disconnect(self, ws: WebSocket):
+        """移除连接及其全部订阅，停止写协程（可重复调用）"""
+        conn = self._conns.pop(ws, None)
+        if conn is None:
+            return
+        for topic in conn.topics:
+            self._remove_subscriber(topic, ws)
+        if conn.flush_handle:
+            conn.flush_handle.cancel()
+            conn.flush_handle = None
+        if conn.writer and conn.writer is not asyncio.current_task():
+            conn.writer.cancel()
+
+    def touch(self, ws: WebSocket):
+        """记录收到客户端消息的时间，用于心跳超时判断"""
+        conn = self._conns.get(ws)
+        if conn:
+            conn.last_seen = time.monotonic()
+
+    # ------------------------------------------------------------
+    # 订阅管理
+    # ------------------------------------------------------------
+
+    def subscribe(self, ws: WebSocket, topics: list[str]):
+        """为连接增加订阅主题"""
+        conn = self._conns.get(ws)
+        if conn is None:
+            return
+        for topic in topics:
+            if not isinstance(topic, str) or not topic:
+                continue
+            conn.topics.add(topic)
+            self._subscribers[topic].add(ws)
+
+    def unsubscribe(self, ws: WebSocket, topics: list[str]):
+        """取消连接的订阅主题"""
+        conn = self._conns.get(ws)
+        if conn is None:
+            return
+        for topic in topics:
+            if topic in conn.topics:
+                conn.topics.discard(topic)
+                self._remove_subscriber(topic, ws)
+
+    def topics_of(self, ws: WebSocket) -> list[str]:
+        """返回连接当前订阅的主题"""
+        conn = self._conns.get(ws)
+        return sorted(conn.topics) if conn else []
+
+    def subscriber_count(self, topic: str) -> int:
+        """返回某个主题的订阅者数量"""
+        subs = self._subscribers.get(topic)
+        return len(subs) if subs else 0
+
+    def topic_counts(self) -> dict[str, int]:
+        """返回每个主题的订阅者数量"""
+        return {topic: len(subs) for topic, subs in sorted(self._subscribers.items())}
+
+    def recipients(self, event: dict) -> set[WebSocket]:
+        """根据主题索引找出应接收该事件的连接"""
+        result = set()
+        for topic in event_topics(event):
+            subs = self._subscribers.get(topic)
+            if subs:
+                result |= subs
+        return result
+
+    def replay(self, ws: WebSocket, events: list[dict]):
+        """向连接补发历史事件，只发送其订阅主题范围内的事件"""
+        conn = self._conns.get(ws)
+        if conn is None:
+            return
+        for event in events:
+            if conn.topics.intersection(event_topics(event)):
+                self._enqueue(conn, json.dumps(event, ensure_ascii=False))
+
+    # ------------------------------------------------------------
+    # 批量窗口
+    # ------------------------------------------------------------
+
+    def _clamp_batch_ms(self, batch_ms) -> int:
+        try:
+            batch_ms = int(batch_ms)
+        except (TypeError, ValueError):
+            return 0
+        return max(0, min(batch_ms, self.batch_max_ms))
+
+    def set_batch(self, ws: WebSocket, batch_ms) -> int:
+        """调整连接的批量窗口，返回实际生效的毫秒数；设为 0 时立即发送已累积的事件"""
+        conn = self._conns.get(ws)
+        if conn is None:
+            return 0
+        conn.batch_ms = self._clamp_batch_ms(batch_ms)
+        if conn.batch_ms == 0 and conn.pending:
+            self._flush(conn)
+        return conn.batch_ms
+
+    def _buffer(self, conn: ClientConnection, event: dict):
+        """将事件并入连接的批量窗口，窗口内首个事件到达时开始计时"""
+        data = event.get("data") or {}
+        key = (data.get("team"), event.get("type"))
+        pending = conn.pending.get(key)
+        conn.pending[key] = merge_events(pending, event) if pending else event
+        conn.pending_count += 1
+        if conn.pending_count >= _BATCH_MAX_EVENTS:
+            self._flush(conn)
+        elif conn.flush_handle is None:
+            loop = asyncio.get_running_loop()
+            conn.flush_handle = loop.call_later(conn.batch_ms / 1000, self._flush, conn)
+
+    def _flush(self, conn: ClientConnection):
+        """发送批量窗口内累积的事件：只有一个时原样发送，多个时合成 batch 帧"""
+        if conn.flush_handle:
+            conn.flush_handle.cancel()
+            conn.flush_handle = None
+        if not conn.pending or conn.ws not in self._conns:
+            conn.pending.clear()
+            conn.pending_count = 0
+            return
+        events = sorted(conn.pending.values(), key=lambda e: e.get("seq") or 0)
+        source_count = conn.pending_count
+        conn.pending.clear()
+        conn.pending_count = 0
+        self._counters["batches"] += 1
+        self._counters["batched_events"] += source_count
+        if len(events) == 1:
+            payload = events[0]
+        else:
+            payload = {"type": "batch", "seq": events[-1].get("seq"), "events": events}
+        self._enqueue(conn, json.dumps(payload, ensure_ascii=False))
+
+    # ------------------------------------------------------------
+    # 客户端控制消息
+    # ------------------------------------------------------------
+
+    async def handle_client_message(self, ws: WebSocket, text: str):
+        """处理客户端发来的控制消息
+
+        支持 {"action": "subscribe" | "unsubscribe", "topics": [...]}，
+        处理后回复当前订阅列表；{"action": "batch", "batch_ms": N} 调整批量窗口，
+        回复实际生效的窗口长度；{"action": "pong"} 及其他消息只用于刷新心跳时间。
+        """
+        self.touch(ws)
+        try:
+            payload = json.loads(text)
+        except (json.JSONDecodeError, ValueError):
+            return
+        if not isinstance(payload, dict):
+            return
+        action = payload.get("action")
+        if action == "batch":
+            batch_ms = self.set_batch(ws, payload.get("batch_ms"))
+            self.send(ws, {"type": "batch_config", "batch_ms": batch_ms})
+            return
+        topics = payload.get("topics") or []
+        if isinstance(topics, str):
+            topics = [topics]
+        if action == "subscribe":
+            self.subscribe(ws, topics)
+        elif action == "unsubscribe":
+            self.unsubscribe(ws, topics)
+        else:
+            return
+        self.send(ws, {"type": "subscribed", "topics": self.topics_of(ws)})
+
+    # ------------------------------------------------------------
+    # 发送
+    # ------------------------------------------------------------
+
+    async def broadcast(self, event: dict):
+        """将事件放入订阅了其所属主题的连接的发送队列（或批量窗口），不等待实际发送"""
+        recipients = self.recipients(event)
+        if not recipients:
+            return
+        message = None
+        for ws in recipients:
+            conn = self._conns.get(ws)
+            if conn is None:
+                continue
+            if conn.batch_ms > 0:
+                self._buffer(conn, event)
+                continue
+            if message is None:
+                message = json.dumps(event, ensure_ascii=False)
+            self._enqueue(conn, message)
+
+    def send(self, ws: WebSocket, payload: dict):
+        """向单个连接发送消息（经由其发送队列）"""
+        conn = self._conns.get(ws)
+        if conn:
+            self._enqueue(conn, json.dumps(payload, ensure_ascii=False))
+
+    def send_all(self, payload: dict):
+        """向所有连接发送消息，不区分订阅主题"""
+        message = json.dumps(payload, ensure_ascii=False)
+        for conn in list(self._conns.values()):
+            self._enqueue(conn, message)
+
+    def _enqueue(self, conn: ClientConnection, message: str):
+        """消息入队；队列已满时按溢出策略断开连接或降级为全量重新同步"""
+        try:
+            conn.queue.put_nowait((message, time.monotonic()))
+            return
+        except asyncio.QueueFull:
+            pass
+
+        if self.overflow_policy == "drop":
+            logger.warning("WebSocket 客户端发送队列已满，断开连接")
+            self._counters["dropped"] += 1
+            asyncio.create_task(self._close(conn.ws, code=1013, reason="Send queue overflow"))
+            self.disconnect(conn.ws)
+            return
+
+        # 积压的增量已无意义，清空后只告知客户端需要全量重新同步
+        while not conn.queue.empty():
+            conn.queue.get_nowait()
+        conn.resyncs += 1
+        self._counters["resyncs"] += 1
+        resync = json.dumps({"type": "resync_required", "reason": "queue_overflow"})
+        conn.queue.put_nowait((resync, time.monotonic()))
+
+    async def _writer_loop(self, conn: ClientConnection):
+        """逐条发送连接队列中的消息，发送失败或超时则回收连接"""
+        try:
+            while True:
+                message, enqueued_at = await conn.queue.get()
+                await asyncio.wait_for(conn.ws.send_text(message), timeout=self.send_timeout)
+                conn.sent += 1
+                self._counters["sent"] += 1
+                self._latencies.append(time.monotonic() - enqueued_at)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.info(f"WebSocket 发送失败，回收连接: {e!r}")
+            self._counters["send_failures"] += 1
+            self.disconnect(conn.ws)
+            await self._close(conn.ws, code=1011, reason="Send failed")
+
+    async def _heartbeat_loop(self):
+        """定期发送心跳，并回收长时间没有任何回应的连接"""
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            now = time.monotonic()
+            for ws, conn in list(self._conns.items()):
+                if now - conn.last_seen > self.ping_timeout:
+                    logger.info("WebSocket 客户端心跳超时，回收连接")
+                    self._counters["reaped"] += 1
+                    self.disconnect(ws)
+                    await self._close(ws, code=1001, reason="Ping timeout")
+                else:
+                    self._enqueue(conn, json.dumps({"type": "ping", "ts": time.time()}))
+
+    async def _close(self, ws: WebSocket, code: int, reason: str):
+        try:
+            await asyncio.wait_for(ws.close(code=code, reason=reason), timeout=self.send_timeout)
+        except Exception:
+            pass
+
+    def _remove_subscriber(self, topic: str, ws: WebSocket):
+        subs = self._subscribers.get(topic)
+        if subs is None:
+            return
+        subs.discard(ws)
+        if not subs:
+            del self._subscribers[topic]
+
+    # ------------------------------------------------------------
+    # 指标
+    # ------------------------------------------------------------
+
+    def metrics(self) -> dict:
+        """返回连接数、队列深度、发送延迟、批量合并和溢出/回收计数"""
+        depths = [conn.queue.qsize() for conn in self._conns.values()]
+        latencies = sorted(self._latencies)
+
+        def percentile(p: float) -> float | None:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 3)
+
+        return {
+            "clients": len(self._conns),
+            "queue_size": self.queue_size,
+            "overflow_policy": self.overflow_policy,
+            "batching_clients": sum(1 for conn in self._conns.values() if conn.batch_ms > 0),
+            "queue_depth": {
+                "total": sum(depths),
+                "max": max(depths, default=0),
+            },
+            "send_latency_ms": {
+                "samples": len(latencies),
+                "avg": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else None,
+                "p50": percentile(0.5),
+                "p95": percentile(0.95),
+                "p99": percentile(0.99),
+            },
+            "counters": dict(self._counters),
+        }
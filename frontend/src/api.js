@@ -23,6 +23,15 @@ export function fetchTeam(name) {
   return request(`/api/teams/${name}`);
 }
 
+/** 获取团队仪表盘聚合数据（团队、统计、最新消息、任务、流转统计），include 为可选的数据块列表 */
+export function fetchTeamDashboard(name, include, messageLimit) {
+  const query = new URLSearchParams();
+  if (include) query.set('include', include.join(','));
+  if (messageLimit) query.set('message_limit', messageLimit);
+  const qs = query.toString();
+  return request(`/api/teams/${name}/dashboard${qs ? '?' + qs : ''}`);
+}
+
 // ---- 消息相关 ----
 
 /** 获取消息列表，支持筛选参数 */
@@ -1,14 +1,28 @@
 import { useEffect, useRef, useCallback, useState } from 'react';
 
+// 数据变化（增量事件、启动扫描完成、需要全量刷新）的事件类型，整页重新拉取的页面据此刷新
+export const REFRESH_EVENTS = new Set(['team_update', 'message_new', 'task_update', 'scan_complete', 'resync_required']);
+
 /**
  * WebSocket 连接管理 Hook
  * 连接 ws://localhost:8000/ws，收到更新后触发 onMessage 回调
- * 支持令牌认证，断线自动重连
+ * 支持令牌认证，断线自动重连；重连时携带最后收到的事件序列号，
+ * 服务端只补发漏掉的事件，无法续传时会推送 resync_required
+ *
+ * @param {function} onMessage - 事件回调
+ * @param {object} options - topics: 订阅的主题列表（如 ['team:foo']），不传则接收全部事件；
+ *                           batchMs: 批量窗口（毫秒），服务端将窗口内的事件合并为一帧发送
  */
-export default function useWebSocket(onMessage) {
+export default function useWebSocket(onMessage, options = {}) {
+  const topicsKey = (options.topics || []).join(',');
+  const batchMs = options.batchMs || 0;
   const wsRef = useRef(null);
   const reconnectTimer = useRef(null);
   const reconnectAttempts = useRef(0);
+  // 断线续传位置：最后收到的事件序列号和服务端 epoch
+  const lastSeq = useRef(null);
+  const epoch = useRef(null);
+  const helloSeq = useRef(null);
   const onMessageRef = useRef(onMessage);
   onMessageRef.current = onMessage;
 
@@ -32,9 +46,17 @@ export default function useWebSocket(onMessage) {
     setConnectionStatus('connecting');
 
     const wsToken = import.meta.env.VITE_WS_TOKEN || '';
-    const wsUrl = wsToken
-      ? `ws://localhost:8000/ws?token=${encodeURIComponent(wsToken)}`
-      : 'ws://localhost:8000/ws';
+    const query = new URLSearchParams();
+    if (wsToken) query.set('token', wsToken);
+    // 只订阅关心的主题，服务端不会推送其他团队的事件
+    if (topicsKey) query.set('topics', topicsKey);
+    if (batchMs > 0) query.set('batch_ms', batchMs);
+    if (lastSeq.current !== null && epoch.current) {
+      query.set('since', lastSeq.current);
+      query.set('epoch', epoch.current);
+    }
+    const qs = query.toString();
+    const wsUrl = `ws://localhost:8000/ws${qs ? '?' + qs : ''}`;
 
     const ws = new WebSocket(wsUrl);
 
@@ -47,7 +69,30 @@ export default function useWebSocket(onMessage) {
     ws.onmessage = (event) => {
       try {
         const data = JSON.parse(event.data);
-        onMessageRef.current?.(data);
+        // 回应服务端心跳，避免连接被判定失效
+        if (data.type === 'ping') {
+          ws.send(JSON.stringify({ action: 'pong' }));
+          return;
+        }
+        if (data.type === 'hello') {
+          // 首次连接从当前序列号开始记录；epoch 变化时由服务端的 resync_required 触发全量刷新
+          if (lastSeq.current === null || epoch.current !== data.epoch) {
+            lastSeq.current = data.seq;
+          }
+          epoch.current = data.epoch;
+          helloSeq.current = data.seq;
+          return;
+        }
+        if (data.type === 'resync_required' && helloSeq.current !== null) {
+          // 全量刷新后从连接建立时的序列号继续
+          lastSeq.current = Math.max(lastSeq.current ?? 0, helloSeq.current);
+        }
+        if (typeof data.seq === 'number') {
+          lastSeq.current = data.seq;
+        }
+        // 批量帧拆开逐个回调，调用方无需区分
+        const events = data.type === 'batch' ? data.events || [] : [data];
+        events.forEach((e) => onMessageRef.current?.(e));
       } catch {}
     };
 
@@ -70,7 +115,7 @@ export default function useWebSocket(onMessage) {
     };
 
     wsRef.current = ws;
-  }, []);
+  }, [topicsKey, batchMs]);
 
   useEffect(() => {
     connect();
@@ -1,6 +1,6 @@
 import { useState, useEffect, useCallback } from 'react';
 import MessageItem from '../components/MessageItem';
-import useWebSocket from '../hooks/useWebSocket';
+import useWebSocket, { REFRESH_EVENTS } from '../hooks/useWebSocket';
 import { fetchTeams, fetchMessages } from '../api';
 
 /** 消息浏览页：筛选 + 搜索 + 列表 */
@@ -35,7 +35,7 @@ export default function MessagesPage() {
   useEffect(() => { loadMessages(); }, [loadMessages]);
 
   useWebSocket((data) => {
-    if (data.type === 'update') loadMessages();
+    if (REFRESH_EVENTS.has(data.type)) loadMessages();
   });
 
   // 收集所有发送者用于筛选
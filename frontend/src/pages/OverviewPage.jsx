@@ -2,7 +2,7 @@ import { useState, useEffect, useCallback } from 'react';
 import StatCard from '../components/StatCard';
 import TeamCard from '../components/TeamCard';
 import MessageItem from '../components/MessageItem';
-import useWebSocket from '../hooks/useWebSocket';
+import useWebSocket, { REFRESH_EVENTS } from '../hooks/useWebSocket';
 import { fetchTeams, fetchMessages, fetchStats } from '../api';
 
 /** 总览页：统计 + 最近团队 + 最新消息 */
@@ -33,7 +33,7 @@ export default function OverviewPage() {
 
   // WebSocket 收到更新后刷新数据
   useWebSocket((data) => {
-    if (data.type === 'update') loadData();
+    if (REFRESH_EVENTS.has(data.type)) loadData();
   });
 
   if (loading) {
@@ -1,6 +1,6 @@
 import { useState, useEffect, useCallback } from 'react';
 import TaskCard from '../components/TaskCard';
-import useWebSocket from '../hooks/useWebSocket';
+import useWebSocket, { REFRESH_EVENTS } from '../hooks/useWebSocket';
 import { fetchTeams, fetchTasks } from '../api';
 
 /** 任务管理页：列表/看板视图 + 筛选 */
@@ -31,7 +31,7 @@ export default function TasksPage() {
   useEffect(() => { loadTasks(); }, [loadTasks]);
 
   useWebSocket((data) => {
-    if (data.type === 'update') loadTasks();
+    if (REFRESH_EVENTS.has(data.type)) loadTasks();
   });
 
   const handleFilterChange = (key, value) => {
@@ -1,9 +1,32 @@
-import { useState, useEffect, useCallback } from 'react';
+import { useState, useEffect, useCallback, useRef } from 'react';
 import { useParams, Link } from 'react-router-dom';
 import MessageItem from '../components/MessageItem';
 import TaskCard from '../components/TaskCard';
 import useWebSocket from '../hooks/useWebSocket';
-import { fetchTeam, fetchTeamMessages, fetchTeamTasks } from '../api';
+import { fetchTeamDashboard } from '../api';
+
+// 时间线展示的最新消息数量
+const MESSAGE_LIMIT = 20;
+
+/** 将增量事件中的消息变更合并到本地消息列表 */
+function applyMessageDelta(list, delta) {
+  const removed = new Set(delta.removed_message_ids || []);
+  const readMap = new Map((delta.read_updates || []).map((u) => [u.id, u.read]));
+  const merged = [...(delta.messages || []), ...list]
+    .filter((m) => !removed.has(m.id))
+    .map((m) => (readMap.has(m.id) ? { ...m, read: readMap.get(m.id) } : m));
+  merged.sort((a, b) => (b.timestamp || '').localeCompare(a.timestamp || ''));
+  return merged.slice(0, MESSAGE_LIMIT);
+}
+
+/** 将增量事件中的任务变更合并到本地任务列表 */
+function applyTaskDelta(list, delta) {
+  const removed = new Set(delta.removed_task_ids || []);
+  const changed = new Map((delta.tasks || []).map((c) => [c.task.task_id, c.task]));
+  const next = list
+    .filter((t) => !removed.has(t.task_id) && !changed.has(t.task_id));
+  return [...next, ...changed.values()];
+}
 
 /** 团队详情页：成员 + 消息时间线 + 任务看板 */
 export default function TeamDetailPage() {
@@ -15,15 +38,11 @@ export default function TeamDetailPage() {
 
   const loadData = useCallback(async () => {
     try {
-      const [teamData, msgsData, tasksData] = await Promise.all([
-        fetchTeam(name),
-        fetchTeamMessages(name),
-        fetchTeamTasks(name),
-      ]);
-      setTeam(teamData);
-      // 消息 API 返回分页对象 {items: [...]} 或直接数组
-      setMessages(Array.isArray(msgsData) ? msgsData : (msgsData.items || []));
-      setTasks(Array.isArray(tasksData) ? tasksData : (tasksData.items || []));
+      // 一次请求获取团队、最新消息和按状态分组的任务
+      const data = await fetchTeamDashboard(name, ['team', 'messages', 'tasks'], MESSAGE_LIMIT);
+      setTeam(data.team);
+      setMessages(data.messages || []);
+      setTasks(Object.values(data.tasks || {}).flat());
     } catch (err) {
       console.error('加载团队数据失败:', err);
     } finally {
@@ -33,9 +52,31 @@ export default function TeamDetailPage() {
 
   useEffect(() => { loadData(); }, [loadData]);
 
-  useWebSocket((data) => {
-    if (data.type === 'update') loadData();
-  });
+  // 已应用的最大事件序号，用于忽略重复或过期的事件
+  const lastSeq = useRef(0);
+
+  useWebSocket((event) => {
+    // 服务端丢弃了积压的增量或启动扫描刚完成，需要全量重新拉取
+    if (event.type === 'resync_required' || event.type === 'scan_complete') {
+      loadData();
+      return;
+    }
+    const delta = event.data;
+    if (!delta || delta.team !== name) return;
+    if (event.seq && event.seq <= lastSeq.current) return;
+    lastSeq.current = event.seq || lastSeq.current;
+
+    // 直接应用事件携带的增量，无需重新拉取
+    if (delta.messages || delta.removed_message_ids || delta.read_updates) {
+      setMessages((list) => applyMessageDelta(list, delta));
+    }
+    if (delta.tasks || delta.removed_task_ids) {
+      setTasks((list) => applyTaskDelta(list, delta));
+    }
+    if (event.type === 'team_update' && delta.team_info) {
+      setTeam({ ...delta.team_info, members: delta.members || [] });
+    }
+  }, { topics: [`team:${name}`, 'event:scan_complete'] });
 
   if (loading) {
     return (